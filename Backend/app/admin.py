@@ -1,3 +1,5 @@
+import copy
+
 from django.contrib import admin
 from .models import *
 from django.contrib.auth.models import Group as DefaultGroup
@@ -15,9 +17,32 @@ from django.utils.html import format_html
 admin.site.unregister(TOTPDevice)
 
 from cloudinary import uploader
+from django.db import connections
+from django.db.models import Q
+from .busqueda import buscar_testimonios
+from .otp import invalidar_otp
+
+
+class SinHistorialModelAdmin(UnfoldModelAdmin):
+    """
+    ModelAdmin de Unfold que no guarda el historial del admin (LogEntry).
+    Se reemplazan los métodos log_* del propio admin: no se toca ninguna clase compartida,
+    asi es seguro con workers de varios hilos y con ASGI.
+    """
+
+    def log_addition(self, request, obj, message):
+        return None
+
+    def log_change(self, request, obj, message):
+        return None
+
+    def log_deletions(self, request, queryset):
+        return None
+
+
 # Registrar TOTPDevice con nombre personalizado
 @admin.register(TOTPDevice)
-class CustomTOTPDeviceAdmin(TOTPDeviceAdmin, UnfoldModelAdmin):
+class CustomTOTPDeviceAdmin(TOTPDeviceAdmin, SinHistorialModelAdmin):
     # Cambiar el verbose_name del modelo
     class Meta:
         verbose_name = 'Usuario 2FA'
@@ -97,6 +122,17 @@ class CustomTOTPDeviceAdmin(TOTPDeviceAdmin, UnfoldModelAdmin):
             )
         
         super().save_model(request, obj, form, change)
+        # 👇 El usuario tiene que volver a verificar con el dispositivo nuevo
+        invalidar_otp([obj.user_id])
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidar_otp([obj.user_id])
+    
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        invalidar_otp(user_ids)
     
     def get_actions(self, request):
         """
@@ -288,7 +324,7 @@ class UserAdminForm(UserChangeForm):
         # Mantener siempre el hash actual cuando se edita desde el admin.
         return self.initial.get('password')
 
-class UserAdmin(BaseUserAdmin, UnfoldModelAdmin):
+class UserAdmin(BaseUserAdmin, SinHistorialModelAdmin):
     list_display = ('username', 'email', 'is_staff', 'is_active', 'get_user_groups', 'display_profile_picture')
     search_fields = ('username', 'email')
     
@@ -398,7 +434,7 @@ class UserAdmin(BaseUserAdmin, UnfoldModelAdmin):
 
 
 # SEGUNDO: Se Define ClienteAdmin
-class ClienteAdmin(UserAdmin, UnfoldModelAdmin):
+class ClienteAdmin(UserAdmin, SinHistorialModelAdmin):
 
 
     def display_profile_picture(self, obj):
@@ -431,7 +467,7 @@ class ClienteAdmin(UserAdmin, UnfoldModelAdmin):
 
 # Formulario para Visitantes
 @admin.register(Visitante)
-class VisitanteAdmin(ClienteAdmin, UnfoldModelAdmin):
+class VisitanteAdmin(ClienteAdmin, SinHistorialModelAdmin):
     
     group_name = "visitante"
 
@@ -446,7 +482,7 @@ class VisitanteAdmin(ClienteAdmin, UnfoldModelAdmin):
 
 # Formulario para Editores
 @admin.register(Editor)
-class EditorAdmin(ClienteAdmin, UnfoldModelAdmin):
+class EditorAdmin(ClienteAdmin, SinHistorialModelAdmin):
 
     group_name = "editor"
 
@@ -480,7 +516,7 @@ class EditorAdmin(ClienteAdmin, UnfoldModelAdmin):
 #Formulario para admins
 
 @admin.register(AdminUser)
-class AdminUserAdmin(ClienteAdmin, UnfoldModelAdmin):
+class AdminUserAdmin(ClienteAdmin, SinHistorialModelAdmin):
 
     add_form = CustomUserCreationForm  # 👈 CAMBIAR AQUÍ
     form = UserAdminForm  # 👈 CAMBIAR A UserAdminForm para la edición
@@ -546,7 +582,7 @@ admin.site.unregister(DefaultGroup)
 
 # Registrar tu modelo personalizado de Roles
 @admin.register(Roles)
-class RolesAdmin(UnfoldModelAdmin):
+class RolesAdmin(SinHistorialModelAdmin):
     list_display = ["id", 'name']
     search_fields = ['name']
     
@@ -582,7 +618,7 @@ class RolesAdmin(UnfoldModelAdmin):
 #   ADMIN ORGANIZACION
 # ===============================
 @admin.register(Organizacion)
-class OrganizacionAdmin(UnfoldModelAdmin):
+class OrganizacionAdmin(SinHistorialModelAdmin):
 
     list_display = ("id", "organizacion_nombre", "dominio", "get_editores_list", "get_visitantes_count")
     search_fields = ("organizacion_nombre",)
@@ -668,7 +704,7 @@ class OrganizacionAdmin(UnfoldModelAdmin):
 #   ADMIN CATEGORIA
 # ===============================
 @admin.register(Categoria)
-class CategoriaAdmin(UnfoldModelAdmin):
+class CategoriaAdmin(SinHistorialModelAdmin):
 
     list_display = ("id", "nombre_categoria", 'icono', 'color', "fecha_registro")
     search_fields = ("nombre_categoria",)
@@ -682,7 +718,7 @@ class CategoriaAdmin(UnfoldModelAdmin):
 #   ADMIN TESTIMONIOS
 # ===============================
 @admin.register(Testimonios)
-class TestimoniosAdmin(UnfoldModelAdmin):
+class TestimoniosAdmin(SinHistorialModelAdmin):
 
     list_display = (
         "id",
@@ -712,6 +748,23 @@ class TestimoniosAdmin(UnfoldModelAdmin):
     # Mostrar usuario (registrado o anónimo)
     def get_usuario(self, obj):
         return obj.usuario_registrado.username if obj.usuario_registrado else obj.usuario_anonimo_username
+
+    # Columnas que están en el tsvector 'busqueda' (ver migración 0005)
+    campos_texto_completo = ("comentario", "usuario_registrado__username", "usuario_anonimo_username")
+
+    def get_search_results(self, request, queryset, search_term):
+        # 👇 En PostgreSQL comentario y autor se buscan en el tsvector (índice GIN) en lugar de ILIKE '%...%';
+        # el resto de search_fields (organización y categoría) sigue con la búsqueda normal del admin
+        if search_term and connections[queryset.db].vendor == 'postgresql':
+            por_texto = buscar_testimonios(queryset, search_term).values('pk')
+
+            # Copia del admin solo para esta búsqueda: no se toca el search_fields compartido entre hilos
+            resto = copy.copy(self)
+            resto.search_fields = [campo for campo in self.search_fields if campo not in self.campos_texto_completo]
+            por_nombre, _ = super(TestimoniosAdmin, resto).get_search_results(request, queryset, search_term)
+
+            return queryset.filter(Q(pk__in=por_texto) | Q(pk__in=por_nombre.values('pk'))), False
+        return super().get_search_results(request, queryset, search_term)
     
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "usuario_registrado":
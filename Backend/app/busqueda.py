@@ -0,0 +1,31 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Q
+
+# Misma configuración que usa el trigger que arma el vector (migración 0005)
+CONFIGURACION = 'spanish'
+
+
+def buscar_testimonios(queryset, texto):
+    """
+    Filtra el queryset de testimonios por el texto y lo ordena por relevancia.
+
+    En PostgreSQL usa el tsvector 'busqueda' (índice GIN): acepta la sintaxis de buscador
+    ("frase exacta", -excluir, or). En otros motores cae a un icontains sin índice,
+    suficiente para desarrollo.
+    """
+    texto = (texto or '').strip()
+    if not texto:
+        return queryset.none()
+
+    if connections[queryset.db].vendor == 'postgresql':
+        consulta = SearchQuery(texto, config=CONFIGURACION, search_type='websearch')
+        return queryset.filter(busqueda=consulta).annotate(
+            relevancia=SearchRank(F('busqueda'), consulta)
+        ).order_by('-relevancia', '-fecha_comentario', '-id')
+
+    return queryset.filter(
+        Q(comentario__icontains=texto) |
+        Q(usuario_anonimo_username__icontains=texto) |
+        Q(usuario_registrado__username__icontains=texto)
+    ).order_by('-fecha_comentario', '-id')
@@ -0,0 +1,188 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.db.models.functions import Lower
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .models import Organizacion
+
+# Versión que se incrementa con CUALQUIER cambio de testimonios (listado público de todas las organizaciones)
+GLOBAL = 'global'
+
+
+def _clave_version(organizacion_id):
+    return f"testimonios:version:{organizacion_id}"
+
+
+def _clave_modificado(organizacion_id):
+    return f"testimonios:modificado:{organizacion_id}"
+
+
+def _timeout_version():
+    # Las versiones vencen (no se acumulan claves para siempre), pero siempre después que los feeds cacheados
+    return max(settings.TESTIMONIOS_VERSION_TIMEOUT, settings.TESTIMONIOS_CACHE_TIMEOUT)
+
+
+def _version_inicial():
+    # 👇 Una versión que vence no vuelve a arrancar en 1: un ETag viejo de la v1 no debe dar 304 con otros datos
+    return int(time.time())
+
+
+def estado_testimonios(organizacion_id=GLOBAL):
+    """
+    Devuelve (version, modificado) de los testimonios de una organización (o la global)
+    con un solo acceso al cache. 'modificado' es un timestamp unix del último cambio.
+    """
+    clave_version = _clave_version(organizacion_id)
+    clave_modificado = _clave_modificado(organizacion_id)
+    valores = cache.get_many([clave_version, clave_modificado])
+    version = valores.get(clave_version)
+    modificado = valores.get(clave_modificado)
+
+    if version is None:
+        # add() no pisa el valor si otro proceso lo creó entre el get y el add
+        version = _version_inicial()
+        cache.add(clave_version, version, timeout=_timeout_version())
+        version = cache.get(clave_version, version)
+    if modificado is None:
+        # Sin registro del último cambio se toma "ahora": nunca es anterior al cambio real
+        modificado = int(time.time())
+        cache.add(clave_modificado, modificado, timeout=_timeout_version())
+    return version, modificado
+
+
+def version_testimonios(organizacion_id=GLOBAL):
+    """Devuelve la versión actual de los testimonios de una organización (o la global)"""
+    return estado_testimonios(organizacion_id)[0]
+
+
+def invalidar_testimonios(organizacion_id):
+    """
+    Incrementa la versión de la organización y la global.
+    Las claves viejas quedan huérfanas y expiran solas, no hace falta borrarlas.
+    """
+    ahora = int(time.time())
+    for id_version in (organizacion_id, GLOBAL):
+        clave = _clave_version(id_version)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            # La clave no existía (cache vacío o expirado): arrancar en una versión que no se usó antes
+            cache.set(clave, _version_inicial() + 1, timeout=_timeout_version())
+        cache.set(_clave_modificado(id_version), ahora, timeout=_timeout_version())
+
+
+def clave_feed(prefijo, request, organizacion_id=GLOBAL, version=None):
+    """
+    Clave del feed cacheado: organización + versión + host + parámetros de la consulta.
+    El host se incluye porque los links de paginación ('next') son absolutos.
+    """
+    parametros = '&'.join(
+        f"{k}={v}" for k, v in sorted(request.query_params.items())
+    )
+    huella = hashlib.md5(f"{request.get_host()}?{parametros}".encode('utf-8')).hexdigest()
+    if version is None:
+        version = version_testimonios(organizacion_id)
+    return f"testimonios:{prefijo}:{organizacion_id}:v{version}:{huella}"
+
+
+def obtener_o_construir(clave, construir):
+    """Devuelve el valor cacheado o lo construye con construir() y lo guarda"""
+    data = cache.get(clave)
+    if data is None:
+        data = construir()
+        cache.set(clave, data, getattr(settings, 'TESTIMONIOS_CACHE_TIMEOUT', 300))
+    return data
+
+
+def respuesta_feed(request, prefijo, construir, organizacion_id=GLOBAL):
+    """
+    Respuesta de un feed público con GET condicional.
+
+    El ETag sale de la clave del feed (que ya incluye la versión), asi que si el cliente
+    manda If-None-Match / If-Modified-Since y nada cambió se responde 304 sin tocar
+    la base de datos ni serializar nada.
+    """
+    version, modificado = estado_testimonios(organizacion_id)
+    clave = clave_feed(prefijo, request, organizacion_id=organizacion_id, version=version)
+    etag = quote_etag(hashlib.md5(clave.encode('utf-8')).hexdigest())
+
+    no_modificado = get_conditional_response(request._request, etag=etag, last_modified=modificado)
+    if no_modificado is not None:
+        return no_modificado
+
+    response = Response(obtener_o_construir(clave, construir))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(modificado)
+    return response
+
+
+# Columnas de la organización que se guardan en el cache: las que usan el embed y la carga de testimonios
+CAMPOS_ORGANIZACION = ('id', 'organizacion_nombre', 'dominio', 'api_key')
+
+
+def _clave_api_key(api_key):
+    # La api_key no se guarda tal cual en el cache: solo su hash
+    return f"testimonios:organizacion:api_key:{hashlib.md5(api_key.encode('utf-8')).hexdigest()}"
+
+
+def _clave_dominio(dominio):
+    return f"testimonios:organizacion:dominio:{hashlib.md5(dominio.encode('utf-8')).hexdigest()}"
+
+
+def normalizar_dominio(dominio):
+    return (dominio or '').strip().lower()
+
+
+def _instancia(datos):
+    """Organizacion armada con los datos del cache, sin consultar la base (el resto de los campos quedan diferidos)"""
+    campos = [campo.attname for campo in Organizacion._meta.concrete_fields if campo.attname in datos]
+    return Organizacion.from_db(router.db_for_read(Organizacion), campos, [datos[campo] for campo in campos])
+
+
+def _organizacion_cacheada(clave, buscar):
+    datos = cache.get(clave)
+    if datos is None:
+        datos = buscar.values(*CAMPOS_ORGANIZACION).first()
+        if datos is None:
+            # Las claves inexistentes no se cachean para no llenar el cache con basura
+            return None
+        cache.set(clave, datos, getattr(settings, 'TESTIMONIOS_CACHE_TIMEOUT', 300))
+    return _instancia(datos)
+
+
+def organizacion_por_api_key(api_key):
+    """
+    Devuelve la organización dueña de la api_key (None si no existe), con las columnas de
+    CAMPOS_ORGANIZACION. Se resuelve desde el cache; la base solo se consulta la primera vez.
+    """
+    if not api_key:
+        return None
+    return _organizacion_cacheada(_clave_api_key(api_key), Organizacion.objects.filter(api_key=api_key))
+
+
+def organizacion_por_dominio(dominio):
+    """
+    Devuelve la organización con ese dominio sin importar mayúsculas (None si no existe).
+    Usa el índice de lower(dominio); igual que la api_key, la base solo se consulta la primera vez.
+    """
+    dominio = normalizar_dominio(dominio)
+    if not dominio:
+        return None
+    return _organizacion_cacheada(
+        _clave_dominio(dominio),
+        Organizacion.objects.alias(dominio_normalizado=Lower('dominio')).filter(dominio_normalizado=dominio),
+    )
+
+
+def olvidar_organizacion(api_keys=(), dominios=()):
+    """Saca del cache las api_keys y dominios (al cambiarlos o al borrar la organización)"""
+    claves = [_clave_api_key(api_key) for api_key in api_keys if api_key]
+    claves += [_clave_dominio(normalizar_dominio(dominio)) for dominio in dominios if dominio]
+    if claves:
+        cache.delete_many(claves)
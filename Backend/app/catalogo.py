@@ -0,0 +1,91 @@
+"""
+Catálogo de categorías en la memoria del proceso.
+
+La tabla de categorías es chica y solo la modifica el admin, pero cada listado la leía de la base
+(el endpoint de categorías y el JOIN para 'categoria_nombre' en cada testimonio). El catálogo se carga
+una vez por proceso y se recarga solo cuando cambia la versión compartida en el cache
+(que incrementan las señales de Categoria al guardar o borrar, desde la API o desde el admin).
+Con REDIS_URL la versión es la misma para todas las instancias. Sin un cache compartido (LocMem)
+cada worker tiene su propia versión y no se entera de los cambios hechos en otro: ahí el catálogo
+del proceso además dura como máximo TESTIMONIOS_CACHE_TIMEOUT segundos.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import serializers
+
+from .models import Categoria
+from .tokens import cache_compartido
+
+_CLAVE_VERSION = "categorias:version"
+
+# (versión, momento de carga, {id: Categoria}) del proceso; se reemplaza entero, nunca se modifica en el lugar
+_catalogo = (None, 0.0, {})
+
+
+def version_categorias():
+    """Versión vigente del catálogo (un token al azar: sobrevive a que el cache se vacíe)"""
+    version = cache.get(_CLAVE_VERSION)
+    if version is None:
+        # add() no pisa el valor si otro proceso lo creó entre el get y el add
+        cache.add(_CLAVE_VERSION, uuid.uuid4().hex, timeout=None)
+        version = cache.get(_CLAVE_VERSION)
+    return version
+
+
+def invalidar_categorias():
+    """Cambia la versión: cada proceso recarga el catálogo en su próxima lectura"""
+    cache.set(_CLAVE_VERSION, uuid.uuid4().hex, timeout=None)
+
+
+def _cargar(version):
+    global _catalogo
+    categorias = {categoria.id: categoria for categoria in Categoria.objects.all()}
+    if version is not None:
+        _catalogo = (version, time.monotonic(), categorias)
+    return categorias
+
+
+def categorias(recargar=False):
+    """{id: Categoria} de la versión vigente, en el orden del modelo. No modificar las instancias."""
+    version = version_categorias()
+    version_local, cargado_en, categorias_locales = _catalogo
+    if recargar or version is None or version != version_local:
+        return _cargar(version)
+    # 👇 Sin cache compartido la versión no refleja los cambios de otros workers: se recarga por tiempo
+    if not cache_compartido() and time.monotonic() - cargado_en >= settings.TESTIMONIOS_CACHE_TIMEOUT:
+        return _cargar(version)
+    return categorias_locales
+
+
+def categoria_por_id(categoria_id):
+    """La categoría del catálogo (None si no existe)"""
+    try:
+        categoria_id = int(categoria_id)
+    except (TypeError, ValueError):
+        return None
+    return categorias().get(categoria_id)
+
+
+class NombreCategoriaField(serializers.ReadOnlyField):
+    """
+    Nombre de la categoría resuelto desde el catálogo: el serializer solo lee categoria_id,
+    sin JOIN con la tabla de categorías. El catálogo se pide una vez por serializer.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'categoria_id')
+        super().__init__(**kwargs)
+        self._catalogo = None
+
+    def to_representation(self, categoria_id):
+        if self._catalogo is None:
+            self._catalogo = categorias()
+        categoria = self._catalogo.get(categoria_id)
+        if categoria is None:
+            # Categoría creada después de cargar el catálogo (la versión todavía no cambió)
+            self._catalogo = categorias(recargar=True)
+            categoria = self._catalogo.get(categoria_id)
+        return categoria.nombre_categoria if categoria is not None else None
@@ -0,0 +1,79 @@
+"""
+Cache de los endpoints públicos en la CDN (edge de Vercel).
+
+Cada vista declara su PoliticaCache por acción (ver PoliticaCacheMixin en mixins.py):
+
+    politicas_cache = {
+        'list': PoliticaCache(s_maxage=5, stale_while_revalidate=30, etiquetas=('testimonios',)),
+    }
+
+La política solo se aplica a GET/HEAD anónimos con respuesta 200/304; todo lo demás sale
+como privado. Los feeds de testimonios usan un s-maxage corto y la CDN revalida con el ETag
+(un 304 casi no cuesta), asi una aprobación se ve en segundos. Si además hay una función de
+purga configurada (TESTIMONIOS_CDN_PURGA) se la llama con las etiquetas de lo que cambió.
+"""
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.module_loading import import_string
+
+METODOS_CACHEABLES = ('GET', 'HEAD')
+ESTADOS_CACHEABLES = (200, 304)
+
+
+def etiqueta_organizacion(organizacion_id):
+    return f"organizacion-{organizacion_id}"
+
+
+class PoliticaCache:
+    """
+    max_age: segundos en el navegador.
+    s_maxage: segundos en la CDN.
+    stale_while_revalidate: segundos que la CDN puede servir la versión vieja mientras revalida.
+    vary: headers que cambian la respuesta.
+    etiquetas: para purgar; pueden usar los kwargs de la URL ('organizacion-{pk}').
+    """
+
+    def __init__(self, max_age=0, s_maxage=None, stale_while_revalidate=None, vary=('Authorization',), etiquetas=()):
+        self.max_age = max_age
+        self.s_maxage = s_maxage
+        self.stale_while_revalidate = stale_while_revalidate
+        self.vary = vary
+        self.etiquetas = etiquetas
+
+    def aplicar(self, response, etiquetas=()):
+        directivas = {'public': True, 'max_age': self.max_age}
+        if self.s_maxage is not None:
+            directivas['s_maxage'] = self.s_maxage
+        if self.stale_while_revalidate is not None:
+            directivas['stale_while_revalidate'] = self.stale_while_revalidate
+        patch_cache_control(response, **directivas)
+
+        if self.vary:
+            patch_vary_headers(response, self.vary)
+        if etiquetas:
+            response[settings.TESTIMONIOS_CDN_HEADER_ETIQUETAS] = ','.join(etiquetas)
+
+
+def es_cacheable(request, response):
+    """Solo lecturas anónimas exitosas que no dejan cookies pueden guardarse en la CDN"""
+    return (
+        request.method in METODOS_CACHEABLES
+        and response.status_code in ESTADOS_CACHEABLES
+        and 'HTTP_AUTHORIZATION' not in request.META
+        and not request.user.is_authenticated
+        and not response.cookies
+    )
+
+
+def purgar_cdn(*etiquetas):
+    """
+    Llama a la función de TESTIMONIOS_CDN_PURGA con las etiquetas que cambiaron.
+    Sin función configurada no hace nada (la CDN revalida sola al vencer el s-maxage).
+    """
+    ruta = settings.TESTIMONIOS_CDN_PURGA
+    if not ruta or not etiquetas:
+        return
+    try:
+        import_string(ruta)(list(etiquetas))
+    except Exception as e:
+        print(f"⚠️ Error purgando la CDN ({', '.join(etiquetas)}): {e}")
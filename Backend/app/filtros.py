@@ -0,0 +1,171 @@
+"""
+Filtros y ordenamientos de los listados de testimonios.
+
+Parámetros (todos opcionales):
+  categoria              -> ids separados por coma (?categoria=3,5)
+  ranking_min/ranking_max -> rango de ranking (0 a 5)
+  desde/hasta            -> rango de fechas, YYYY-MM-DD (ambos inclusive)
+  con_media              -> true/false: solo testimonios con (o sin) archivos
+  estado                 -> códigos separados por coma, solo en la vista de editores
+  orden                  -> recientes (default), antiguos, ranking, mejor
+
+Cada combinación tiene su índice en Testimonios.Meta.indexes: los de organización + estado
+para los editores y el feed de una organización, y los parciales de aprobados para el
+listado público. Las fechas se filtran por rango (nunca con __date) para poder usarlos.
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Testimonios
+
+# 👇 El id siempre desempata al final, asi el cursor de la paginación es estable
+ORDENAMIENTOS = {
+    'recientes': ('-fecha_comentario', '-id'),
+    'antiguos': ('fecha_comentario', 'id'),
+    'ranking': ('-ranking', '-fecha_comentario', '-id'),
+    # "Mejor": más estrellas primero y, a igual ranking, los que traen fotos/videos
+    'mejor': ('-ranking', '-tiene_media', '-fecha_comentario', '-id'),
+}
+ORDEN_POR_DEFECTO = 'recientes'
+
+VALORES_VERDADEROS = ('1', 'true', 'si', 'sí')
+VALORES_FALSOS = ('0', 'false', 'no')
+
+# Los ids son BigAutoField: un número más grande no existe (y la base lo rechazaría)
+ID_MAXIMO = 2 ** 63 - 1
+
+
+def ordenamiento_solicitado(request):
+    """Campos de orden pedidos en ?orden= (400 si el valor no existe)"""
+    orden = request.query_params.get('orden') or ORDEN_POR_DEFECTO
+    if orden not in ORDENAMIENTOS:
+        raise ValidationError({'orden': f"Valores posibles: {', '.join(ORDENAMIENTOS)}."})
+    return ORDENAMIENTOS[orden]
+
+
+def _lista(request, parametro):
+    valor = request.query_params.get(parametro, '')
+    return [parte.strip() for parte in valor.split(',') if parte.strip()]
+
+
+def _ranking(request, parametro):
+    valor = request.query_params.get(parametro)
+    if not valor:
+        return None
+    try:
+        ranking = Decimal(valor)
+    except InvalidOperation:
+        raise ValidationError({parametro: 'Debe ser un número.'})
+    # 👇 Decimal acepta 'NaN' e 'Infinity': no son un ranking (y NaN no se puede comparar)
+    if not ranking.is_finite():
+        raise ValidationError({parametro: 'Debe ser un número.'})
+    try:
+        en_rango = Decimal(0) <= ranking <= Decimal(5)
+    except InvalidOperation:
+        en_rango = False
+    if not en_rango:
+        raise ValidationError({parametro: 'Debe estar entre 0 y 5.'})
+    return ranking
+
+
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _fecha(request, parametro):
+    valor = request.query_params.get(parametro)
+    if not valor:
+        return None
+    try:
+        fecha = parse_date(valor)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise ValidationError({parametro: 'Fecha inválida, use el formato YYYY-MM-DD.'})
+    return fecha
+
+
+def _ids(request, parametro):
+    ids = []
+    for valor in _lista(request, parametro):
+        # isdecimal y no isdigit: '²' es un dígito pero int() no lo acepta
+        if not valor.isdecimal() or int(valor) > ID_MAXIMO:
+            raise ValidationError({parametro: 'Debe ser una lista de ids separados por coma.'})
+        ids.append(int(valor))
+    return ids
+
+
+class TestimonioFilterBackend(BaseFilterBackend):
+    """
+    Aplica los filtros y el orden de ?categoria, ?ranking_min, ... al queryset de testimonios.
+
+    El filtro por estado solo se acepta en las vistas que declaran filtro_estado = True
+    (la de editores); en los listados públicos el estado siempre es APROBADO.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        categorias = _ids(request, 'categoria')
+        if categorias:
+            queryset = queryset.filter(categoria_id__in=categorias)
+
+        ranking_min = _ranking(request, 'ranking_min')
+        if ranking_min is not None:
+            queryset = queryset.filter(ranking__gte=ranking_min)
+        ranking_max = _ranking(request, 'ranking_max')
+        if ranking_max is not None:
+            queryset = queryset.filter(ranking__lte=ranking_max)
+
+        desde = _fecha(request, 'desde')
+        if desde is not None:
+            queryset = queryset.filter(fecha_comentario__gte=_inicio_del_dia(desde))
+        hasta = _fecha(request, 'hasta')
+        # 👇 Inclusive: hasta el comienzo del día siguiente (el último día posible no limita nada)
+        if hasta is not None and hasta < date.max:
+            queryset = queryset.filter(fecha_comentario__lt=_inicio_del_dia(hasta + timedelta(days=1)))
+
+        con_media = request.query_params.get('con_media', '').lower()
+        if con_media in VALORES_VERDADEROS:
+            queryset = queryset.filter(tiene_media=True)
+        elif con_media in VALORES_FALSOS:
+            queryset = queryset.filter(tiene_media=False)
+        elif con_media:
+            raise ValidationError({'con_media': 'Debe ser true o false.'})
+
+        if getattr(view, 'filtro_estado', False):
+            estados = _lista(request, 'estado')
+            if estados:
+                validos = dict(Testimonios.OPCIONES_ESTADOS)
+                if not all(estado in validos for estado in estados):
+                    raise ValidationError({'estado': f"Valores posibles: {', '.join(validos)}."})
+                queryset = queryset.filter(estado__in=estados)
+
+        return queryset.order_by(*ordenamiento_solicitado(request))
+
+    def get_schema_operation_parameters(self, view):
+        parametros = [
+            ('categoria', 'string', 'Ids de categoría separados por coma.'),
+            ('ranking_min', 'number', 'Ranking mínimo (0 a 5).'),
+            ('ranking_max', 'number', 'Ranking máximo (0 a 5).'),
+            ('desde', 'string', 'Fecha mínima del comentario (YYYY-MM-DD, inclusive).'),
+            ('hasta', 'string', 'Fecha máxima del comentario (YYYY-MM-DD, inclusive).'),
+            ('con_media', 'boolean', 'true: solo testimonios con archivos; false: solo sin archivos.'),
+            ('orden', 'string', f"Orden de los resultados: {', '.join(ORDENAMIENTOS)} (por defecto {ORDEN_POR_DEFECTO})."),
+        ]
+        if getattr(view, 'filtro_estado', False):
+            parametros.append(('estado', 'string', 'Códigos de estado separados por coma (E, A, R, ...).'))
+
+        return [
+            {
+                'name': nombre,
+                'required': False,
+                'in': 'query',
+                'description': descripcion,
+                'schema': {'type': tipo},
+            }
+            for nombre, tipo, descripcion in parametros
+        ]
@@ -0,0 +1,175 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from app.filtros import ORDENAMIENTOS
+from app.models import Categoria, Organizacion, Testimonios
+
+
+class Rollback(Exception):
+    """Se lanza al final para deshacer los datos sembrados y los índices quitados"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra testimonios de prueba y muestra el plan (EXPLAIN) y el tiempo de las consultas '
+        'frecuentes SIN y CON los índices de Testimonios. Todo corre en una transacción que se deshace, '
+        'pero mientras dura los índices de app_testimonios están borrados y la tabla queda bloqueada '
+        '(ACCESS EXCLUSIVE en PostgreSQL). Correrlo contra una base descartable con --database=<alias> '
+        '(otra entrada de DATABASES, distinta de la default); contra la base default solo con --confirmar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Alias de la base descartable donde correr el benchmark (una entrada de DATABASES)'
+        )
+        parser.add_argument(
+            '--confirmar', action='store_true',
+            help='Correr igual contra la base default (bloquea app_testimonios hasta que termine)'
+        )
+        parser.add_argument('--organizaciones', type=int, default=50, help='Organizaciones a sembrar')
+        parser.add_argument('--testimonios', type=int, default=2000, help='Testimonios por organización')
+        parser.add_argument('--repeticiones', type=int, default=20, help='Veces que se ejecuta cada consulta')
+
+    def handle(self, *args, **options):
+        self.db = options['database']
+        if self.db not in connections.settings:
+            raise CommandError(f"La base '{self.db}' no está en DATABASES.")
+        # 👇 Una base es descartable si no es la default (ni otro alias que apunte a la misma)
+        descartable = connections[self.db].settings_dict['NAME'] != connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+        if not descartable and not options['confirmar']:
+            raise CommandError(
+                "El benchmark borra los índices de app_testimonios y bloquea la tabla mientras corre. "
+                "Usar --database=<alias> con una base descartable, o --confirmar para correrlo en la base default."
+            )
+        self.connection = connections[self.db]
+
+        try:
+            with transaction.atomic(using=self.db):
+                organizacion = self.sembrar(options['organizaciones'], options['testimonios'])
+                consultas = self.consultas(organizacion)
+
+                self.stdout.write(self.style.MIGRATE_HEADING('\n=== SIN índices ==='))
+                self.quitar_indices()
+                self.medir(consultas, options['repeticiones'])
+
+                self.stdout.write(self.style.MIGRATE_HEADING('\n=== CON índices ==='))
+                self.restaurar_indices()
+                self.medir(consultas, options['repeticiones'])
+                raise Rollback()
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS('\n✅ Benchmark terminado, datos de prueba descartados'))
+
+    def sembrar(self, cantidad_organizaciones, testimonios_por_organizacion):
+        self.stdout.write(
+            f"Sembrando {cantidad_organizaciones} organizaciones x {testimonios_por_organizacion} testimonios..."
+        )
+        categorias = [
+            Categoria.objects.using(self.db).create(nombre_categoria=f'benchmark-indices-{i}', icono='-', color='-')
+            for i in range(4)
+        ]
+        estados = ['A', 'A', 'A', 'E', 'R', 'P', 'B', 'O']
+
+        organizaciones = []
+        for i in range(cantidad_organizaciones):
+            organizacion = Organizacion.objects.using(self.db).create(
+                organizacion_nombre=f'benchmark-org-{i}', dominio=f'benchmark-{i}.test'
+            )
+            organizaciones.append(organizacion)
+            # bulk_create no dispara señales: el resumen de la organización no importa acá
+            Testimonios.objects.using(self.db).bulk_create([
+                Testimonios(
+                    organizacion=organizacion,
+                    usuario_anonimo_username=f'anonimo{j}',
+                    usuario_anonimo_email=f'anonimo{j}@benchmark.test',
+                    api_key=organizacion.api_key,
+                    comentario='benchmark',
+                    categoria=categorias[j % len(categorias)],
+                    ranking=(j % 5) + 1,
+                    tiene_media=j % 7 == 0,
+                    estado=estados[j % len(estados)],
+                    feedback='benchmark' if estados[j % len(estados)] == 'R' else None,
+                )
+                for j in range(testimonios_por_organizacion)
+            ], batch_size=1000)
+
+        self.analizar()
+        # Se mide sobre una organización del medio para no favorecer a la primera o la última
+        self.categoria = categorias[0]
+        return organizaciones[len(organizaciones) // 2]
+
+    def consultas(self, organizacion):
+        orden = ('-fecha_comentario', '-id')
+        testimonios = Testimonios.objects.using(self.db)
+        return {
+            'testimonios_aprobados (organización)': testimonios.filter(
+                organizacion=organizacion, estado='A'
+            ).order_by(*orden)[:20],
+            'listado público (aprobados)': testimonios.filter(estado='A').order_by(*orden)[:20],
+            'moderación (en espera)': testimonios.filter(
+                organizacion=organizacion, estado='E'
+            ).order_by(*orden)[:20],
+            'editor (organización sin borradores)': testimonios.filter(
+                organizacion=organizacion
+            ).exclude(estado='B').order_by(*orden)[:20],
+            # 👇 Filtros y ordenamientos de app/filtros.py
+            'aprobados por categoría (organización)': testimonios.filter(
+                organizacion=organizacion, estado='A', categoria=self.categoria
+            ).order_by(*orden)[:20],
+            'aprobados mejor puntuados (organización)': testimonios.filter(
+                organizacion=organizacion, estado='A', ranking__gte=4
+            ).order_by(*ORDENAMIENTOS['mejor'])[:20],
+            'aprobados con media (organización)': testimonios.filter(
+                organizacion=organizacion, estado='A', tiene_media=True
+            ).order_by(*orden)[:20],
+            'listado público por categoría': testimonios.filter(
+                estado='A', categoria=self.categoria
+            ).order_by(*orden)[:20],
+            'listado público mejor puntuados': testimonios.filter(
+                estado='A'
+            ).order_by(*ORDENAMIENTOS['mejor'])[:20],
+            'listado público con media': testimonios.filter(
+                estado='A', tiene_media=True
+            ).order_by(*orden)[:20],
+        }
+
+    def indices(self):
+        return Testimonios._meta.indexes
+
+    def quitar_indices(self):
+        with self.connection.cursor() as cursor:
+            for indice in self.indices():
+                cursor.execute(f'DROP INDEX {self.connection.ops.quote_name(indice.name)}')
+        self.analizar()
+
+    def restaurar_indices(self):
+        # El schema editor solo se usa para generar el CREATE INDEX (sin entrar al contexto, que en
+        # SQLite no se permite dentro de una transacción); todo se deshace con el rollback final
+        editor = self.connection.schema_editor()
+        with self.connection.cursor() as cursor:
+            for indice in self.indices():
+                cursor.execute(str(indice.create_sql(Testimonios, editor)))
+        self.analizar()
+
+    def analizar(self):
+        # Actualizar estadísticas para que el planificador vea los datos recién sembrados
+        with self.connection.cursor() as cursor:
+            if self.connection.vendor == 'postgresql':
+                cursor.execute(f'ANALYZE {Testimonios._meta.db_table}')
+            elif self.connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+
+    def medir(self, consultas, repeticiones):
+        for nombre, queryset in consultas.items():
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                list(queryset.all())
+                tiempos.append(time.perf_counter() - inicio)
+            tiempos.sort()
+            mediana = tiempos[len(tiempos) // 2] * 1000
+
+            self.stdout.write(self.style.HTTP_INFO(f"\n-- {nombre}: mediana {mediana:.2f} ms"))
+            self.stdout.write(queryset.explain())
@@ -0,0 +1,61 @@
+import io
+
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from app.management.commands.benchmark_serializacion import Command as BenchmarkSerializacion, Rollback
+from app.parsers import JSONRapidoParser
+from app.renderers import JSONRapidoRenderer, orjson
+from app.serializacion import serializar_lista
+from app.serializers import TestimonioAprobadoSerializer, TestimonioSerializer
+
+
+class Command(BenchmarkSerializacion):
+    help = (
+        'Siembra testimonios de prueba y compara el JSONRenderer/JSONParser de DRF contra los de orjson '
+        '(app/renderers.py, app/parsers.py) sobre los listados más grandes: tiempo y bytes. '
+        'Todo corre en una transacción que se deshace.'
+    )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('⚠️ orjson no está instalado: los dos caminos son el de DRF'))
+
+        filas = options['filas']
+        try:
+            with transaction.atomic():
+                queryset = self.sembrar(filas)
+                for serializer_class in (TestimonioSerializer, TestimonioAprobadoSerializer):
+                    data = serializar_lista(serializer_class, queryset)
+                    self.stdout.write(self.style.MIGRATE_HEADING(
+                        f'\n=== Listado de {filas} filas con {serializer_class.__name__} ==='
+                    ))
+                    self.comparar_json(data, options['repeticiones'])
+                raise Rollback()
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS('\n✅ Benchmark terminado, datos de prueba descartados'))
+
+    def comparar_json(self, data, repeticiones):
+        json_drf = JSONRenderer().render(data)
+        json_rapido = JSONRapidoRenderer().render(data)
+        igual = '✅ idénticos' if json_drf == json_rapido else '❌ DISTINTOS'
+        self.stdout.write(f"bytes: DRF {len(json_drf)} | orjson {len(json_rapido)} ({igual})")
+
+        casos = {
+            'render': (
+                lambda: JSONRenderer().render(data),
+                lambda: JSONRapidoRenderer().render(data),
+            ),
+            'parse': (
+                lambda: JSONParser().parse(io.BytesIO(json_drf)),
+                lambda: JSONRapidoParser().parse(io.BytesIO(json_drf)),
+            ),
+        }
+        for nombre, (drf, rapido) in casos.items():
+            tiempo_drf = self.medir(drf, repeticiones)
+            tiempo_rapido = self.medir(rapido, repeticiones)
+            self.stdout.write(
+                f"{nombre:>7}: DRF {tiempo_drf * 1000:7.1f} ms | orjson {tiempo_rapido * 1000:7.1f} ms"
+                f" | mejora x{tiempo_drf / tiempo_rapido:.1f}"
+            )
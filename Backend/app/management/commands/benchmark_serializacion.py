@@ -0,0 +1,106 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.models import Categoria, Organizacion, Testimonios, User
+from app.serializacion import SerializadorRapido
+from app.serializers import TestimonioAprobadoSerializer, TestimonioSerializer
+
+
+class Rollback(Exception):
+    """Se lanza al final para deshacer los datos sembrados"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra testimonios de prueba y compara el serializer de DRF contra el camino rápido '
+        '(values() + mapeadores, ver app/serializacion.py). Todo corre en una transacción que se deshace.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=10000, help='Testimonios a serializar')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Veces que se mide cada camino')
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        try:
+            with transaction.atomic():
+                queryset = self.sembrar(filas)
+                for serializer_class in (TestimonioSerializer, TestimonioAprobadoSerializer):
+                    self.stdout.write(self.style.MIGRATE_HEADING(f'\n=== {serializer_class.__name__} ==='))
+                    self.comparar(serializer_class, queryset, filas, options['repeticiones'])
+                raise Rollback()
+        except Rollback:
+            self.stdout.write(self.style.SUCCESS('\n✅ Benchmark terminado, datos de prueba descartados'))
+
+    def sembrar(self, cantidad):
+        self.stdout.write(f"Sembrando {cantidad} testimonios...")
+        categoria = Categoria.objects.create(nombre_categoria='benchmark-serializacion', icono='-', color='-')
+        organizacion = Organizacion.objects.create(
+            organizacion_nombre='benchmark-serializacion', dominio='benchmark-serializacion.test'
+        )
+        # Un testimonio por usuario registrado y organización: la mitad registrados, la mitad anónimos
+        usuarios = User.objects.bulk_create([
+            User(username=f'benchmark{i}', email=f'benchmark{i}@benchmark.test')
+            for i in range(cantidad // 2)
+        ], batch_size=1000)
+
+        Testimonios.objects.bulk_create([
+            Testimonios(
+                organizacion=organizacion,
+                usuario_registrado=usuarios[i // 2] if i % 2 == 0 else None,
+                usuario_anonimo_username=None if i % 2 == 0 else f'anonimo{i}',
+                usuario_anonimo_email=None if i % 2 == 0 else f'anonimo{i}@benchmark.test',
+                api_key=organizacion.api_key,
+                comentario=f'Comentario de prueba número {i}',
+                categoria=categoria,
+                ranking=(i % 5) + 1,
+                archivos=['https://example.com/foto.jpg'] if i % 3 == 0 else [],
+                estado='A',
+            )
+            for i in range(cantidad)
+        ], batch_size=1000)
+
+        return Testimonios.objects.filter(organizacion=organizacion).order_by('-fecha_comentario', '-id')
+
+    def medir(self, funcion, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        tiempos.sort()
+        return tiempos[len(tiempos) // 2]
+
+    def comparar(self, serializer_class, queryset, filas, repeticiones):
+        meta = serializer_class.Meta
+        # 👇 El camino de DRF con las mismas relaciones y columnas que usan las vistas
+        queryset_drf = queryset.select_related(*getattr(meta, 'select_related', []))
+        if getattr(meta, 'only', None):
+            queryset_drf = queryset_drf.only(*meta.only)
+
+        rapido = SerializadorRapido(serializer_class)
+        instancias = list(queryset_drf)
+        valores = list(rapido.filas(queryset))
+
+        casos = {
+            'solo serialización': (
+                lambda: serializer_class(instancias, many=True).data,
+                lambda: rapido.serializar(valores),
+            ),
+            'consulta + serialización': (
+                lambda: serializer_class(queryset_drf.all(), many=True).data,
+                lambda: rapido.serializar(rapido.filas(queryset.all())),
+            ),
+        }
+        for nombre, (drf, camino_rapido) in casos.items():
+            tiempo_drf = self.medir(drf, repeticiones)
+            tiempo_rapido = self.medir(camino_rapido, repeticiones)
+            self.stdout.write(self.style.HTTP_INFO(f"\n-- {nombre} ({filas} filas)"))
+            for etiqueta, tiempo in (('DRF', tiempo_drf), ('rápido', tiempo_rapido)):
+                self.stdout.write(
+                    f"{etiqueta:>8}: {tiempo * 1000:8.1f} ms | {tiempo * 10000 / filas * 1000:8.1f} ms cada 10k filas"
+                    f" | {filas / tiempo:10.0f} filas/s"
+                )
+            self.stdout.write(f"  mejora: x{tiempo_drf / tiempo_rapido:.1f}")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Organizacion
+from app.snapshots import publicar_snapshots, url_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Publica los snapshots JSON de testimonios aprobados de las organizaciones en el storage configurado'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'organizaciones', nargs='*', type=int,
+            help='IDs de las organizaciones a publicar (por defecto todas)'
+        )
+
+    def handle(self, *args, **options):
+        ids = options['organizaciones'] or list(Organizacion.objects.values_list('id', flat=True))
+
+        for organizacion_id in ids:
+            snapshot = publicar_snapshots(organizacion_id)
+            if snapshot is None:
+                self.stdout.write(self.style.WARNING(f"Organizacion {organizacion_id}: no existe"))
+                continue
+            self.stdout.write(
+                f"Organizacion {organizacion_id}: {snapshot['total_testimonios']} aprobados, "
+                f"versión {snapshot['version']} -> {url_snapshot(organizacion_id)}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {len(ids)} snapshot(s) publicado(s)"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Organizacion, ResumenOrganizacion
+
+
+class Command(BaseCommand):
+    help = 'Recalcula desde cero el resumen de testimonios (conteos, suma de rankings e histograma) de las organizaciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'organizaciones', nargs='*', type=int,
+            help='IDs de las organizaciones a recalcular (por defecto todas)'
+        )
+
+    def handle(self, *args, **options):
+        ids = options['organizaciones'] or list(Organizacion.objects.values_list('id', flat=True))
+
+        for organizacion_id in ids:
+            resumen = ResumenOrganizacion.reconstruir(organizacion_id)
+            self.stdout.write(
+                f"Organizacion {organizacion_id}: {resumen.total_testimonios} testimonios, "
+                f"{resumen.cantidad_aprobados} aprobados, promedio {resumen.promedio_ranking}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {len(ids)} resumen(es) reconstruido(s)"))
@@ -1,6 +1,6 @@
 # app/migrations/0002_add_feedback.py
 
-from django.db import migrations, models
+from django.db import migrations
 
 class Migration(migrations.Migration):
 
@@ -8,10 +8,6 @@ class Migration(migrations.Migration):
         ('app', '0001_initial'), # Asegúrate de que este es el nombre de tu migración inicial
     ]
 
-    operations = [
-        migrations.AddField(
-            model_name='testimonios',
-            name='feedback',
-            field=models.CharField(blank=True, max_length=512, null=True),
-        ),
-    ]
\ No newline at end of file
+    # 👇 La columna 'feedback' ya se crea en 0001_initial: volver a agregarla rompía las bases
+    # nuevas (por ejemplo la de los tests). Se deja vacía para no alterar el historial aplicado.
+    operations = []
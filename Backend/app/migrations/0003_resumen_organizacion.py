@@ -0,0 +1,62 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_resumenes(apps, schema_editor):
+    """Calcula el resumen inicial de cada organización existente"""
+    Organizacion = apps.get_model('app', 'Organizacion')
+    Testimonios = apps.get_model('app', 'Testimonios')
+    ResumenOrganizacion = apps.get_model('app', 'ResumenOrganizacion')
+    # La base que se está migrando (no siempre la default)
+    db = schema_editor.connection.alias
+    campos_estado = {
+        'E': 'cantidad_espera', 'A': 'cantidad_aprobados', 'R': 'cantidad_rechazados',
+        'P': 'cantidad_publicados', 'B': 'cantidad_borradores', 'O': 'cantidad_ocultos',
+    }
+
+    for organizacion_id in Organizacion.objects.using(db).values_list('id', flat=True):
+        valores = {'organizacion_id': organizacion_id, 'suma_ranking_aprobados': 0}
+        testimonios = Testimonios.objects.using(db).filter(organizacion_id=organizacion_id).order_by()
+        for fila in testimonios.values('estado').annotate(cantidad=models.Count('id')):
+            if fila['estado'] in campos_estado:
+                valores[campos_estado[fila['estado']]] = fila['cantidad']
+        for fila in testimonios.filter(estado='A').values('ranking').annotate(cantidad=models.Count('id')):
+            valores['suma_ranking_aprobados'] += fila['ranking'] * fila['cantidad']
+            campo = f"estrellas_{min(5, max(1, int(fila['ranking'] or 0)))}"
+            valores[campo] = valores.get(campo, 0) + fila['cantidad']
+        ResumenOrganizacion.objects.using(db).create(**valores)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_add_feedback'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenOrganizacion',
+            fields=[
+                ('organizacion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='app.organizacion')),
+                ('cantidad_espera', models.IntegerField(default=0)),
+                ('cantidad_aprobados', models.IntegerField(default=0)),
+                ('cantidad_rechazados', models.IntegerField(default=0)),
+                ('cantidad_publicados', models.IntegerField(default=0)),
+                ('cantidad_borradores', models.IntegerField(default=0)),
+                ('cantidad_ocultos', models.IntegerField(default=0)),
+                ('suma_ranking_aprobados', models.DecimalField(decimal_places=1, default=0, max_digits=12)),
+                ('estrellas_1', models.IntegerField(default=0)),
+                ('estrellas_2', models.IntegerField(default=0)),
+                ('estrellas_3', models.IntegerField(default=0)),
+                ('estrellas_4', models.IntegerField(default=0)),
+                ('estrellas_5', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Organizacion',
+                'verbose_name_plural': 'Resumenes de Organizaciones',
+            },
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
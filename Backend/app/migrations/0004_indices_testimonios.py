@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:07
+
+from django.db import migrations, models
+
+from app.indices import AgregarIndiceConcurrente
+
+
+class Migration(migrations.Migration):
+    # 👇 Los índices se crean CONCURRENTLY, fuera de una transacción, para no bloquear escrituras
+    atomic = False
+
+    dependencies = [
+        ('app', '0003_resumen_organizacion'),
+    ]
+
+    operations = [
+        AgregarIndiceConcurrente(
+            model_name='testimonios',
+            index=models.Index(fields=['organizacion', 'estado', '-fecha_comentario', '-id'], name='testimonio_org_est_fecha_idx'),
+        ),
+        AgregarIndiceConcurrente(
+            model_name='testimonios',
+            index=models.Index(condition=models.Q(('estado', 'A')), fields=['organizacion', '-fecha_comentario', '-id'], name='testimonio_aprobados_idx'),
+        ),
+        AgregarIndiceConcurrente(
+            model_name='testimonios',
+            index=models.Index(condition=models.Q(('estado', 'A')), fields=['-fecha_comentario', '-id'], name='testimonio_publicos_idx'),
+        ),
+        AgregarIndiceConcurrente(
+            model_name='testimonios',
+            index=models.Index(condition=models.Q(('estado', 'E')), fields=['organizacion', '-fecha_comentario', '-id'], name='testimonio_espera_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:15
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# 👇 Solo en PostgreSQL: trigger que mantiene el tsvector (configuración 'spanish').
+# El índice GIN y el relleno de los testimonios existentes van en 0008, fuera de una transacción.
+# En otros motores (SQLite en desarrollo) el campo queda vacío y la búsqueda usa icontains.
+SQL_CREAR = """
+CREATE OR REPLACE FUNCTION app_testimonios_busqueda_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.busqueda :=
+        setweight(to_tsvector('spanish', coalesce(NEW.comentario, '')), 'A') ||
+        setweight(to_tsvector('spanish',
+            coalesce(NEW.usuario_anonimo_username, '') || ' ' ||
+            coalesce((SELECT username FROM app_user WHERE id = NEW.usuario_registrado_id), '')
+        ), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_testimonios_busqueda
+    BEFORE INSERT OR UPDATE OF comentario, usuario_anonimo_username, usuario_registrado_id
+    ON app_testimonios
+    FOR EACH ROW EXECUTE FUNCTION app_testimonios_busqueda_trigger();
+
+-- Si un usuario cambia su username, recalcular el vector de sus testimonios
+CREATE OR REPLACE FUNCTION app_user_busqueda_trigger() RETURNS trigger AS $$
+BEGIN
+    IF NEW.username IS DISTINCT FROM OLD.username THEN
+        UPDATE app_testimonios SET comentario = comentario WHERE usuario_registrado_id = NEW.id;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_user_busqueda
+    AFTER UPDATE OF username ON app_user
+    FOR EACH ROW EXECUTE FUNCTION app_user_busqueda_trigger();
+"""
+
+SQL_BORRAR = """
+DROP TRIGGER IF EXISTS app_user_busqueda ON app_user;
+DROP FUNCTION IF EXISTS app_user_busqueda_trigger();
+DROP TRIGGER IF EXISTS app_testimonios_busqueda ON app_testimonios;
+DROP FUNCTION IF EXISTS app_testimonios_busqueda_trigger();
+"""
+
+
+def crear_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SQL_CREAR, params=None)
+
+
+def borrar_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SQL_BORRAR, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_indices_testimonios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testimonios',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(crear_busqueda, borrar_busqueda),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:19
+
+from django.db import migrations, models
+
+from app.indices import AgregarIndiceConcurrente
+
+
+def completar_tiene_media(apps, schema_editor):
+    # Marcar los testimonios existentes que ya tienen archivos (null y [] quedan en False)
+    Testimonios = apps.get_model('app', 'Testimonios')
+    testimonios = Testimonios.objects.using(schema_editor.connection.alias)
+    con_media = [
+        pk for pk, archivos in testimonios.values_list('id', 'archivos').iterator()
+        if archivos
+    ]
+    for inicio in range(0, len(con_media), 1000):
+        testimonios.filter(id__in=con_media[inicio:inicio + 1000]).update(tiene_media=True)
+
+
+class Migration(migrations.Migration):
+    # 👇 Los índices se crean CONCURRENTLY, fuera de una transacción, para no bloquear escrituras
+    atomic = False
+
+    dependencies = [
+        ('app', '0005_busqueda_testimonios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testimonios',
+            name='tiene_media',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        # El relleno de tiene_media sí va en su propia transacción
+        migrations.RunPython(completar_tiene_media, migrations.RunPython.noop, atomic=True),
+        AgregarIndiceConcurrente(
+            model_name='testimonios',
+            index=models.Index(fields=['organizacion', 'estado', 'categoria', '-fecha_comentario', '-id'], name='testimonio_org_est_cat_idx'),
+        ),
+        AgregarIndiceConcurrente(
+            model_name='testimonios',
+            index=models.Index(fields=['organizacion', 'estado', '-ranking', '-tiene_media', '-fecha_comentario', '-id'], name='testimonio_org_est_rank_idx'),
+        ),
+        AgregarIndiceConcurrente(
+            model_name='testimonios',
+            index=models.Index(condition=models.Q(('tiene_media', True)), fields=['organizacion', 'estado', '-fecha_comentario', '-id'], name='testimonio_org_est_media_idx'),
+        ),
+        AgregarIndiceConcurrente(
+            model_name='testimonios',
+            index=models.Index(condition=models.Q(('estado', 'A')), fields=['categoria', '-fecha_comentario', '-id'], name='testimonio_publicos_cat_idx'),
+        ),
+        AgregarIndiceConcurrente(
+            model_name='testimonios',
+            index=models.Index(condition=models.Q(('estado', 'A')), fields=['-ranking', '-tiene_media', '-fecha_comentario', '-id'], name='testimonio_publicos_rank_idx'),
+        ),
+        AgregarIndiceConcurrente(
+            model_name='testimonios',
+            index=models.Index(condition=models.Q(('estado', 'A'), ('tiene_media', True)), fields=['-fecha_comentario', '-id'], name='testimonio_publicos_media_idx'),
+        ),
+    ]
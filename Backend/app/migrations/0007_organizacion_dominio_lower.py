@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:41
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_filtros_testimonios'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='organizacion',
+            index=models.Index(django.db.models.functions.text.Lower('dominio'), name='organizacion_dominio_lower_idx'),
+        ),
+    ]
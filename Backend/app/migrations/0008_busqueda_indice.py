@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Testimonios por lote al completar el vector: cada lote es una transacción corta
+LOTE = 1000
+
+
+def completar_busqueda(apps, schema_editor):
+    # 👇 Solo en PostgreSQL (ver 0005). Por rangos de id y solo las filas sin vector: si se corta, se retoma
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT coalesce(max(id), 0) FROM app_testimonios")
+        maximo = cursor.fetchone()[0]
+        for inicio in range(0, maximo, LOTE):
+            # SET comentario = comentario dispara el trigger que arma el vector
+            cursor.execute(
+                "UPDATE app_testimonios SET comentario = comentario "
+                "WHERE id > %s AND id <= %s AND busqueda IS NULL",
+                [inicio, inicio + LOTE],
+            )
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS testimonio_busqueda_idx ON app_testimonios USING gin (busqueda)"
+        )
+
+
+def borrar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX CONCURRENTLY IF EXISTS testimonio_busqueda_idx")
+
+
+class Migration(migrations.Migration):
+    # 👇 Sin transacción: el relleno va por lotes y el índice se crea CONCURRENTLY, sin bloquear escrituras
+    atomic = False
+
+    dependencies = [
+        ('app', '0007_organizacion_dominio_lower'),
+    ]
+
+    operations = [
+        migrations.RunPython(completar_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
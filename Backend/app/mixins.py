@@ -0,0 +1,197 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.cache import patch_cache_control
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from .cdn import METODOS_CACHEABLES, es_cacheable
+
+
+def _lista_parametro(request, parametro):
+    valor = request.query_params.get(parametro, '')
+    return [parte.strip() for parte in valor.split(',') if parte.strip()]
+
+
+class CamposDinamicosMixin:
+    """
+    Mixin para serializers: el cliente elige qué campos recibe.
+
+      ?fields=id,comentario,ranking   -> solo esos campos
+      ?omit=archivos_urls,feedback    -> todos menos esos
+
+    Solo en lecturas (GET) y en los serializers que reciben el request en el contexto;
+    al crear o modificar siempre se valida y se responde con el serializer completo.
+    Los campos se quitan al construir el serializer, asi RelacionesSerializerMixin
+    puede cargar de la base de datos solo las columnas que se van a devolver.
+    """
+    campos_query_param = 'fields'
+    omitir_query_param = 'omit'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.campos_recortados = False
+
+        request = self.context.get('request')
+        if request is None or not hasattr(request, 'query_params') or request.method not in SAFE_METHODS:
+            return
+
+        campos = _lista_parametro(request, self.campos_query_param)
+        omitir = _lista_parametro(request, self.omitir_query_param)
+        if not campos and not omitir:
+            return
+
+        # 👇 Un nombre que no existe es casi siempre un error de tipeo: mejor avisar que devolver {}
+        desconocidos = set(campos + omitir) - set(self.fields)
+        if desconocidos:
+            raise serializers.ValidationError({
+                self.campos_query_param: f"Campos inexistentes: {', '.join(sorted(desconocidos))}. "
+                                         f"Campos válidos: {', '.join(self.fields)}"
+            })
+
+        for nombre in list(self.fields):
+            if (campos and nombre not in campos) or nombre in omitir:
+                self.fields.pop(nombre)
+        self.campos_recortados = True
+
+
+def _resolver_ruta(modelo, ruta):
+    """Campos del modelo que recorre una ruta 'organizacion__organizacion_nombre' (o None si no existe)"""
+    campos = []
+    for parte in ruta.split('__'):
+        if modelo is None:
+            return None
+        try:
+            campo = modelo._meta.get_field(parte)
+        except FieldDoesNotExist:
+            return None
+        campos.append(campo)
+        modelo = campo.related_model
+    return campos
+
+
+def rutas_serializer(serializer):
+    """
+    Rutas del modelo ('categoria__nombre_categoria', 'editores', ...) que lee el serializer
+    con los campos que le quedaron. Los campos calculados (SerializerMethodField, source='*')
+    declaran las suyas en Meta.columnas; si alguno no las declara devuelve None
+    (no se sabe qué lee, entonces no se recorta nada).
+    """
+    meta = getattr(serializer, 'Meta', None)
+    modelo = getattr(meta, 'model', None)
+    columnas = getattr(meta, 'columnas', {})
+
+    rutas = set()
+    for nombre, campo in serializer.fields.items():
+        if campo.write_only:
+            continue
+        if nombre in columnas:
+            rutas.update(columnas[nombre])
+            continue
+        if campo.source == '*':
+            return None
+        rutas.add('__'.join(campo.source_attrs))
+
+    if modelo is None or any(_resolver_ruta(modelo, ruta) is None for ruta in rutas):
+        return None
+    return rutas
+
+
+class RelacionesSerializerMixin:
+    """
+    Mixin para ViewSets: aplica al queryset las relaciones que declara el serializer.
+
+    El serializer declara en su Meta:
+      - select_related: relaciones que lee al serializar (organizacion, categoria, ...)
+      - prefetch_related: relaciones many-to-many que recorre (editores, visitantes, ...)
+      - only: columnas que realmente usa, incluidas las de las relaciones (solo en lecturas)
+      - columnas: qué rutas del modelo lee cada campo calculado (ver CamposDinamicosMixin)
+
+    Asi un listado de N testimonios cuesta siempre la misma cantidad de consultas,
+    en lugar de 1 + N por cada relación. Si el cliente pidió menos campos (?fields= / ?omit=)
+    solo se cargan las relaciones y columnas de esos campos.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer = self.get_serializer()
+        meta = getattr(serializer, 'Meta', None)
+
+        rutas = rutas_serializer(serializer) if getattr(serializer, 'campos_recortados', False) else None
+
+        def se_usa(relacion):
+            return rutas is None or any(ruta == relacion or ruta.startswith(f'{relacion}__') for ruta in rutas)
+
+        # 👇 select_related solo si se lee algo MÁS que la clave foránea (el id ya está en la tabla)
+        select_related = [
+            relacion for relacion in getattr(meta, 'select_related', None) or []
+            if rutas is None or any(ruta.startswith(f'{relacion}__') for ruta in rutas)
+        ]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+
+        prefetch_related = [relacion for relacion in getattr(meta, 'prefetch_related', None) or [] if se_usa(relacion)]
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+
+        # 👇 only() solo en lecturas: al guardar una instancia con campos diferidos
+        # cualquier acceso a ellos sería una consulta extra
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+
+        if rutas is not None:
+            only = self._columnas(queryset.model, rutas, select_related)
+        else:
+            only = getattr(meta, 'only', None)
+
+        if only:
+            queryset = queryset.only(*only, *self._columnas_orden(queryset))
+        return queryset
+
+    def _columnas(self, modelo, rutas, select_related):
+        """Columnas para only(): las de la tabla y las de las relaciones que se traen con select_related"""
+        columnas = {modelo._meta.pk.name}
+        for ruta in rutas:
+            campos = _resolver_ruta(modelo, ruta)
+            # Las many-to-many y relaciones inversas van por prefetch_related, no son columnas
+            if any(campo.many_to_many or campo.one_to_many or not campo.concrete for campo in campos):
+                continue
+            if len(campos) == 1 or ruta.rsplit('__', 1)[0] in select_related:
+                columnas.add(ruta)
+            columnas.add(campos[0].name)
+        columnas.update(select_related)
+        return columnas
+
+    def _columnas_orden(self, queryset):
+        # Las columnas del orden también hacen falta: la paginación por cursor las lee del último registro
+        columnas = []
+        for orden in queryset.query.order_by:
+            if isinstance(orden, str) and _resolver_ruta(queryset.model, orden.lstrip('-')) is not None:
+                columnas.append(orden.lstrip('-'))
+        return columnas
+
+
+class PoliticaCacheMixin:
+    """
+    Mixin para vistas: aplica la PoliticaCache (cdn.py) declarada para la acción.
+
+        politicas_cache = {'list': PoliticaCache(...), 'retrieve': PoliticaCache(...)}
+
+    En las vistas que no son ViewSets la clave es el método ('get').
+    Las peticiones autenticadas o que fallan nunca quedan públicas: salen con Cache-Control private.
+    """
+    politicas_cache = {}
+
+    def get_etiquetas_cache(self, politica):
+        return [etiqueta.format(**self.kwargs) for etiqueta in politica.etiquetas]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        politica = self.politicas_cache.get(getattr(self, 'action', None) or request.method.lower())
+        if politica is None or request.method not in METODOS_CACHEABLES:
+            return response
+
+        if es_cacheable(request, response):
+            politica.aplicar(response, self.get_etiquetas_cache(politica))
+        else:
+            patch_cache_control(response, private=True, max_age=0)
+        return response
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.core.exceptions import ValidationError  # 👈 Agrega esta importación
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
@@ -7,6 +8,7 @@ from django_otp.plugins.otp_totp.models import TOTPDevice
 from django.contrib.auth.models import Group
 import uuid
 from cloudinary.models import CloudinaryField
+from django.contrib.postgres.search import SearchVectorField
 
 class Roles(Group):
     class Meta:
@@ -153,6 +155,11 @@ class Organizacion(models.Model):
         verbose_name = 'Organizacion'
         verbose_name_plural = 'Organizaciones'
         ordering = ['-id']  # Ordenar por ID descendente
+        # 👇 El alta de visitantes busca la organización por dominio sin importar mayúsculas:
+        # el índice único de 'dominio' no sirve para lower(dominio)
+        indexes = [
+            models.Index(Lower('dominio'), name='organizacion_dominio_lower_idx'),
+        ]
 
 
     def __str__(self):
@@ -163,6 +170,16 @@ class Organizacion(models.Model):
         if not self.api_key:
             self.api_key = str(uuid.uuid4())[:50]  # UUID truncado a 50 caracteres
         super().save(*args, **kwargs)
+        self._api_key_original = self.api_key
+        self._dominio_original = self.dominio
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 👇 Recordar la api_key y el dominio con los que se leyó, para sacar los viejos del cache si cambian
+        instance._api_key_original = instance.__dict__.get('api_key')
+        instance._dominio_original = instance.__dict__.get('dominio')
+        return instance
 
 
 class Categoria(models.Model):
@@ -208,6 +225,13 @@ class Testimonios(models.Model):
 
     estado = models.CharField(max_length=1, choices=OPCIONES_ESTADOS, default='E', verbose_name='Estado')
 
+    # 👇 Vector de búsqueda (comentario + nombre del autor). En PostgreSQL lo mantiene un trigger
+    # y tiene índice GIN (ver migraciones 0005 y 0008); la app nunca lo escribe
+    busqueda = SearchVectorField(null=True, editable=False)
+
+    # 👇 Derivado de 'archivos' (lo calcula save()): un JSON no se puede indexar para filtrar/ordenar
+    tiene_media = models.BooleanField(default=False, editable=False)
+
     class Meta:
         # Restricción para usuarios registrados
         unique_together = ('organizacion', 'usuario_registrado')
@@ -220,6 +244,60 @@ class Testimonios(models.Model):
                 condition=models.Q(usuario_registrado__isnull=True)  # Solo aplica para usuarios anónimos
             )
         ]
+        # 👇 Índices para los accesos frecuentes: por organización + estado, ordenados por fecha
+        # (el id desempata igual que la paginación por cursor)
+        indexes = [
+            models.Index(
+                fields=['organizacion', 'estado', '-fecha_comentario', '-id'],
+                name='testimonio_org_est_fecha_idx'
+            ),
+            # Parciales: solo indexan los aprobados (feeds públicos) y los en espera (moderación)
+            models.Index(
+                fields=['organizacion', '-fecha_comentario', '-id'],
+                name='testimonio_aprobados_idx',
+                condition=models.Q(estado='A')
+            ),
+            models.Index(
+                fields=['-fecha_comentario', '-id'],
+                name='testimonio_publicos_idx',
+                condition=models.Q(estado='A')
+            ),
+            models.Index(
+                fields=['organizacion', '-fecha_comentario', '-id'],
+                name='testimonio_espera_idx',
+                condition=models.Q(estado='E')
+            ),
+            # 👇 Filtros y ordenamientos de los listados (ver app/filtros.py): uno por combinación,
+            # por organización (editores y feed de la organización) y global (listado público)
+            models.Index(
+                fields=['organizacion', 'estado', 'categoria', '-fecha_comentario', '-id'],
+                name='testimonio_org_est_cat_idx'
+            ),
+            models.Index(
+                fields=['organizacion', 'estado', '-ranking', '-tiene_media', '-fecha_comentario', '-id'],
+                name='testimonio_org_est_rank_idx'
+            ),
+            models.Index(
+                fields=['organizacion', 'estado', '-fecha_comentario', '-id'],
+                name='testimonio_org_est_media_idx',
+                condition=models.Q(tiene_media=True)
+            ),
+            models.Index(
+                fields=['categoria', '-fecha_comentario', '-id'],
+                name='testimonio_publicos_cat_idx',
+                condition=models.Q(estado='A')
+            ),
+            models.Index(
+                fields=['-ranking', '-tiene_media', '-fecha_comentario', '-id'],
+                name='testimonio_publicos_rank_idx',
+                condition=models.Q(estado='A')
+            ),
+            models.Index(
+                fields=['-fecha_comentario', '-id'],
+                name='testimonio_publicos_media_idx',
+                condition=models.Q(estado='A', tiene_media=True)
+            ),
+        ]
         verbose_name = 'Testimonio'
         verbose_name_plural = 'Testimonios'
         ordering = ['-fecha_comentario']
@@ -262,5 +340,123 @@ class Testimonios(models.Model):
             self.estado = 'R'
             print(f"⚠️ Testimonio {self.id} automáticamente cambiado a RECHAZADO porque tiene feedback")
         
+        # 👇 Mantener el flag indexado en sincronía con los archivos
+        self.tiene_media = bool(self.archivos)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'archivos' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'tiene_media'}
+
         self.clean()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+        # Lo guardado pasa a ser el nuevo "original" para el resumen de la organización
+        self._estado_original = self.estado
+        self._ranking_original = self.ranking
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 👇 Recordar el estado y ranking con el que se leyó, para saber qué cambió al guardar
+        # sin volver a consultar la base de datos
+        instance._estado_original = instance.__dict__.get('estado')
+        instance._ranking_original = instance.__dict__.get('ranking')
+        return instance
+
+
+class ResumenOrganizacion(models.Model):
+    """
+    Resumen desnormalizado de los testimonios de una organización.
+    Se mantiene con F() en cada alta/baja/cambio de estado (ver signals.py),
+    asi las lecturas no tienen que agregar toda la tabla de testimonios.
+    """
+    CAMPOS_ESTADO = {
+        'E': 'cantidad_espera',
+        'A': 'cantidad_aprobados',
+        'R': 'cantidad_rechazados',
+        'P': 'cantidad_publicados',
+        'B': 'cantidad_borradores',
+        'O': 'cantidad_ocultos',
+    }
+
+    organizacion = models.OneToOneField(Organizacion, on_delete=models.CASCADE, primary_key=True, related_name='resumen')
+    cantidad_espera = models.IntegerField(default=0)
+    cantidad_aprobados = models.IntegerField(default=0)
+    cantidad_rechazados = models.IntegerField(default=0)
+    cantidad_publicados = models.IntegerField(default=0)
+    cantidad_borradores = models.IntegerField(default=0)
+    cantidad_ocultos = models.IntegerField(default=0)
+    # Suma de rankings e histograma de estrellas, solo de los testimonios APROBADOS
+    suma_ranking_aprobados = models.DecimalField(default=0, max_digits=12, decimal_places=1)
+    estrellas_1 = models.IntegerField(default=0)
+    estrellas_2 = models.IntegerField(default=0)
+    estrellas_3 = models.IntegerField(default=0)
+    estrellas_4 = models.IntegerField(default=0)
+    estrellas_5 = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Resumen de Organizacion'
+        verbose_name_plural = 'Resumenes de Organizaciones'
+
+    def __str__(self):
+        return f"Resumen de {self.organizacion_id}"
+
+    @property
+    def total_testimonios(self):
+        return sum(getattr(self, campo) for campo in self.CAMPOS_ESTADO.values())
+
+    @property
+    def promedio_ranking(self):
+        if not self.cantidad_aprobados:
+            return 0.0
+        return round(self.suma_ranking_aprobados / self.cantidad_aprobados, 1)
+
+    @property
+    def estrellas(self):
+        return {str(n): getattr(self, f'estrellas_{n}') for n in range(1, 6)}
+
+    @staticmethod
+    def campo_estrellas(ranking):
+        """Histograma por estrella entera: 4.5 cuenta como 4 estrellas"""
+        return f"estrellas_{min(5, max(1, int(ranking or 0)))}"
+
+    @classmethod
+    def aplicar_cambio(cls, organizacion_id, estado, ranking, signo):
+        """
+        Suma (signo=1) o resta (signo=-1) un testimonio al resumen usando F(),
+        sin leer el resumen primero. Si la organización todavía no tiene resumen, se reconstruye.
+        """
+        cambios = {}
+        campo_estado = cls.CAMPOS_ESTADO.get(estado)
+        if campo_estado:
+            cambios[campo_estado] = models.F(campo_estado) + signo
+        if estado == 'A':
+            cambios['suma_ranking_aprobados'] = models.F('suma_ranking_aprobados') + signo * (ranking or 0)
+            campo = cls.campo_estrellas(ranking)
+            cambios[campo] = models.F(campo) + signo
+        if not cambios:
+            return
+
+        if not cls.objects.filter(organizacion_id=organizacion_id).update(**cambios):
+            # La fila no existe: reconstruir desde los testimonios (que ya reflejan este cambio)
+            cls.reconstruir(organizacion_id)
+
+    @classmethod
+    def reconstruir(cls, organizacion_id):
+        """Recalcula el resumen de una organización desde cero"""
+        valores = {campo: 0 for campo in cls.CAMPOS_ESTADO.values()}
+        valores['suma_ranking_aprobados'] = 0
+        valores.update({f'estrellas_{n}': 0 for n in range(1, 6)})
+
+        testimonios = Testimonios.objects.filter(organizacion_id=organizacion_id)
+        for fila in testimonios.order_by().values('estado').annotate(cantidad=models.Count('id')):
+            campo = cls.CAMPOS_ESTADO.get(fila['estado'])
+            if campo:
+                valores[campo] = fila['cantidad']
+
+        # Agrupar por ranking: son pocos valores distintos (1.0 a 5.0), no una fila por testimonio
+        aprobados = testimonios.filter(estado='A').order_by().values('ranking').annotate(cantidad=models.Count('id'))
+        for fila in aprobados:
+            valores['suma_ranking_aprobados'] += fila['ranking'] * fila['cantidad']
+            valores[cls.campo_estrellas(fila['ranking'])] += fila['cantidad']
+
+        resumen, _ = cls.objects.update_or_create(organizacion_id=organizacion_id, defaults=valores)
+        return resumen
@@ -0,0 +1,67 @@
+"""
+Estado de la verificación OTP del admin guardado en la sesión.
+
+OTPVerificationMiddleware pregunta en cada página del admin si el usuario ya verificó su token.
+La respuesta ('otp_verified') y si el usuario tiene dispositivo ('otp_tiene_dispositivo') quedan en
+la sesión: después de la primera verificación el admin no hace ninguna consulta de OTP.
+
+Cuando el admin crea, modifica o borra un dispositivo (CustomTOTPDeviceAdmin) cambia la versión
+del usuario en el cache; en la próxima petición de ese usuario se descarta lo guardado en su sesión
+y tiene que verificar de nuevo. Si el cache no tiene versión no se descarta nada.
+"""
+import uuid
+
+from django.core.cache import cache
+from django_otp import user_has_device
+
+SESION_VERIFICADO = 'otp_verified'
+SESION_DISPOSITIVO = 'otp_tiene_dispositivo'
+SESION_VERSION = 'otp_version'
+
+
+def _clave_version(user_id):
+    return f"otp:version:{user_id}"
+
+
+def invalidar_otp(user_ids):
+    """Los dispositivos de estos usuarios cambiaron: su estado OTP en la sesión deja de valer"""
+    if user_ids:
+        cache.set_many({_clave_version(user_id): uuid.uuid4().hex for user_id in user_ids}, timeout=None)
+
+
+def sincronizar_sesion(request):
+    """Descarta el estado OTP de la sesión si los dispositivos del usuario cambiaron desde que se guardó"""
+    version = cache.get(_clave_version(request.user.pk))
+    if version is not None and version != request.session.get(SESION_VERSION):
+        request.session.pop(SESION_VERIFICADO, None)
+        request.session.pop(SESION_DISPOSITIVO, None)
+        request.session[SESION_VERSION] = version
+
+
+def esta_verificado(request):
+    return bool(request.session.get(SESION_VERIFICADO))
+
+
+def marcar_verificado(request):
+    request.session[SESION_VERIFICADO] = True
+    # 👇 La versión vigente al verificar: asi un cambio anterior no descarta esta verificación
+    version = cache.get(_clave_version(request.user.pk))
+    if version is not None:
+        request.session[SESION_VERSION] = version
+
+
+def tiene_dispositivo(request):
+    """¿El usuario tiene un dispositivo OTP? Se consulta una vez y queda en la sesión"""
+    tiene = request.session.get(SESION_DISPOSITIVO)
+    if tiene is None:
+        tiene = request.session[SESION_DISPOSITIVO] = user_has_device(request.user)
+    return tiene
+
+
+def marcar_dispositivo(request):
+    request.session[SESION_DISPOSITIVO] = True
+
+
+def olvidar_estado(request):
+    for clave in (SESION_VERIFICADO, SESION_DISPOSITIVO, SESION_VERSION):
+        request.session.pop(clave, None)
@@ -0,0 +1,161 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .filtros import ordenamiento_solicitado
+
+
+class TestimonioCursorPagination(BasePagination):
+    """
+    Paginación por cursor (keyset) en el orden pedido con ?orden= (ver filtros.py).
+
+    En lugar de OFFSET, cada página filtra por la última posición vista, asi el
+    costo de pedir la página 1 o la 10.000 es el mismo (un rango sobre el índice).
+    El cursor es opaco para el cliente: base64 de los valores de los campos de orden
+    del último testimonio (por defecto fecha e id).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Cursor inválido.'
+    # Se reemplaza en cada petición por el orden de ?orden=
+    ordering = ('-fecha_comentario', '-id')
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'TESTIMONIOS_PAGE_SIZE', 20)
+        max_page_size = getattr(settings, 'TESTIMONIOS_MAX_PAGE_SIZE', 100)
+
+        valor = request.query_params.get(self.page_size_query_param)
+        if valor:
+            try:
+                page_size = int(valor)
+            except (TypeError, ValueError):
+                pass
+
+        # 👇 Nunca devolver más del máximo configurado, ni menos de 1
+        return max(1, min(page_size, max_page_size))
+
+    def encode_cursor(self, testimonio):
+        # El último de la página puede ser una instancia o una fila de values() (serializacion.py)
+        if isinstance(testimonio, dict):
+            valores = [testimonio[campo.lstrip('-')] for campo in self.ordering]
+        else:
+            valores = [getattr(testimonio, campo.lstrip('-')) for campo in self.ordering]
+        # 👇 isoformat completo (DjangoJSONEncoder recorta los microsegundos y el cursor dejaría de ser exacto)
+        raw = json.dumps(valores, default=lambda valor: valor.isoformat() if hasattr(valor, 'isoformat') else str(valor),
+                         separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if not isinstance(valores, list) or len(valores) != len(self.ordering):
+                raise ValueError
+            # Cada valor vuelve a su tipo (datetime, Decimal, bool, int) con el campo del modelo
+            return [
+                model._meta.get_field(campo.lstrip('-')).to_python(valor)
+                for campo, valor in zip(self.ordering, valores)
+            ]
+        except (TypeError, ValueError, UnicodeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def filtro_cursor(self, valores):
+        """
+        Condición "después del cursor" para un orden de varios campos:
+        (a < x) OR (a = x AND b < y) OR (a = x AND b = y AND c < z) ...
+        """
+        condicion = Q()
+        iguales = {}
+        for campo, valor in zip(self.ordering, valores):
+            nombre = campo.lstrip('-')
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            condicion |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+            iguales[nombre] = valor
+        return condicion
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        self.ordering = ordenamiento_solicitado(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request, queryset.model)
+        if cursor is not None:
+            queryset = queryset.filter(self.filtro_cursor(cursor))
+
+        # Se pide un registro extra solo para saber si hay página siguiente
+        resultados = list(queryset[:self.page_size + 1])
+        self.has_next = len(resultados) > self.page_size
+        self.page = resultados[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                    'example': 'http://api.example.org/app/testimonios/?{cursor}=cD00ODY%3D'.format(
+                        cursor=self.cursor_query_param)
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor opaco devuelto en el campo "next" de la página anterior.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cantidad de resultados por página (tiene un máximo configurado).',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class BusquedaPagination(PageNumberPagination):
+    """
+    Paginación por número de página para los resultados de búsqueda.
+
+    Los resultados se ordenan por relevancia, asi que no sirve el cursor;
+    igual casi nadie pasa de las primeras páginas de una búsqueda.
+    """
+    page_size_query_param = 'page_size'
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'TESTIMONIOS_PAGE_SIZE', 20)
+        self.max_page_size = getattr(settings, 'TESTIMONIOS_MAX_PAGE_SIZE', 100)
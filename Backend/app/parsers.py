@@ -0,0 +1,29 @@
+"""
+Parser JSON de la API sobre orjson. Mismo resultado que el JSONParser de DRF; si orjson no está
+instalado, el body no viene en UTF-8 o orjson no lo puede leer, usa el JSONParser de DRF
+(que también arma el mensaje de error de siempre).
+"""
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+class JSONRapidoParser(JSONParser):
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        contenido = stream.read()
+        try:
+            return orjson.loads(contenido)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(contenido), media_type, parser_context)
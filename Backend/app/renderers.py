@@ -0,0 +1,44 @@
+"""
+Renderer JSON de la API sobre orjson (varias veces más rápido que el módulo json).
+
+Produce los mismos bytes que el JSONRenderer de DRF: UTF-8 sin escapar acentos, sin espacios,
+fechas ISO 8601 ('Z' en UTC), UUID como texto y Decimal como número (igual que el encoder de DRF).
+Si orjson no está instalado, se pide indentación (API navegable) o hay algo que orjson no sabe
+codificar, usa el JSONRenderer de DRF.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+# Separadores de línea que el JSONRenderer de DRF escapa para que el JSON sea JavaScript válido
+_SEPARADORES_JS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+# 'Z' en lugar de +00:00 (como DRF) y claves no texto (ej. {5: 10}) convertidas a texto (como json)
+OPCIONES = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+class JSONRapidoRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            # 👇 Lo que orjson no conoce (Decimal, textos traducibles, querysets...) lo resuelve el encoder de DRF
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=OPCIONES)
+        except orjson.JSONEncodeError:
+            # Por ejemplo enteros de más de 64 bits: el módulo json sí los acepta
+            return super().render(data, accepted_media_type, renderer_context)
+
+        for separador, escapado in _SEPARADORES_JS:
+            if separador in ret:
+                ret = ret.replace(separador, escapado)
+        return ret
@@ -0,0 +1,97 @@
+"""
+Rol y membresías del usuario de la petición, resueltos una sola vez.
+
+Antes cada vista preguntaba varias veces user.groups.filter(name='editor').exists() y
+organizacion.editores.filter(id=user.id).exists() (una consulta cada una). Ahora:
+
+    r = roles(request)
+    if r.es_staff or r.edita(organizacion): ...
+
+La primera pregunta carga con UNA consulta los grupos del usuario y las organizaciones donde es
+editor o visitante; el resultado queda guardado en el request (lo comparten la vista y los
+serializers que reciben el request en el contexto). Un anónimo no hace ninguna consulta.
+"""
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast
+from django.utils.functional import cached_property
+
+from .models import Organizacion
+
+EDITOR = 'editor'
+VISITANTE = 'visitante'
+
+
+class Roles:
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _membresias(self):
+        # 👇 Usuario armado desde el access token: los roles ya vienen en los claims (ver tokens.py)
+        precargadas = getattr(self.user, 'membresias_token', None)
+        if precargadas is not None:
+            return precargadas
+
+        grupos, editor, visitante = set(), set(), set()
+        if not self.user.is_authenticated:
+            return grupos, editor, visitante
+
+        # 👇 Grupos + organizaciones como editor + como visitante en una sola consulta (UNION ALL)
+        texto = CharField()
+        consultas = [
+            self.user.groups.order_by().values_list(Value('grupo', output_field=texto), 'name'),
+            Organizacion.objects.filter(editores=self.user)
+            .order_by().values_list(Value(EDITOR, output_field=texto), Cast('id', texto)),
+            Organizacion.objects.filter(visitantes=self.user)
+            .order_by().values_list(Value(VISITANTE, output_field=texto), Cast('id', texto)),
+        ]
+        destinos = {'grupo': grupos, EDITOR: editor, VISITANTE: visitante}
+        for tipo, valor in consultas[0].union(*consultas[1:], all=True):
+            destinos[tipo].add(valor if tipo == 'grupo' else int(valor))
+        return grupos, editor, visitante
+
+    @property
+    def es_staff(self):
+        return self.user.is_authenticated and self.user.is_staff
+
+    @property
+    def grupos(self):
+        return self._membresias[0]
+
+    @property
+    def es_editor(self):
+        return EDITOR in self.grupos
+
+    @property
+    def es_visitante(self):
+        return VISITANTE in self.grupos
+
+    @property
+    def organizaciones_editor(self):
+        """Ids de las organizaciones donde el usuario es editor"""
+        return self._membresias[1]
+
+    @property
+    def organizaciones_visitante(self):
+        """Ids de las organizaciones donde el usuario es visitante"""
+        return self._membresias[2]
+
+    def edita(self, organizacion):
+        """¿Es editor de la organización? (acepta la instancia o el id)"""
+        return getattr(organizacion, 'pk', organizacion) in self.organizaciones_editor
+
+    def visita(self, organizacion):
+        """¿Es visitante de la organización? (acepta la instancia o el id)"""
+        return getattr(organizacion, 'pk', organizacion) in self.organizaciones_visitante
+
+
+def roles(request):
+    """Roles del usuario del request, calculados una vez por petición (y por usuario)"""
+    # El request de DRF envuelve al de Django: se guarda en el de Django para compartirlo
+    base = getattr(request, '_request', request)
+    user = request.user
+    resueltos = getattr(base, '_roles', None)
+    if resueltos is None or resueltos.user is not user:
+        resueltos = base._roles = Roles(user)
+    return resueltos
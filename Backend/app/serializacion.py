@@ -0,0 +1,130 @@
+"""
+Serialización rápida de solo lectura para listados grandes.
+
+En un listado de miles de testimonios el costo está en ModelSerializer.to_representation:
+por cada fila y cada campo DRF resuelve el atributo en la instancia, arma un OrderedDict, etc.
+SerializadorRapido hace ese trabajo una sola vez: a partir del serializer de siempre arma un
+"mapeador" por campo (columna de values() + conversión) y después solo recorre filas de values().
+
+El JSON es el mismo que el del serializer (ver SerializacionRapidaTests en tests.py):
+  - campos comunes: la columna de source ('categoria.nombre_categoria' -> categoria__nombre_categoria)
+    convertida con el to_representation del mismo campo de DRF
+  - PrimaryKeyRelatedField: el id de la clave foránea
+  - cualquier otro campo (SerializerMethodField, StringRelatedField, ...) o un to_representation
+    sobreescrito que cambie un campo: el serializer define rapido_<campo>(fila) y declara en
+    Meta.columnas qué columnas lee
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+def _sin_nulos(ruta, convertir):
+    # Igual que DRF: si el valor es None no se llama al to_representation del campo
+    def mapear(fila):
+        valor = fila[ruta]
+        return None if valor is None else convertir(valor)
+    return mapear
+
+
+def _identidad(valor):
+    return valor
+
+
+# Conversiones directas para los campos más comunes (mismo resultado que su to_representation)
+_CONVERSIONES = {
+    serializers.CharField: str,
+    serializers.EmailField: str,
+    serializers.IntegerField: int,
+    serializers.ReadOnlyField: _identidad,
+}
+
+
+def _mapeador(serializer, nombre, campo):
+    """Devuelve (columnas de values(), función fila -> valor) para un campo del serializer"""
+    ruta = '__'.join(campo.source_attrs)
+
+    propio = getattr(serializer, f'rapido_{nombre}', None)
+    if propio is not None:
+        columnas = getattr(serializer.Meta, 'columnas', {}).get(nombre, [ruta])
+        return columnas, propio
+
+    if isinstance(campo, serializers.PrimaryKeyRelatedField) and campo.pk_field is None:
+        # values('categoria') ya devuelve el id, sin tocar la tabla relacionada
+        return [ruta], _sin_nulos(ruta, _identidad)
+
+    if campo.source == '*' or isinstance(campo, (
+        serializers.RelatedField, serializers.ManyRelatedField, serializers.BaseSerializer
+    )):
+        raise ImproperlyConfigured(
+            f"{type(serializer).__name__}.{nombre} necesita la instancia: "
+            f"defina rapido_{nombre}(fila) y sus columnas en Meta.columnas"
+        )
+
+    if type(campo) is serializers.JSONField and not campo.binary:
+        return [ruta], _sin_nulos(ruta, _identidad)
+
+    convertir = _CONVERSIONES.get(type(campo), campo.to_representation)
+    return [ruta], _sin_nulos(ruta, convertir)
+
+
+class SerializadorRapido:
+    """
+    Serializa filas de values() con el mismo resultado que serializer_class(many=True).data.
+
+    Se arma una vez por petición (con el contexto, asi respeta ?fields= / ?omit=) y se usa:
+        rapido = SerializadorRapido(TestimonioAprobadoSerializer, {'request': request})
+        data = rapido.serializar(rapido.filas(queryset))
+    """
+
+    def __init__(self, serializer_class, context=None):
+        serializer = serializer_class(context=context or {})
+        self.mapeadores = []
+        columnas = []
+        for nombre, campo in serializer.fields.items():
+            if campo.write_only:
+                continue
+            columnas_campo, mapear = _mapeador(serializer, nombre, campo)
+            columnas.extend(columnas_campo)
+            self.mapeadores.append((nombre, mapear))
+        self.columnas = list(dict.fromkeys(columnas))
+
+    def filas(self, queryset):
+        """values() con las columnas que leen los campos, más las del orden (las usa el cursor)"""
+        orden = [
+            campo.lstrip('-') for campo in queryset.query.order_by
+            if isinstance(campo, str) and campo.lstrip('-') not in self.columnas
+        ]
+        return queryset.values(*self.columnas, *orden)
+
+    def serializar(self, filas):
+        mapeadores = self.mapeadores
+        return [{nombre: mapear(fila) for nombre, mapear in mapeadores} for fila in filas]
+
+
+def serializar_lista(serializer_class, queryset, context=None):
+    """serializer_class(queryset, many=True).data, por el camino rápido si está habilitado"""
+    if not settings.TESTIMONIOS_SERIALIZACION_RAPIDA:
+        return serializer_class(queryset, many=True, context=context or {}).data
+    rapido = SerializadorRapido(serializer_class, context)
+    return rapido.serializar(rapido.filas(queryset))
+
+
+class ListadoRapidoMixin:
+    """
+    Mixin para ViewSets: el list se serializa con SerializadorRapido (paginado o no).
+    Con TESTIMONIOS_SERIALIZACION_RAPIDA=False usa el list de DRF de siempre.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not settings.TESTIMONIOS_SERIALIZACION_RAPIDA:
+            return super().list(request, *args, **kwargs)
+
+        rapido = SerializadorRapido(self.get_serializer_class(), self.get_serializer_context())
+        filas = rapido.filas(self.filter_queryset(self.get_queryset()))
+
+        pagina = self.paginate_queryset(filas)
+        if pagina is not None:
+            return self.get_paginated_response(rapido.serializar(pagina))
+        return Response(rapido.serializar(filas))
@@ -9,6 +9,11 @@ from django.contrib.auth.models import Group
 from django.utils import timezone
 import os
 from .utils import get_domain_from_url
+from .cache import invalidar_testimonios, organizacion_por_api_key
+from .mixins import CamposDinamicosMixin
+from .catalogo import NombreCategoriaField
+from .roles import roles
+from .subidas import MAX_ARCHIVOS, MAX_TAMANO, subir_archivos, url_archivo_subido
 
 ######################################33LOGIN
 
@@ -34,7 +39,7 @@ class RefreshTokenSerializer(serializers.Serializer):
     refresh = serializers.CharField()
 
 ################################# USUARIOS VISITANTES
-class UsuarioVisitanteSerializer(serializers.ModelSerializer):
+class UsuarioVisitanteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True,
         min_length=8,  # 👈 Validación adicional
@@ -62,6 +67,8 @@ class UsuarioVisitanteSerializer(serializers.ModelSerializer):
             'profile_picture', 'profile_picture_url'  # 👈 Agregados
         ]
         read_only_fields = ['date_joined']
+        # 👇 Lo que lee cada campo calculado, para cargar solo eso con ?fields= (ver mixins.py)
+        columnas = {'profile_picture_url': ['profile_picture']}
 
     def get_profile_picture_url(self, obj):
         """Devuelve la URL de la foto de perfil"""
@@ -125,7 +132,7 @@ class UsuarioVisitanteSerializer(serializers.ModelSerializer):
         return instance
 
 ################################ USUARIOS EDITORES    
-class EditorSerializer(serializers.ModelSerializer):
+class EditorSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True,
         min_length=8,  # 👈 Validación adicional
@@ -149,6 +156,8 @@ class EditorSerializer(serializers.ModelSerializer):
             'profile_picture', 'profile_picture_url'  # 👈 Agregados
         ]
         read_only_fields = ['date_joined']
+        # 👇 Lo que lee cada campo calculado, para cargar solo eso con ?fields= (ver mixins.py)
+        columnas = {'profile_picture_url': ['profile_picture']}
 
     
     def get_profile_picture_url(self, obj):
@@ -202,7 +211,7 @@ class EditorSerializer(serializers.ModelSerializer):
         return instance
 
 ########################### USUARIOS ADMINS    
-class AdminUserSerializer(serializers.ModelSerializer):
+class AdminUserSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True,
         min_length=8,
@@ -226,6 +235,8 @@ class AdminUserSerializer(serializers.ModelSerializer):
             'profile_picture', 'profile_picture_url'  # 👈 Agregados
         ]
         read_only_fields = ['date_joined', 'is_staff', 'is_active', 'is_superuser']
+        # 👇 Lo que lee cada campo calculado, para cargar solo eso con ?fields= (ver mixins.py)
+        columnas = {'profile_picture_url': ['profile_picture']}
 
     def get_profile_picture_url(self, obj):
         return obj.get_profile_picture_url()
@@ -281,7 +292,7 @@ class AdminUserSerializer(serializers.ModelSerializer):
         return instance
 
 
-class CategoriaSerializer(serializers.ModelSerializer):
+class CategoriaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Categoria
@@ -308,7 +319,7 @@ class CategoriaSerializer(serializers.ModelSerializer):
 
 
 ################################## ORGANIZACION       
-class OrganizacionSerializer(serializers.ModelSerializer):
+class OrganizacionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     editores = serializers.PrimaryKeyRelatedField(
         many=True, 
         queryset=User.objects.filter(groups__name='editor'), 
@@ -378,7 +389,7 @@ class OrganizacionSerializer(serializers.ModelSerializer):
         return instance
 
 # Serializador para EDITORES (muestra editores y visitantes de SU organización)
-class OrganizacionSerializerEditor(serializers.ModelSerializer):
+class OrganizacionSerializerEditor(CamposDinamicosMixin, serializers.ModelSerializer):
     editores = serializers.SerializerMethodField(read_only=True)
     visitantes = serializers.SerializerMethodField(read_only=True)
     
@@ -386,6 +397,9 @@ class OrganizacionSerializerEditor(serializers.ModelSerializer):
         model = Organizacion
         fields = ['id', 'organizacion_nombre', 'dominio', 'api_key', 'editores', 'visitantes']
         read_only_fields = ['api_key']
+        # 👇 Se recorren editores y visitantes de cada organización (ver RelacionesSerializerMixin)
+        prefetch_related = ['editores', 'visitantes']
+        columnas = {'editores': ['editores'], 'visitantes': ['visitantes']}
 
     def get_editores(self, obj):
         return [
@@ -412,6 +426,8 @@ class OrganizacionSerializerStaff(OrganizacionSerializer):
     
     class Meta(OrganizacionSerializer.Meta):
         fields = OrganizacionSerializer.Meta.fields + ['editores', 'visitantes', 'api_key']
+        prefetch_related = ['editores', 'visitantes']
+        columnas = {'editores': ['editores']}
 
     def get_editores(self, obj):
         return [
@@ -423,7 +439,7 @@ class OrganizacionSerializerStaff(OrganizacionSerializer):
         ]
 
 # Serializador para usuarios públicos (oculta información sensible, solo muestra)
-class OrganizacionSerializerPublico(serializers.ModelSerializer):
+class OrganizacionSerializerPublico(CamposDinamicosMixin, serializers.ModelSerializer):
     class Meta:
         model = Organizacion
         fields = ['id', 'organizacion_nombre', 'dominio', 'api_key']  # 👈 Solo estos campos
@@ -506,24 +522,6 @@ class AgregarVisitantesSerializer(serializers.Serializer):
         
         return value
 
-##Este es la respuesta que se va a mostrar de los endpoints aprobados cuando una persona quiere visualizar los testimonios de 
-##una organizacion en especifico
-#####MUESTRA LOS TESTIMONIOS APROBADOS DE UNA ORGANIZACION ESPECIFICA
-class TestimonioAprobadoSerializer(serializers.ModelSerializer):
-    usuario_registrado = serializers.StringRelatedField(read_only=True)
-    categoria_nombre = serializers.CharField(source='categoria.nombre_categoria', read_only=True)
-
-    class Meta:
-        model = Testimonios
-        fields = [
-            'id', 'usuario_registrado', 'usuario_anonimo_email', 
-            'usuario_anonimo_username', 'api_key', 'categoria', 
-            'categoria_nombre', 'comentario', 'fecha_comentario', 
-            'ranking'
-        ]
-        # 👆 Excluimos: 'organizacion', 'organizacion_nombre', 'estado'
-
-
 
 #######################ACA EMPIEZA LOS TESTIMONIOS COMO TAL
 
@@ -621,10 +619,29 @@ def extract_public_id_and_type_from_url(url):
     
     return None, None
 
-class TestimonioSerializer(serializers.ModelSerializer):
+class OrganizacionTestimonioField(serializers.PrimaryKeyRelatedField):
+    """
+    Organización del testimonio. Si la api_key enviada es la de esa organización sale del cache
+    (ver organizacion_por_api_key en cache.py): cargar un testimonio no consulta la base para resolverla.
+    """
+
+    def to_internal_value(self, data):
+        datos = getattr(self.parent, 'initial_data', None)
+        api_key = datos.get('api_key') if hasattr(datos, 'get') else None
+        if isinstance(api_key, str) and api_key:
+            organizacion = organizacion_por_api_key(api_key)
+            if organizacion is not None and str(organizacion.pk) == str(data):
+                return organizacion
+        # Otra organización o sin api_key: la búsqueda de siempre (y la validación de la api_key la rechaza)
+        return super().to_internal_value(data)
+
+
+class TestimonioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    organizacion = OrganizacionTestimonioField(queryset=Organizacion.objects.all())
     usuario_registrado = serializers.StringRelatedField(read_only=True)
     organizacion_nombre = serializers.CharField(source='organizacion.organizacion_nombre', read_only=True)
-    categoria_nombre = serializers.CharField(source='categoria.nombre_categoria', read_only=True)
+    # 👇 Sale del catálogo de categorías en memoria (catalogo.py), sin JOIN
+    categoria_nombre = NombreCategoriaField()
     archivos = serializers.ListField(
         child=serializers.FileField(
             max_length=100,
@@ -636,6 +653,14 @@ class TestimonioSerializer(serializers.ModelSerializer):
         max_length=4,
         write_only=True
     )
+    # 👇 Referencias de archivos que el cliente subió directo al almacén con una firma (ver subidas.py)
+    archivos_subidos = serializers.ListField(
+        child=serializers.DictField(),
+        required=False,
+        allow_empty=True,
+        max_length=MAX_ARCHIVOS,
+        write_only=True
+    )
 
 
     # 👇 NUEVO: Campo solo para lectura que muestra las URLs
@@ -674,16 +699,31 @@ class TestimonioSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'organizacion', 'organizacion_nombre',  'usuario_registrado',  'usuario_anonimo_email', 
             'usuario_anonimo_username', 
-            'api_key', 'categoria',  'categoria_nombre', 'comentario', 'enlace', 'archivos',  'archivos_urls', 'fecha_comentario', 
+            'api_key', 'categoria',  'categoria_nombre', 'comentario', 'enlace', 'archivos',  'archivos_urls', 'archivos_subidos', 'fecha_comentario', 
             'ranking', 'estado', 'feedback'  
         ]
         read_only_fields = ['usuario_registrado', 'fecha_comentario', 'organizacion_nombre', 'categoria_nombre']
+        # 👇 Relaciones que se leen al serializar (ver RelacionesSerializerMixin en mixins.py)
+        select_related = ['organizacion', 'usuario_registrado']
+        only = [
+            'id', 'organizacion', 'organizacion__organizacion_nombre', 'usuario_registrado',
+            'usuario_registrado__username', 'usuario_registrado__profile_picture',
+            'usuario_anonimo_email', 'usuario_anonimo_username',
+            'api_key', 'categoria', 'comentario', 'enlace', 'archivos',
+            'fecha_comentario', 'ranking', 'estado', 'feedback'
+        ]
+        # 👇 Lo que lee cada campo calculado, para cargar solo eso con ?fields= (ver mixins.py)
+        columnas = {
+            'usuario_registrado': ['usuario_registrado__username', 'usuario_registrado__profile_picture'],
+            'feedback': ['feedback', 'estado'],
+            'categoria_nombre': ['categoria'],
+        }
 
     def validate_archivos(self, archivos):
         """
         Valida el array de archivos
         """
-        MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB por archivo
+        MAX_FILE_SIZE = MAX_TAMANO  # 5MB por archivo (el mismo límite que los subidos directo)
         MAX_TOTAL_SIZE = 20 * 1024 * 1024  # 20MB total
         MAX_FILE_COUNT = 4
         
@@ -756,7 +796,7 @@ class TestimonioSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
     
-        model_fields = {field.name for field in Testimonios._meta.get_fields()}
+        model_fields = {field.name for field in Testimonios._meta.get_fields()} | {'archivos_subidos'}
         extra_fields = set(self.initial_data.keys()) - model_fields
         
         if extra_fields:
@@ -778,9 +818,9 @@ class TestimonioSerializer(serializers.ModelSerializer):
         api_key = data.get('api_key')
         archivos = data.get('archivos', [])
     
-        # Validación de archivos (igual que antes)
-        if len(archivos) > 4:
-            raise serializers.ValidationError({"archivos": "No se pueden subir más de 4 archivos."})
+        # Validación de archivos (igual que antes, contando también los subidos directo al almacén)
+        if len(archivos) + len(data.get('archivos_subidos', [])) > MAX_ARCHIVOS:
+            raise serializers.ValidationError({"archivos": f"No se pueden subir más de {MAX_ARCHIVOS} archivos."})
     
         # Validación de API key (igual que antes para creación vs actualización)
         if self.instance is None:  # Creación
@@ -792,6 +832,16 @@ class TestimonioSerializer(serializers.ModelSerializer):
             if organizacion and api_key and api_key != organizacion.api_key:
                 raise serializers.ValidationError({"api_key": "La API key no es válida para esta organización."})
     
+        # 👇 Archivos subidos directo al almacén: se verifica cada referencia y se guarda su URL
+        if 'archivos_subidos' in data:
+            organizacion_id = organizacion.pk if organizacion else self.instance.organizacion_id
+            try:
+                data['archivos_subidos'] = [
+                    url_archivo_subido(referencia, organizacion_id) for referencia in data['archivos_subidos']
+                ]
+            except ValueError as e:
+                raise serializers.ValidationError({"archivos_subidos": str(e)})
+    
         # 👇 NUEVA LÓGICA: ¿El frontend coincide con el dominio de la organización?
         if organizacion and request and self.instance is None:  # Solo en creación
             referer = request.META.get('HTTP_REFERER')
@@ -812,8 +862,9 @@ class TestimonioSerializer(serializers.ModelSerializer):
                 # 👇 Aplicar la regla antigua solo si NO hay coincidencia de dominio
                 if request.user.is_authenticated:
                     user = request.user
-                    if user.groups.filter(name='visitante').exists():
-                        if not organizacion.visitantes.filter(id=user.id).exists():
+                    # 👇 Rol y membresías resueltos una vez por petición (ver roles.py)
+                    if roles(request).es_visitante:
+                        if not roles(request).visita(organizacion):
                             raise serializers.ValidationError({
                                 "organizacion": f"No perteneces a la organización '{organizacion.organizacion_nombre}'."
                             })
@@ -848,6 +899,7 @@ class TestimonioSerializer(serializers.ModelSerializer):
         
         # 👇 EXTRAER los archivos ANTES de crear el testimonio
         archivos_data = validated_data.pop('archivos', [])
+        archivos_subidos = validated_data.pop('archivos_subidos', [])
         
         if request and request.user.is_authenticated:
             # Usuario autenticado: asignar usuario y limpiar campos anónimos automáticamente
@@ -858,23 +910,13 @@ class TestimonioSerializer(serializers.ModelSerializer):
             # Usuario no autenticado: asegurar que usuario_registrado sea None
             validated_data['usuario_registrado'] = None
         
-        # 👇 SUBIR ARCHIVOS A CLOUDINARY ANTES de crear el testimonio
-        archivos_urls = []
+        # 👇 SUBIR ARCHIVOS A CLOUDINARY ANTES de crear el testimonio (todos a la vez, ver subidas.py)
         try:
-            for archivo in archivos_data:
-                # Subir cada archivo a Cloudinary
-                uploaded_file = cloudinary.uploader.upload(
-                    archivo,
-                    folder='testimonios/archivos/',
-                    resource_type='auto'
-                )
-                archivos_urls.append(uploaded_file['secure_url'])
-            
             # 👇 AGREGAR las URLs al validated_data
-            validated_data['archivos'] = archivos_urls
+            validated_data['archivos'] = subir_archivos(archivos_data) + archivos_subidos
             
         except Exception as e:
-            # 👇 SI HAY ERROR en la subida, NO se crea el testimonio
+            # 👇 SI HAY ERROR en la subida, NO se crea el testimonio (las que se subieron ya se borraron)
             raise serializers.ValidationError({
                 "archivos": f"Error al subir los archivos: {str(e)}"
             })
@@ -892,46 +934,31 @@ class TestimonioSerializer(serializers.ModelSerializer):
         """
         # 1. Extraer archivos del validated_data
         archivos_data = validated_data.pop('archivos', None)
+        archivos_subidos = validated_data.pop('archivos_subidos', None)
         
         # 2. Si se envían nuevos archivos, procesarlos
-        if archivos_data is not None:
+        if archivos_data is not None or archivos_subidos is not None:
+            archivos_data = archivos_data or []
             # Obtener archivos actuales
             archivos_actuales = instance.archivos.copy() if instance.archivos else []
             
             # 👇 ESTRATEGIA: Reemplazar todos los archivos (comportamiento actual)
             # Si quieres mantener archivos existentes y solo agregar nuevos, cambia esta lógica
-            archivos_nuevos_urls = []
+            
+            # Validar tamaño antes de subir nada
+            MAX_FILE_SIZE = 5 * 1024 * 1024
+            for archivo in archivos_data:
+                if archivo.size > MAX_FILE_SIZE:
+                    raise serializers.ValidationError({
+                        "archivos": f"El archivo '{archivo.name}' excede el tamaño máximo de 5MB."
+                    })
             
             try:
-                for archivo in archivos_data:
-                    # Validar tamaño
-                    MAX_FILE_SIZE = 5 * 1024 * 1024
-                    if archivo.size > MAX_FILE_SIZE:
-                        raise serializers.ValidationError({
-                            "archivos": f"El archivo '{archivo.name}' excede el tamaño máximo de 5MB."
-                        })
-                    
-                    # Subir a Cloudinary
-                    uploaded_file = cloudinary.uploader.upload(
-                        archivo,
-                        folder='testimonios/archivos/',
-                        resource_type='auto'
-                    )
-                    archivos_nuevos_urls.append(uploaded_file['secure_url'])
-                
-                # 👇 REEMPLAZAR todos los archivos existentes con los nuevos
-                instance.archivos = archivos_nuevos_urls
+                # 👇 REEMPLAZAR todos los archivos existentes con los nuevos (subidos a la vez, ver subidas.py)
+                instance.archivos = subir_archivos(archivos_data) + (archivos_subidos or [])
                 
             except Exception as e:
-                # Si hay error, limpiar archivos nuevos subidos
-                for url in archivos_nuevos_urls:
-                    try:
-                        public_id, resource_type = extract_public_id_and_type_from_url(url)
-                        if public_id and resource_type:
-                            cloudinary.uploader.destroy(public_id, resource_type=resource_type)
-                    except:
-                        pass
-                
+                # Si hay error, subir_archivos ya borró los archivos nuevos que se habían subido
                 raise serializers.ValidationError({
                     "archivos": f"Error al actualizar archivos: {str(e)}"
                 })
@@ -953,19 +980,36 @@ class TestimonioSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         
         # 1. Asegurar que archivos siempre sea una lista
-        representation['archivos_urls'] = instance.archivos if instance.archivos else []
+        if 'archivos_urls' in self.fields:
+            representation['archivos_urls'] = instance.archivos if instance.archivos else []
         
         ## 2. Eliminar feedback si el estado no es RECHAZADO
         #if instance.estado != 'R':
         #    representation.pop('feedback', None)
         
         return representation
+
+    # 👇 Camino rápido (ver serializacion.py): lo mismo que arriba pero desde una fila de values()
+    def rapido_usuario_registrado(self, fila):
+        # Igual que User.__str__
+        username = fila['usuario_registrado__username']
+        if username is None:
+            return None
+        return f"{username} (con foto)" if fila['usuario_registrado__profile_picture'] else username
+
+    def rapido_feedback(self, fila):
+        return fila['feedback'] if fila['estado'] == 'R' else None
+
+    def rapido_archivos_urls(self, fila):
+        return fila['archivos'] if fila['archivos'] else []
     
 class CambiarEstadoTestimonioSerializer(serializers.ModelSerializer):
     class Meta:
         model = Testimonios
         fields = ['estado', 'feedback']
         read_only_fields = []  # Ambos campos son editables en principio
+        # Los permisos se verifican contra la organización y el autor del testimonio
+        select_related = ['organizacion', 'usuario_registrado']
     
     def validate(self, data):
         """
@@ -1060,6 +1104,7 @@ class CambiarEstadoTestimonioSerializer(serializers.ModelSerializer):
         """
         nuevo_estado = validated_data.get('estado', instance.estado)
         nuevo_feedback = validated_data.get('feedback', instance.feedback)
+        estado_anterior = instance.estado
         
         # Aplicar REGLA 4 explícitamente: Si cambia de R a otro estado, feedback = None
         if instance.estado == 'R' and nuevo_estado != 'R':
@@ -1074,16 +1119,23 @@ class CambiarEstadoTestimonioSerializer(serializers.ModelSerializer):
         
         # Guardar la instancia (activará las validaciones del modelo)
         instance.save()
+
+        # 👇 Un cambio de estado (ej. E -> A) cambia lo que ven los feeds públicos
+        if estado_anterior != nuevo_estado:
+            invalidar_testimonios(instance.organizacion_id)
         
         return instance
     
 # Serializador para testimonios aprobados (públicos) - NUNCA mostrar feedback
-class TestimonioAprobadoSerializer(serializers.ModelSerializer):
+class TestimonioAprobadoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    # 👇 Sale del catálogo de categorías en memoria (catalogo.py), sin JOIN
+    categoria_nombre = NombreCategoriaField()
+
     class Meta:
         model = Testimonios
         fields = ['id', 'usuario_registrado', 'usuario_anonimo_username', 
                  'comentario', 'enlace', 'archivos', 'fecha_comentario', 
-                 'categoria', 'ranking']
+                 'categoria', 'categoria_nombre', 'ranking']
         read_only_fields = fields
     
     def to_representation(self, instance):
@@ -1,9 +1,15 @@
-from django.db.models.signals import post_migrate, pre_delete, pre_save, post_save
+from django.db.models.signals import post_migrate, pre_delete, pre_save, post_save, post_delete, m2m_changed
+from django.db import transaction
 from django.dispatch import receiver
 from django.contrib.auth.models import Group
 from django.contrib.auth.management import create_permissions
 from .models import *
 from cloudinary import uploader
+from .cache import invalidar_testimonios, olvidar_organizacion
+from .snapshots import publicar_snapshots_seguro, borrar_snapshots_seguro
+from .cdn import purgar_cdn, etiqueta_organizacion
+from .catalogo import invalidar_categorias
+from .tokens import invalidar_roles
 import re
 import os
 
@@ -217,6 +223,146 @@ def delete_old_cloudinary_files(sender, instance, **kwargs):
             except Exception as e:
                 print(f"⚠️ Error al eliminar archivo Cloudinary antiguo {url}: {e}")
 
+# 👇 Invalida el cache de testimonios de la organización cuando se crea, modifica o borra un testimonio
+@receiver(post_save, sender=Testimonios)
+@receiver(post_delete, sender=Testimonios)
+def invalidar_cache_testimonios(sender, instance, **kwargs):
+    """
+    Incrementa la versión del cache de la organización DESPUÉS del commit,
+    para que ninguna lectura vuelva a cachear datos viejos antes de que se confirmen.
+    """
+    organizacion_id = instance.organizacion_id
+    transaction.on_commit(lambda: invalidar_testimonios(organizacion_id))
+    # 👇 Y avisa a la CDN (si hay purga configurada) para no esperar a que venza el s-maxage
+    transaction.on_commit(lambda: purgar_cdn('testimonios', etiqueta_organizacion(organizacion_id)))
+
+# 👇 Al cambiar una categoría (API o admin) cada proceso recarga su catálogo en memoria
+# y se purga la CDN, donde el catálogo queda varios minutos
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_catalogo_categorias(sender, instance, **kwargs):
+    transaction.on_commit(invalidar_categorias)
+    # Los testimonios muestran el nombre de la categoría, también quedan viejos
+    transaction.on_commit(lambda: purgar_cdn('categorias', 'testimonios'))
+
+# 👇 Los feeds muestran el nombre de la organización y de la categoría: al renombrarlas quedan viejos
+@receiver(post_save, sender=Organizacion)
+def invalidar_feeds_organizacion(sender, instance, created, **kwargs):
+    if created:
+        return
+    organizacion_id = instance.id
+    transaction.on_commit(lambda: invalidar_testimonios(organizacion_id))
+    transaction.on_commit(lambda: purgar_cdn('testimonios', etiqueta_organizacion(organizacion_id)))
+
+@receiver(post_save, sender=Categoria)
+def invalidar_feeds_categoria(sender, instance, created, **kwargs):
+    if created:
+        return
+    # Al borrarla se borran sus testimonios en cascada, y cada uno invalida su organización
+    organizaciones = list(
+        Testimonios.objects.filter(categoria=instance).order_by().values_list('organizacion_id', flat=True).distinct()
+    )
+    def invalidar():
+        for organizacion_id in organizaciones:
+            invalidar_testimonios(organizacion_id)
+    transaction.on_commit(invalidar)
+
+# 👇 Mantiene el resumen de la organización (conteos por estado, suma de rankings e histograma)
+@receiver(post_save, sender=Testimonios)
+def actualizar_resumen_al_guardar(sender, instance, created, **kwargs):
+    """
+    Aplica el cambio al resumen con F() dentro de la misma transacción del guardado.
+    """
+    if created:
+        ResumenOrganizacion.aplicar_cambio(instance.organizacion_id, instance.estado, instance.ranking, 1)
+        return
+
+    if not hasattr(instance, '_estado_original') or instance._estado_original is None:
+        # No sabemos cómo estaba antes (instancia no leída de la BD): recalcular
+        ResumenOrganizacion.reconstruir(instance.organizacion_id)
+        return
+
+    if (instance._estado_original, instance._ranking_original) != (instance.estado, instance.ranking):
+        ResumenOrganizacion.aplicar_cambio(instance.organizacion_id, instance._estado_original, instance._ranking_original, -1)
+        ResumenOrganizacion.aplicar_cambio(instance.organizacion_id, instance.estado, instance.ranking, 1)
+
+@receiver(post_delete, sender=Testimonios)
+def actualizar_resumen_al_borrar(sender, instance, **kwargs):
+    # Si se está borrando la organización entera, su resumen se borra en cascada
+    origin = kwargs.get('origin')
+    if isinstance(origin, Organizacion) or getattr(origin, 'model', None) is Organizacion:
+        return
+    ResumenOrganizacion.aplicar_cambio(instance.organizacion_id, instance.estado, instance.ranking, -1)
+
+# 👇 Republica el snapshot JSON público cuando cambia el conjunto de aprobados
+@receiver(post_save, sender=Testimonios)
+@receiver(post_delete, sender=Testimonios)
+def publicar_snapshot_testimonios(sender, instance, **kwargs):
+    # Solo importa si el testimonio estaba aprobado o quedó aprobado
+    if instance.estado != 'A' and getattr(instance, '_estado_original', None) != 'A':
+        return
+    # Si se está borrando la organización entera, sus snapshots se borran en otra señal
+    origin = kwargs.get('origin')
+    if isinstance(origin, Organizacion) or getattr(origin, 'model', None) is Organizacion:
+        return
+    organizacion_id = instance.organizacion_id
+    transaction.on_commit(lambda: publicar_snapshots_seguro(organizacion_id))
+
+@receiver(post_delete, sender=Organizacion)
+def borrar_snapshot_organizacion(sender, instance, **kwargs):
+    organizacion_id = instance.id
+    transaction.on_commit(lambda: borrar_snapshots_seguro(organizacion_id))
+
+# 👇 El cache api_key / dominio -> organización (embed, testimonios, alta de visitantes)
+# no debe resolver claves o dominios viejos, ni organizaciones borradas o con otro nombre
+@receiver(post_save, sender=Organizacion)
+@receiver(post_delete, sender=Organizacion)
+def olvidar_organizacion_cacheada(sender, instance, **kwargs):
+    olvidar_organizacion(
+        api_keys=(getattr(instance, '_api_key_original', None), instance.api_key),
+        dominios=(getattr(instance, '_dominio_original', None), instance.dominio),
+    )
+
+# 👇 Toda organización nueva arranca con su resumen en cero
+@receiver(post_save, sender=Organizacion)
+def crear_resumen_organizacion(sender, instance, created, using=None, **kwargs):
+    if created:
+        # En la misma base que la organización (el benchmark de índices siembra en una base descartable)
+        ResumenOrganizacion.objects.using(using).get_or_create(organizacion=instance)
+
+# 👇 Los access tokens llevan el rol y las organizaciones del usuario (ver tokens.py):
+# al cambiar sus grupos o membresías el token viejo deja de valer
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=Organizacion.editores.through)
+@receiver(m2m_changed, sender=Organizacion.visitantes.through)
+def invalidar_roles_membresias(sender, instance, action, pk_set, **kwargs):
+    if action == 'pre_clear' and not isinstance(instance, User):
+        # Después del clear ya no se sabe qué usuarios estaban
+        instance._usuarios_clear = list(
+            sender.objects.filter(**{instance._meta.model_name: instance}).values_list('user_id', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if isinstance(instance, User):
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = getattr(instance, '_usuarios_clear', [])
+    else:
+        user_ids = list(pk_set or [])
+    transaction.on_commit(lambda: invalidar_roles(user_ids))
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_roles_usuario(sender, instance, **kwargs):
+    # El login del admin solo guarda last_login: no cambia nada de lo que va en el token
+    update_fields = kwargs.get('update_fields')
+    if kwargs.get('created') or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidar_roles([user_id]))
+
 def extract_public_id_and_type_from_url(url):
     """
     Extrae el public_id y determina el resource_type de una URL de Cloudinary.
@@ -0,0 +1,223 @@
+"""
+Snapshots JSON de los testimonios aprobados de cada organización.
+
+Se publican en un storage (disco local, Cloudinary, ...) cada vez que cambia el conjunto
+de aprobados, asi el widget público los lee directo del storage/CDN sin pasar por Django
+ni por la base de datos. Por organización se escriben:
+
+  organizaciones/<id>/testimonios.json                  -> siempre la última versión
+  organizaciones/<id>/testimonios.<version>.json        -> inmutable (se puede cachear para siempre)
+  organizaciones/<id>/categorias/<categoria_id>.json    -> última versión filtrada por categoría
+
+De las versiones inmutables se guardan las últimas TESTIMONIOS_SNAPSHOT_VERSIONES: el snapshot
+vigente lista en 'versiones' cuáles existen, asi se pueden borrar sin listar el storage.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Avg, Count
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Organizacion, ResumenOrganizacion, Testimonios
+from .renderers import JSONRapidoRenderer
+from .serializacion import serializar_lista
+from .serializers import TestimonioAprobadoSerializer
+
+
+@lru_cache(maxsize=1)
+def storage_snapshots():
+    """Storage configurado en TESTIMONIOS_SNAPSHOT_STORAGE (una sola instancia por proceso)"""
+    clase = import_string(settings.TESTIMONIOS_SNAPSHOT_STORAGE)
+    if issubclass(clase, FileSystemStorage):
+        return clase(location=settings.TESTIMONIOS_SNAPSHOT_ROOT, base_url=settings.TESTIMONIOS_SNAPSHOT_URL)
+    return clase()
+
+
+def ruta_snapshot(organizacion_id, categoria_id=None, version=None):
+    if categoria_id is not None:
+        return f"organizaciones/{organizacion_id}/categorias/{categoria_id}.json"
+    if version is not None:
+        return f"organizaciones/{organizacion_id}/testimonios.{version}.json"
+    return f"organizaciones/{organizacion_id}/testimonios.json"
+
+
+def snapshots_publicos():
+    """
+    ¿Las URLs de los snapshots se pueden leer desde afuera? Un storage remoto (CDN) sí; el disco local
+    solo si Django lo sirve (static() con DEBUG) o si TESTIMONIOS_SNAPSHOT_URL apunta a otro servidor.
+    """
+    if not isinstance(storage_snapshots(), FileSystemStorage):
+        return True
+    return settings.DEBUG or settings.TESTIMONIOS_SNAPSHOT_URL.startswith(('http://', 'https://', '//'))
+
+
+def url_snapshot(organizacion_id, categoria_id=None):
+    """URL pública (CDN o WhiteNoise/local) del último snapshot de la organización"""
+    return storage_snapshots().url(ruta_snapshot(organizacion_id, categoria_id))
+
+
+def leer_snapshot(organizacion_id, categoria_id=None):
+    """Devuelve el snapshot publicado como dict, o None si todavía no existe"""
+    storage = storage_snapshots()
+    ruta = ruta_snapshot(organizacion_id, categoria_id)
+    if not storage.exists(ruta):
+        return None
+    with storage.open(ruta) as archivo:
+        return json.loads(archivo.read())
+
+
+def _escribir(storage, ruta, contenido):
+    if isinstance(storage, FileSystemStorage):
+        # 👇 Temporal + os.replace: quien lee ve el archivo viejo o el nuevo, nunca ninguno
+        destino = storage.path(ruta)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(destino), suffix='.tmp', delete=False) as temporal:
+            temporal.write(contenido)
+        try:
+            os.chmod(temporal.name, storage.file_permissions_mode or 0o644)
+            os.replace(temporal.name, destino)
+        except Exception:
+            os.unlink(temporal.name)
+            raise
+        return
+
+    # Los storages que pisan el archivo (get_available_name devuelve el mismo nombre) se guardan directo;
+    # los que le agregan un sufijo al nombre necesitan borrar antes
+    if storage.exists(ruta) and storage.get_available_name(ruta) != ruta:
+        storage.delete(ruta)
+    storage.save(ruta, ContentFile(contenido))
+
+
+def _serializar(data):
+    # Compacto: sin espacios y con los acentos tal cual
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def construir_snapshot(organizacion, resultados, total, promedio, categoria_id=None):
+    """
+    resultados son los últimos TESTIMONIOS_SNAPSHOT_MAX aprobados; total y promedio son los de
+    TODOS los aprobados (no solo los que entran en el snapshot).
+    """
+    # Pasar por el renderer de la API convierte fechas y decimales igual que en las respuestas
+    resultados = json.loads(JSONRapidoRenderer().render(resultados))
+
+    data = {
+        'organizacion': {'id': organizacion.id, 'nombre': organizacion.organizacion_nombre},
+        'categoria': categoria_id,
+        'total_testimonios': total,
+        'promedio_ranking': round(float(promedio or 0), 1),
+        'testimonios': resultados,
+    }
+    # La versión sale del contenido: si los aprobados no cambiaron, la versión tampoco
+    data['version'] = hashlib.md5(_serializar(data)).hexdigest()[:12]
+    data['generado'] = timezone.now().isoformat()
+    return data
+
+
+def _ultimos(aprobados):
+    return serializar_lista(
+        TestimonioAprobadoSerializer,
+        aprobados.order_by('-fecha_comentario', '-id')[:settings.TESTIMONIOS_SNAPSHOT_MAX]
+    )
+
+
+def publicar_snapshots(organizacion_id):
+    """
+    Regenera los snapshots de una organización (general y por categoría) y borra
+    los de categorías que ya no tienen testimonios aprobados.
+    """
+    organizacion = Organizacion.objects.filter(id=organizacion_id).first()
+    if organizacion is None:
+        return None
+
+    storage = storage_snapshots()
+    anterior = leer_snapshot(organizacion_id)
+
+    aprobados = Testimonios.objects.filter(organizacion=organizacion, estado='A')
+    resumen = ResumenOrganizacion.objects.filter(organizacion=organizacion).first()
+    snapshot = construir_snapshot(
+        organizacion, _ultimos(aprobados),
+        resumen.cantidad_aprobados if resumen else 0, resumen.promedio_ranking if resumen else 0,
+    )
+
+    # 👇 Total y promedio de cada categoría con TODOS sus aprobados (una sola consulta agrupada)
+    por_categoria = {
+        fila['categoria']: fila
+        for fila in aprobados.order_by().values('categoria').annotate(total=Count('id'), promedio=Avg('ranking'))
+    }
+    categorias = sorted(por_categoria)
+    snapshot['categorias'] = {
+        str(categoria_id): url_snapshot(organizacion_id, categoria_id) for categoria_id in categorias
+    }
+
+    if anterior is not None and anterior.get('version') == snapshot['version']:
+        # Los aprobados no cambiaron: no hace falta reescribir nada
+        return anterior
+
+    # 👇 La nueva versión primero; las que pasan del máximo se borran después de escribir
+    versiones = [snapshot['version'], *(v for v in _versiones(anterior) if v != snapshot['version'])]
+    snapshot['versiones'] = versiones[:settings.TESTIMONIOS_SNAPSHOT_VERSIONES]
+
+    _escribir(storage, ruta_snapshot(organizacion_id, version=snapshot['version']), _serializar(snapshot))
+    _escribir(storage, ruta_snapshot(organizacion_id), _serializar(snapshot))
+
+    for categoria_id in categorias:
+        fila = por_categoria[categoria_id]
+        # Cada categoría con su propia consulta: no se pierden los que no entran en el snapshot general
+        de_la_categoria = _ultimos(aprobados.filter(categoria_id=categoria_id))
+        _escribir(
+            storage, ruta_snapshot(organizacion_id, categoria_id),
+            _serializar(construir_snapshot(organizacion, de_la_categoria, fila['total'], fila['promedio'], categoria_id))
+        )
+
+    # 👇 Categorías que tenían snapshot y ya no tienen aprobados
+    for categoria_id in (anterior or {}).get('categorias', {}):
+        if int(categoria_id) not in categorias:
+            storage.delete(ruta_snapshot(organizacion_id, int(categoria_id)))
+
+    for version in versiones[settings.TESTIMONIOS_SNAPSHOT_VERSIONES:]:
+        storage.delete(ruta_snapshot(organizacion_id, version=version))
+
+    print(f"📦 Snapshot de la organización {organizacion_id} publicado (versión {snapshot['version']})")
+    return snapshot
+
+
+def _versiones(snapshot):
+    """Versiones inmutables guardadas según el snapshot vigente (los anteriores a 'versiones' solo tienen la suya)"""
+    if snapshot is None:
+        return []
+    return snapshot.get('versiones') or [snapshot['version']]
+
+
+def borrar_snapshots(organizacion_id):
+    """Borra todos los snapshots de la organización: el último, los versionados y los de sus categorías"""
+    storage = storage_snapshots()
+    anterior = leer_snapshot(organizacion_id)
+    for categoria_id in (anterior or {}).get('categorias', {}):
+        storage.delete(ruta_snapshot(organizacion_id, int(categoria_id)))
+    for version in _versiones(anterior):
+        storage.delete(ruta_snapshot(organizacion_id, version=version))
+    storage.delete(ruta_snapshot(organizacion_id))
+
+
+def publicar_snapshots_seguro(organizacion_id):
+    """Igual que publicar_snapshots pero sin romper la petición si el storage falla"""
+    try:
+        return publicar_snapshots(organizacion_id)
+    except Exception as e:
+        print(f"⚠️ Error publicando el snapshot de la organización {organizacion_id}: {e}")
+        return None
+
+
+def borrar_snapshots_seguro(organizacion_id):
+    try:
+        borrar_snapshots(organizacion_id)
+    except Exception as e:
+        print(f"⚠️ Error borrando los snapshots de la organización {organizacion_id}: {e}")
@@ -0,0 +1,235 @@
+"""
+Subida de los archivos de un testimonio a Cloudinary en paralelo.
+
+Antes se subían de a uno dentro de la petición: crear un testimonio con 4 archivos tardaba
+lo que 4 subidas seguidas. Ahora se suben a la vez (hasta TESTIMONIOS_SUBIDAS_HILOS) con un plazo
+total de TESTIMONIOS_SUBIDAS_PLAZO segundos, asi la petición tarda lo que la subida más lenta.
+
+Se mantiene la regla de siempre: si una subida falla (o se pasa el plazo) se borran las que
+ya se subieron y se relanza el error, para que no se cree ni se modifique el testimonio.
+
+Subidas directas: para no pasar los archivos por Django, el cliente pide una firma
+(POST /app/testimonios/firma-subida/ con la api_key de la organización), sube los archivos
+directo al almacén y manda en 'archivos_subidos' las referencias que le devolvió
+({public_id, version, signature, resource_type, format}). El servidor verifica que cada
+referencia sea auténtica, que esté en la carpeta de la organización, que se haya subido
+dentro de la vigencia de la firma y que no supere MAX_TAMANO (lo consulta al almacén). El almacén se elige con TESTIMONIOS_SUBIDAS_ALMACEN
+(SubidasCloudinary, o SubidasLocales en los tests).
+"""
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import cloudinary
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+import cloudinary.utils
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.module_loading import import_string
+
+CARPETA = 'testimonios/archivos/'
+MAX_ARCHIVOS = 4
+# Tamaño máximo por archivo, igual para los que pasan por el servidor y los subidos directo
+MAX_TAMANO = 5 * 1024 * 1024
+# Los mismos formatos que acepta TestimonioSerializer.validate_archivos
+FORMATOS_PERMITIDOS = ('jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp', 'svg', 'mp4', 'webm', 'mov', 'avi', 'mkv', 'flv')
+TIPOS_PERMITIDOS = ('image', 'video')
+
+
+def _subir(archivo, plazo):
+    subido = cloudinary.uploader.upload(archivo, folder=CARPETA, resource_type='auto', timeout=plazo)
+    return subido['secure_url'], subido['public_id'], subido['resource_type']
+
+
+def _borrar(subido):
+    url, public_id, resource_type = subido
+    try:
+        cloudinary.uploader.destroy(public_id, resource_type=resource_type)
+        print(f"🧹 Archivo Cloudinary descartado: {public_id} (tipo: {resource_type})")
+    except Exception as e:
+        print(f"⚠️ Error al descartar archivo Cloudinary {url}: {e}")
+
+
+def _borrar_al_terminar(futuro):
+    # Subida que seguía corriendo cuando se venció el plazo: se borra en cuanto termina
+    if not futuro.cancelled() and futuro.exception() is None:
+        _borrar(futuro.result())
+
+
+def _borrar_todos(subidos):
+    if not subidos:
+        return
+    with ThreadPoolExecutor(max_workers=min(len(subidos), settings.TESTIMONIOS_SUBIDAS_HILOS)) as pool:
+        list(pool.map(_borrar, subidos))
+
+
+def subir_archivos(archivos):
+    """URLs de los archivos subidos, en el mismo orden que se recibieron"""
+    archivos = list(archivos)
+    if not archivos:
+        return []
+
+    plazo = settings.TESTIMONIOS_SUBIDAS_PLAZO
+    pool = ThreadPoolExecutor(
+        max_workers=min(len(archivos), settings.TESTIMONIOS_SUBIDAS_HILOS), thread_name_prefix='subidas',
+    )
+    futuros = [pool.submit(_subir, archivo, plazo) for archivo in archivos]
+    try:
+        hechos, pendientes = wait(futuros, timeout=plazo, return_when=FIRST_EXCEPTION)
+    finally:
+        # 👇 Sin esperar: si se venció el plazo la petición no se queda colgada de las subidas lentas
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    errores = [futuro.exception() for futuro in hechos if futuro.exception() is not None]
+    if not errores and not pendientes:
+        return [futuro.result()[0] for futuro in futuros]
+
+    # 👇 Falló una subida o se venció el plazo: no queda nada subido
+    for futuro in pendientes:
+        futuro.add_done_callback(_borrar_al_terminar)
+    _borrar_todos([futuro.result() for futuro in hechos if futuro.exception() is None])
+
+    if errores:
+        raise errores[0]
+    raise TimeoutError(f"La subida de los archivos superó el plazo de {plazo} segundos.")
+
+
+class SubidasCloudinary:
+    """Subida directa del navegador a Cloudinary con parámetros firmados con el api_secret"""
+
+    def firmar(self, parametros):
+        configuracion = cloudinary.config()
+        firma = cloudinary.utils.api_sign_request(
+            parametros, configuracion.api_secret, configuracion.signature_algorithm,
+        )
+        return {
+            'url': f"https://api.cloudinary.com/v1_1/{configuracion.cloud_name}/auto/upload",
+            'campos': {**parametros, 'api_key': configuracion.api_key, 'signature': firma},
+        }
+
+    def verificar(self, public_id, version, firma):
+        # Cloudinary firma (public_id, version) en la respuesta de cada subida
+        return cloudinary.utils.verify_api_response_signature(public_id, version, firma)
+
+    def tamano(self, public_id, resource_type):
+        # La firma no limita el tamaño: se lee de los metadatos del recurso ya subido
+        try:
+            return cloudinary.api.resource(public_id, resource_type=resource_type)['bytes']
+        except cloudinary.exceptions.NotFound:
+            return None
+
+    def url(self, public_id, version, resource_type, formato):
+        return cloudinary.utils.cloudinary_url(
+            public_id, version=version, resource_type=resource_type, format=formato, secure=True,
+        )[0]
+
+
+class SubidasLocales:
+    """
+    Almacén de prueba: firma con el SECRET_KEY en lugar de Cloudinary y no guarda nada.
+    subir() hace de almacén: revisa la firma de los campos y devuelve la referencia que devolvería.
+    """
+    sal = 'app.subidas.SubidasLocales'
+
+    def __init__(self):
+        # public_id -> bytes de lo "subido"
+        self.tamanos = {}
+
+    def _firma(self, valores):
+        texto = '&'.join(f"{clave}={valores[clave]}" for clave in sorted(valores))
+        return salted_hmac(self.sal, texto).hexdigest()
+
+    def firmar(self, parametros):
+        return {'url': '/subidas-locales/', 'campos': {**parametros, 'signature': self._firma(parametros)}}
+
+    def subir(self, campos, nombre, resource_type='image', formato='jpg', tamano=1024):
+        parametros = {clave: valor for clave, valor in campos.items() if clave != 'signature'}
+        if not constant_time_compare(self._firma(parametros), campos.get('signature', '')):
+            raise ValueError("Firma inválida")
+        if time.time() - int(parametros['timestamp']) > settings.TESTIMONIOS_SUBIDAS_FIRMA_VIGENCIA:
+            raise ValueError("Firma vencida")
+        public_id = f"{parametros['folder']}/{nombre}"
+        version = int(time.time())
+        self.tamanos[public_id] = tamano
+        return {
+            'public_id': public_id, 'version': version, 'resource_type': resource_type, 'format': formato,
+            'signature': self._firma({'public_id': public_id, 'version': version}),
+        }
+
+    def verificar(self, public_id, version, firma):
+        return constant_time_compare(self._firma({'public_id': public_id, 'version': version}), firma)
+
+    def tamano(self, public_id, resource_type):
+        return self.tamanos.get(public_id)
+
+    def url(self, public_id, version, resource_type, formato):
+        return f"{settings.MEDIA_URL}{resource_type}/v{version}/{public_id}.{formato}"
+
+
+@lru_cache(maxsize=1)
+def almacen_subidas():
+    """Almacén configurado en TESTIMONIOS_SUBIDAS_ALMACEN (una sola instancia por proceso)"""
+    return import_string(settings.TESTIMONIOS_SUBIDAS_ALMACEN)()
+
+
+def _carpeta_organizacion(organizacion_id):
+    return f"{CARPETA}{organizacion_id}/"
+
+
+def parametros_subida(organizacion_id):
+    """Parámetros firmados para que el cliente suba los archivos directo al almacén"""
+    emitida = int(time.time())
+    # 👇 La carpeta va firmada: lleva la organización y el momento de la firma (ver url_archivo_subido)
+    parametros = {
+        'allowed_formats': ','.join(FORMATOS_PERMITIDOS),
+        'folder': f"{_carpeta_organizacion(organizacion_id)}{emitida}",
+        'timestamp': emitida,
+    }
+    return {
+        **almacen_subidas().firmar(parametros),
+        'expira': emitida + settings.TESTIMONIOS_SUBIDAS_FIRMA_VIGENCIA,
+        'maximo_archivos': MAX_ARCHIVOS,
+    }
+
+
+def url_archivo_subido(referencia, organizacion_id):
+    """URL del archivo que el cliente subió con una firma de la organización (ValueError si no vale)"""
+    if not isinstance(referencia, dict):
+        raise ValueError("La referencia del archivo debe ser un objeto.")
+    public_id = referencia.get('public_id')
+    firma = referencia.get('signature')
+    resource_type = referencia.get('resource_type', 'image')
+    formato = referencia.get('format')
+    try:
+        version = int(referencia.get('version'))
+    except (TypeError, ValueError):
+        raise ValueError("La referencia del archivo no tiene una versión válida.")
+
+    if not isinstance(public_id, str) or not isinstance(firma, str):
+        raise ValueError("La referencia del archivo está incompleta.")
+    if resource_type not in TIPOS_PERMITIDOS or (formato is not None and formato not in FORMATOS_PERMITIDOS):
+        raise ValueError("Tipo de archivo no permitido.")
+
+    almacen = almacen_subidas()
+    if not almacen.verificar(public_id, version, firma):
+        raise ValueError("La referencia del archivo no es auténtica.")
+
+    prefijo = _carpeta_organizacion(organizacion_id)
+    carpeta = public_id.rpartition('/')[0]
+    emitida = carpeta[len(prefijo):]
+    if not carpeta.startswith(prefijo) or not emitida.isdigit():
+        raise ValueError("El archivo no se subió con una firma de esta organización.")
+    # 👇 version es el momento de la subida (firmado por el almacén): tuvo que ser antes de que venciera la firma
+    if not 0 <= version - int(emitida) <= settings.TESTIMONIOS_SUBIDAS_FIRMA_VIGENCIA:
+        raise ValueError("El archivo se subió con una firma vencida.")
+
+    # 👇 Mismo límite que los archivos que pasan por el servidor (validate_archivos)
+    tamano = almacen.tamano(public_id, resource_type)
+    if tamano is None:
+        raise ValueError("El archivo no existe en el almacén.")
+    if tamano > MAX_TAMANO:
+        raise ValueError(f"El archivo excede el tamaño máximo de {MAX_TAMANO // (1024 * 1024)}MB.")
+
+    return almacen.url(public_id, version, resource_type, formato)
@@ -1,3 +1,1640 @@
-from django.test import TestCase
+import base64
+import datetime
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from urllib.parse import parse_qs, urlparse
+from unittest import mock, skipUnless
+from decimal import Decimal
 
-# Create your tests here.
+import cloudinary.exceptions
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, models
+from django.db.models import Model
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from django_otp.plugins.otp_totp.models import TOTPDevice
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from app.admin import CustomTOTPDeviceAdmin
+from app.cache import organizacion_por_api_key, organizacion_por_dominio
+from app.catalogo import categorias, invalidar_categorias
+from app.models import Categoria, Organizacion, ResumenOrganizacion, Testimonios, User
+from app.otp import tiene_dispositivo
+from app.parsers import JSONRapidoParser
+from app.renderers import JSONRapidoRenderer
+from app.roles import roles
+from app.serializacion import SerializadorRapido
+from app.serializers import TestimonioAprobadoSerializer, TestimonioSerializer
+from app.snapshots import leer_snapshot, storage_snapshots
+from app.subidas import MAX_TAMANO, SubidasCloudinary, almacen_subidas, subir_archivos
+from app.tokens import access_token_con_roles
+from app.urls import router, urlpatterns
+from testimonios import middleware
+from testimonios.middleware import elegir_codificacion
+
+# 👇 Los snapshots que publican las señales (cualquier test que aprueba un testimonio) van a un
+# directorio temporal durante toda la corrida, nunca a Backend/snapshots ni a un storage remoto
+_snapshots_de_prueba = None
+
+
+def setUpModule():
+    global _snapshots_de_prueba
+    directorio = tempfile.mkdtemp(prefix='snapshots-tests-')
+    _snapshots_de_prueba = (directorio, override_settings(
+        TESTIMONIOS_SNAPSHOT_STORAGE='django.core.files.storage.FileSystemStorage',
+        TESTIMONIOS_SNAPSHOT_ROOT=directorio,
+    ))
+    _snapshots_de_prueba[1].enable()
+    storage_snapshots.cache_clear()
+
+
+def tearDownModule():
+    directorio, configuracion = _snapshots_de_prueba
+    configuracion.disable()
+    storage_snapshots.cache_clear()
+    shutil.rmtree(directorio, ignore_errors=True)
+
+
+# Tiempo máximo por petición (ms). Es holgado a propósito: lo que se controla de forma
+# estricta es la cantidad de consultas, la latencia solo atrapa regresiones groseras
+LATENCIA_MAXIMA_MS = 1500
+
+# 👇 Techo de consultas por endpoint y rol. Es el MISMO para todos los tamaños del dataset:
+# si una consulta por fila vuelve a aparecer, el tamaño grande lo supera y el test falla
+PRESUPUESTOS = {
+    'visitantes-list': {'anonimo': 0, 'visitante': 3, 'editor': 3, 'staff': 3},
+    'visitantes-detail': {'anonimo': 0, 'visitante': 4, 'editor': 4, 'staff': 3},
+    'editores-list': {'anonimo': 0, 'visitante': 2, 'editor': 3, 'staff': 2},
+    'editores-detail': {'anonimo': 0, 'visitante': 2, 'editor': 4, 'staff': 3},
+    'administrador-list': {'anonimo': 0, 'visitante': 1, 'editor': 1, 'staff': 2},
+    'administrador-detail': {'anonimo': 0, 'visitante': 1, 'editor': 1, 'staff': 2},
+    'categorias-list': {'anonimo': 0, 'visitante': 1, 'editor': 1, 'staff': 1},
+    'categorias-detail': {'anonimo': 0, 'visitante': 1, 'editor': 1, 'staff': 1},
+    'organizacion-list': {'anonimo': 0, 'visitante': 3, 'editor': 5, 'staff': 4},
+    'organizacion-detail': {'anonimo': 0, 'visitante': 3, 'editor': 5, 'staff': 4},
+    'organizacion-testimonios-aprobados': {'anonimo': 3, 'visitante': 5, 'editor': 7, 'staff': 6},
+    'organizacion-agregar-editores': {'anonimo': 0, 'visitante': 3, 'editor': 9, 'staff': 9},
+    'organizacion-agregar-visitantes': {'anonimo': 0, 'visitante': 3, 'editor': 10, 'staff': 10},
+    'testimonios-list': {'anonimo': 1, 'visitante': 2, 'editor': 2, 'staff': 2},
+    'testimonios-detail': {'anonimo': 1, 'visitante': 2, 'editor': 2, 'staff': 2},
+    'testimonios-totales-list': {'anonimo': 0, 'visitante': 3, 'editor': 3, 'staff': 2},
+    'testimonios-totales-detail': {'anonimo': 0, 'visitante': 4, 'editor': 4, 'staff': 4},
+    'testimonios-totales-buscar': {'anonimo': 0, 'visitante': 4, 'editor': 4, 'staff': 3},
+    'testimonios-totales-estadisticas': {'anonimo': 0, 'visitante': 2, 'editor': 3, 'staff': 3},
+    'testimonios-create': {'anonimo': 5, 'visitante': 7, 'editor': 2, 'staff': 7},
+    'testimonios-firma-subida': {'anonimo': 1},
+    'cambiar-estado-testimonio-list': {'anonimo': 0, 'visitante': 1, 'editor': 1, 'staff': 1},
+    'cambiar-estado-testimonio-detail': {'anonimo': 0, 'visitante': 3, 'editor': 7, 'staff': 7},
+    'testimonio-feedback-detail': {'anonimo': 0, 'visitante': 3, 'editor': 9, 'staff': 10},
+    'api-root': {'anonimo': 0, 'visitante': 1, 'editor': 1, 'staff': 1},
+    'embed': {'anonimo': 2, 'visitante': 2, 'editor': 2, 'staff': 2},
+    'login': {'anonimo': 2},
+    # El refresh vuelve a leer el usuario y sus membresías para los claims del access token (ver tokens.py)
+    'token-refresh': {'anonimo': 2},
+    'password-reset': {'anonimo': 1},
+    'password-reset-confirm': {'anonimo': 0},
+}
+
+
+class PresupuestoConsultasMixin:
+    """
+    Llama a cada ruta de app/urls.py con cada rol y verifica el techo de consultas
+    y la latencia. Las subclases solo cambian el tamaño del dataset sembrado.
+    """
+    TAMANO = None
+
+    @classmethod
+    def setUpTestData(cls):
+        grupo_visitante, _ = Group.objects.get_or_create(name='visitante')
+        grupo_editor, _ = Group.objects.get_or_create(name='editor')
+
+        cls.categorias = [
+            Categoria.objects.create(nombre_categoria=f'Categoria {i}', icono='star', color='#fff')
+            for i in range(3)
+        ]
+
+        cls.staff = User.objects.create_user(
+            username='staff', email='staff@test.com', password='clave-segura', is_staff=True
+        )
+        cls.editor = User.objects.create_user(username='editor', email='editor@test.com', password='clave-segura')
+        cls.editor.groups.add(grupo_editor)
+
+        cls.visitantes = []
+        for i in range(cls.TAMANO):
+            visitante = User.objects.create_user(
+                username=f'visitante{i}', email=f'visitante{i}@test.com', password='clave-segura'
+            )
+            visitante.groups.add(grupo_visitante)
+            cls.visitantes.append(visitante)
+        cls.visitante = cls.visitantes[0]
+
+        estados = ['A', 'A', 'E', 'R', 'B', 'P']
+        cls.organizaciones = []
+        for i in range(cls.TAMANO):
+            organizacion = Organizacion.objects.create(
+                organizacion_nombre=f'Organizacion {i}', dominio=f'organizacion{i}.test'
+            )
+            # Cada organización tiene su propio editor y además el editor compartido de los tests
+            editor_propio = User.objects.create_user(
+                username=f'editor{i}', email=f'editor{i}@test.com', password='clave-segura'
+            )
+            editor_propio.groups.add(grupo_editor)
+            organizacion.editores.add(cls.editor, editor_propio)
+            organizacion.visitantes.add(*cls.visitantes)
+            cls.organizaciones.append(organizacion)
+
+            testimonios = []
+            for j, visitante in enumerate(cls.visitantes):
+                estado = estados[j % len(estados)]
+                testimonios.append(Testimonios(
+                    organizacion=organizacion, usuario_registrado=visitante, api_key=organizacion.api_key,
+                    categoria=cls.categorias[j % 3], comentario=f'Comentario {j}', ranking=(j % 5) + 1,
+                    estado=estado, feedback='Motivo' if estado == 'R' else None,
+                ))
+                testimonios.append(Testimonios(
+                    organizacion=organizacion, usuario_anonimo_username=f'anonimo{j}',
+                    usuario_anonimo_email=f'anonimo{j}@test.com', api_key=organizacion.api_key,
+                    categoria=cls.categorias[j % 3], comentario=f'Comentario anónimo {j}',
+                    ranking=(j % 5) + 1, estado=estado, feedback='Motivo' if estado == 'R' else None,
+                ))
+            # bulk_create no dispara señales: el resumen se reconstruye al final
+            Testimonios.objects.bulk_create(testimonios)
+            ResumenOrganizacion.reconstruir(organizacion.id)
+
+        cls.organizacion = cls.organizaciones[0]
+        cls.aprobado = Testimonios.objects.filter(organizacion=cls.organizacion, estado='A').first()
+        cls.propio = Testimonios.objects.get(organizacion=cls.organizacion, usuario_registrado=cls.visitante)
+
+    def cliente(self, rol):
+        client = APIClient()
+        usuario = {
+            'anonimo': None,
+            'visitante': self.visitante,
+            'editor': self.editor,
+            'staff': self.staff,
+        }[rol]
+        if usuario is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(usuario).access_token}')
+        return client
+
+    def verificar(self, nombre, rol, metodo, url, data=None):
+        client = self.cliente(rol)
+        # Los throttles y los feeds viven en el cache: limpiarlo mide siempre el camino completo
+        cache.clear()
+        # El catálogo de categorías vive en la memoria del proceso: se mide ya cargado
+        categorias()
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            response = getattr(client, metodo)(url, data, format='json')
+            milisegundos = (time.perf_counter() - inicio) * 1000
+
+        contexto = f"{nombre} como {rol} (tamaño {self.TAMANO}, status {response.status_code})"
+        self.assertLess(response.status_code, 500, contexto)
+        self.assertLessEqual(
+            len(consultas), PRESUPUESTOS[nombre][rol],
+            f"{contexto}: {len(consultas)} consultas\n" + '\n'.join(q['sql'] for q in consultas.captured_queries)
+        )
+        self.assertLess(milisegundos, LATENCIA_MAXIMA_MS, f"{contexto}: {milisegundos:.0f} ms")
+        return response
+
+    def verificar_roles(self, nombre, metodo, url, data=None):
+        for rol in PRESUPUESTOS[nombre]:
+            with self.subTest(endpoint=nombre, rol=rol):
+                self.verificar(nombre, rol, metodo, url, data)
+
+    # ---------- Usuarios ----------
+
+    def test_visitantes(self):
+        self.verificar_roles('visitantes-list', 'get', '/app/visitantes/')
+        self.verificar_roles('visitantes-detail', 'get', f'/app/visitantes/{self.visitante.id}/')
+
+    def test_editores(self):
+        self.verificar_roles('editores-list', 'get', '/app/editores/')
+        self.verificar_roles('editores-detail', 'get', f'/app/editores/{self.editor.id}/')
+
+    def test_administradores(self):
+        self.verificar_roles('administrador-list', 'get', '/app/administradores/')
+        self.verificar_roles('administrador-detail', 'get', f'/app/administradores/{self.staff.id}/')
+
+    # ---------- Catálogos ----------
+
+    def test_categorias(self):
+        self.verificar_roles('categorias-list', 'get', '/app/categorias/')
+        self.verificar_roles('categorias-detail', 'get', f'/app/categorias/{self.categorias[0].id}/')
+
+    def test_organizaciones(self):
+        self.verificar_roles('organizacion-list', 'get', '/app/organizacion/')
+        self.verificar_roles('organizacion-detail', 'get', f'/app/organizacion/{self.organizacion.id}/')
+        self.verificar_roles(
+            'organizacion-testimonios-aprobados', 'get',
+            f'/app/organizacion/{self.organizacion.id}/testimonios-aprobados/'
+        )
+
+    def test_agregar_miembros(self):
+        editor_propio = User.objects.get(username='editor0')
+        self.verificar_roles(
+            'organizacion-agregar-editores', 'post',
+            f'/app/organizacion/{self.organizacion.id}/agregar-editores/', {'editores': [editor_propio.id]}
+        )
+        self.verificar_roles(
+            'organizacion-agregar-visitantes', 'post',
+            f'/app/organizacion/{self.organizacion.id}/agregar-visitantes/', {'visitantes': [self.visitante.id]}
+        )
+
+    # ---------- Testimonios ----------
+
+    def test_testimonios_publicos(self):
+        self.verificar_roles('testimonios-list', 'get', '/app/testimonios/')
+        # Con filtros y otro orden el costo es el mismo (y el cursor también pagina ese orden)
+        self.verificar_roles(
+            'testimonios-list', 'get',
+            f'/app/testimonios/?categoria={self.categorias[0].id}&ranking_min=2&orden=mejor'
+        )
+        self.verificar_roles('testimonios-detail', 'get', f'/app/testimonios/{self.aprobado.id}/')
+
+    def test_testimonios_totales(self):
+        self.verificar_roles('testimonios-totales-list', 'get', '/app/testimonios-totales/')
+        self.verificar_roles('testimonios-totales-list', 'get', '/app/testimonios-totales/?estado=E,R&orden=ranking')
+        self.verificar_roles('testimonios-totales-detail', 'get', f'/app/testimonios-totales/{self.propio.id}/')
+        self.verificar_roles('testimonios-totales-estadisticas', 'get', '/app/testimonios-totales/estadisticas/')
+        self.verificar_roles('testimonios-totales-buscar', 'get', '/app/testimonios-totales/buscar/?q=Comentario')
+
+    def test_crear_testimonio(self):
+        for rol in PRESUPUESTOS['testimonios-create']:
+            with self.subTest(endpoint='testimonios-create', rol=rol):
+                # Una organización nueva por rol, para que nunca choque con un testimonio existente
+                organizacion = Organizacion.objects.create(
+                    organizacion_nombre=f'Nueva {rol}', dominio=f'nueva-{rol}.test'
+                )
+                organizacion.visitantes.add(self.visitante)
+                self.verificar('testimonios-create', rol, 'post', '/app/testimonios/', {
+                    'organizacion': organizacion.id,
+                    'api_key': organizacion.api_key,
+                    'categoria': self.categorias[0].id,
+                    'comentario': 'Nuevo testimonio',
+                    'ranking': '4.0',
+                    'usuario_anonimo_username': f'nuevo-{rol}',
+                    'usuario_anonimo_email': f'nuevo-{rol}@test.com',
+                })
+
+    @override_settings(TESTIMONIOS_SUBIDAS_ALMACEN='app.subidas.SubidasLocales')
+    def test_firma_subida(self):
+        almacen_subidas.cache_clear()
+        self.addCleanup(almacen_subidas.cache_clear)
+        self.verificar_roles(
+            'testimonios-firma-subida', 'post', '/app/testimonios/firma-subida/', {'api_key': self.organizacion.api_key}
+        )
+
+    def test_cambiar_estado_solo_acepta_patch(self):
+        self.verificar_roles('cambiar-estado-testimonio-list', 'get', '/app/testimonios-cambiar-estado/')
+
+    def test_cambiar_estado(self):
+        # Un testimonio en espera distinto por rol (todas las organizaciones tienen al editor de los tests)
+        en_espera = list(Testimonios.objects.filter(organizacion__editores=self.editor, estado='E'))
+        for rol, testimonio in zip(PRESUPUESTOS['cambiar-estado-testimonio-detail'], en_espera):
+            with self.subTest(endpoint='cambiar-estado-testimonio-detail', rol=rol):
+                self.verificar(
+                    'cambiar-estado-testimonio-detail', rol, 'patch',
+                    f'/app/testimonios-cambiar-estado/{testimonio.id}/', {'estado': 'A'}
+                )
+
+    def test_feedback(self):
+        # Un testimonio en espera distinto por rol (todas las organizaciones tienen al editor de los tests)
+        en_espera = list(Testimonios.objects.filter(organizacion__editores=self.editor, estado='E'))
+        for rol, testimonio in zip(PRESUPUESTOS['testimonio-feedback-detail'], en_espera):
+            with self.subTest(endpoint='testimonio-feedback-detail', rol=rol):
+                self.verificar(
+                    'testimonio-feedback-detail', rol, 'patch',
+                    f'/app/testimonios-feedback/{testimonio.id}/', {'feedback': 'No cumple las normas'}
+                )
+
+    def test_embed(self):
+        self.verificar_roles('embed', 'get', f'/app/embed/{self.organizacion.api_key}/')
+
+    def test_embed_api_key_regenerada(self):
+        api_key_vieja = self.organizacion.api_key
+        self.assertEqual(self.client.get(f'/app/embed/{api_key_vieja}/').status_code, 200)
+
+        organizacion = Organizacion.objects.get(id=self.organizacion.id)
+        organizacion.api_key = 'api-key-nueva'
+        organizacion.save()
+
+        # La clave vieja no puede seguir resolviendo desde el cache
+        self.assertEqual(self.client.get(f'/app/embed/{api_key_vieja}/').status_code, 404)
+        self.assertEqual(self.client.get('/app/embed/api-key-nueva/').status_code, 200)
+
+    def test_embed_sin_aprobados(self):
+        # El nombre sale de la organización ya resuelta: api_key + testimonios, sin otra consulta
+        organizacion = Organizacion.objects.create(organizacion_nombre='Sin aprobados', dominio='vacia.test')
+        cache.clear()
+        with self.assertNumQueries(PRESUPUESTOS['embed']['anonimo']):
+            respuesta = self.client.get(f'/app/embed/{organizacion.api_key}/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json(), {'organizacion': 'Sin aprobados', 'testimonios': []})
+
+    def test_raiz_de_la_api(self):
+        self.verificar_roles('api-root', 'get', '/app/')
+
+    def test_todas_las_rutas_tienen_presupuesto(self):
+        # 👇 Una ruta nueva en app/urls.py sin su techo de consultas hace fallar este test
+        rutas = {ruta.name for ruta in router.urls} | {
+            ruta.name for ruta in urlpatterns if getattr(ruta, 'name', None)
+        }
+        self.assertEqual(rutas - set(PRESUPUESTOS), set(), "Rutas sin presupuesto en PRESUPUESTOS")
+
+    # ---------- Autenticación ----------
+
+    def test_login(self):
+        self.verificar_roles('login', 'post', '/app/login/', {
+            'email': 'editor@test.com', 'password': 'clave-segura'
+        })
+
+    def test_token_refresh(self):
+        self.verificar_roles('token-refresh', 'post', '/app/token/refresh/', {
+            'refresh': str(RefreshToken.for_user(self.editor))
+        })
+
+    def test_reset_password(self):
+        self.verificar_roles('password-reset', 'post', '/app/auth/reset/password/', {'email': 'editor@test.com'})
+        self.verificar_roles('password-reset-confirm', 'post', '/app/auth/reset/password/confirm/', {
+            'uid': 'invalido', 'token': 'invalido', 'new_password': 'otra-clave-segura-123'
+        })
+
+
+# Hasher rápido: el costo de PBKDF2 no es lo que se mide en el login
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PresupuestoConsultasChicoTests(PresupuestoConsultasMixin, TestCase):
+    TAMANO = 6
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PresupuestoConsultasGrandeTests(PresupuestoConsultasMixin, TestCase):
+    TAMANO = 24
+
+
+class SnapshotsTests(TestCase):
+    """Los snapshots se publican en disco local al cambiar los aprobados"""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        configuracion = override_settings(
+            TESTIMONIOS_SNAPSHOT_STORAGE='django.core.files.storage.FileSystemStorage',
+            TESTIMONIOS_SNAPSHOT_ROOT=directorio,
+        )
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        storage_snapshots.cache_clear()
+        self.addCleanup(storage_snapshots.cache_clear)
+
+        self.categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        self.organizacion = Organizacion.objects.create(organizacion_nombre='Snapshot', dominio='snapshot.test')
+        self.testimonio = Testimonios.objects.create(
+            organizacion=self.organizacion, usuario_anonimo_username='anonimo',
+            usuario_anonimo_email='anonimo@test.com', api_key=self.organizacion.api_key,
+            categoria=self.categoria, comentario='Muy bueno', ranking=5, estado='E',
+        )
+
+    def cambiar_estado(self, estado):
+        testimonio = Testimonios.objects.get(id=self.testimonio.id)
+        testimonio.estado = estado
+        with self.captureOnCommitCallbacks(execute=True):
+            testimonio.save()
+
+    def test_se_publica_al_aprobar_y_al_dejar_de_estar_aprobado(self):
+        self.assertIsNone(leer_snapshot(self.organizacion.id))
+
+        self.cambiar_estado('A')
+        snapshot = leer_snapshot(self.organizacion.id)
+        self.assertEqual(snapshot['total_testimonios'], 1)
+        self.assertEqual(snapshot['testimonios'][0]['comentario'], 'Muy bueno')
+        self.assertEqual(leer_snapshot(self.organizacion.id, self.categoria.id)['total_testimonios'], 1)
+
+        self.cambiar_estado('P')
+        snapshot_nuevo = leer_snapshot(self.organizacion.id)
+        self.assertEqual(snapshot_nuevo['total_testimonios'], 0)
+        self.assertNotEqual(snapshot_nuevo['version'], snapshot['version'])
+        # La categoría se quedó sin aprobados: su snapshot se borra
+        self.assertIsNone(leer_snapshot(self.organizacion.id, self.categoria.id))
+
+    def test_no_se_publica_si_no_cambian_los_aprobados(self):
+        self.cambiar_estado('P')
+        self.assertIsNone(leer_snapshot(self.organizacion.id))
+
+    @override_settings(TESTIMONIOS_SNAPSHOT_MAX=1)
+    def test_totales_y_categorias_con_todos_los_aprobados(self):
+        self.cambiar_estado('A')
+        otra = Categoria.objects.create(nombre_categoria='Otra', icono='star', color='#000')
+        with self.captureOnCommitCallbacks(execute=True):
+            Testimonios.objects.create(
+                organizacion=self.organizacion, usuario_anonimo_username='otro',
+                usuario_anonimo_email='otro@test.com', api_key=self.organizacion.api_key,
+                categoria=otra, comentario='Regular', ranking=3, estado='A',
+            )
+
+        snapshot = leer_snapshot(self.organizacion.id)
+        self.assertEqual(len(snapshot['testimonios']), 1)
+        self.assertEqual(snapshot['total_testimonios'], 2)
+        self.assertEqual(snapshot['promedio_ranking'], 4.0)
+        # El más viejo no entra en el general, pero su categoría lo tiene
+        self.assertEqual(leer_snapshot(self.organizacion.id, self.categoria.id)['testimonios'][0]['comentario'], 'Muy bueno')
+        self.assertFalse([n for n in os.listdir(storage_snapshots().path(f'organizaciones/{self.organizacion.id}')) if n.endswith('.tmp')])
+
+    @override_settings(TESTIMONIOS_SNAPSHOT_VERSIONES=2)
+    def test_solo_las_ultimas_versiones(self):
+        directorio = storage_snapshots().path(f'organizaciones/{self.organizacion.id}')
+
+        def versionados():
+            return sorted(n for n in os.listdir(directorio) if n.startswith('testimonios.') and n != 'testimonios.json')
+
+        self.cambiar_estado('A')
+        for i in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                Testimonios.objects.create(
+                    organizacion=self.organizacion, usuario_anonimo_username=f'otro{i}',
+                    usuario_anonimo_email=f'otro{i}@test.com', api_key=self.organizacion.api_key,
+                    categoria=self.categoria, comentario=f'Otro {i}', ranking=4, estado='A',
+                )
+        snapshot = leer_snapshot(self.organizacion.id)
+        self.assertEqual(len(snapshot['versiones']), 2)
+        self.assertEqual(versionados(), sorted(f'testimonios.{v}.json' for v in snapshot['versiones']))
+
+        # Al borrar la organización no queda ningún snapshot, tampoco los versionados
+        with self.captureOnCommitCallbacks(execute=True):
+            Organizacion.objects.get(id=self.organizacion.id).delete()
+        self.assertEqual([n for _, _, archivos in os.walk(directorio) for n in archivos], [])
+
+    def test_url_solo_si_el_storage_es_publico(self):
+        self.cambiar_estado('A')
+        url = f'/app/organizacion/{self.organizacion.id}/testimonios-aprobados/'
+        self.assertNotIn('snapshot', APIClient().get(url).data['organizacion'])
+
+        cache.clear()
+        with override_settings(TESTIMONIOS_SNAPSHOT_URL='https://cdn.test/snapshots/'):
+            storage_snapshots.cache_clear()
+            self.assertIn('snapshot', APIClient().get(url).data['organizacion'])
+
+
+class FiltrosTestimoniosTests(TestCase):
+    """Filtros y orden de los listados, y el cursor recorriendo un orden distinto al de fecha"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categorias = [
+            Categoria.objects.create(nombre_categoria=f'Categoria {i}', icono='star', color='#fff')
+            for i in range(2)
+        ]
+        cls.organizacion = Organizacion.objects.create(organizacion_nombre='Filtros', dominio='filtros.test')
+        for i in range(12):
+            Testimonios.objects.create(
+                organizacion=cls.organizacion, usuario_anonimo_username=f'anonimo{i}',
+                usuario_anonimo_email=f'anonimo{i}@test.com', api_key=cls.organizacion.api_key,
+                categoria=cls.categorias[i % 2], comentario=f'Comentario {i}', ranking=(i % 3) + 3,
+                archivos=['https://example.com/foto.jpg'] if i % 4 == 0 else [],
+                estado='A' if i < 10 else 'E',
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def listar(self, url):
+        """Recorre todas las páginas siguiendo el 'next'"""
+        resultados = []
+        while url:
+            response = APIClient().get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            resultados.extend(response.data['results'])
+            url = response.data['next']
+        return resultados
+
+    def test_tiene_media_se_calcula_al_guardar(self):
+        self.assertEqual(Testimonios.objects.filter(tiene_media=True).count(), 3)
+        testimonio = Testimonios.objects.filter(tiene_media=True).first()
+        testimonio.archivos = []
+        testimonio.save(update_fields=['archivos'])
+        testimonio.refresh_from_db()
+        self.assertFalse(testimonio.tiene_media)
+
+    def test_filtros(self):
+        resultados = self.listar(f'/app/testimonios/?categoria={self.categorias[0].id}&ranking_min=4')
+        self.assertEqual({r['comentario'] for r in resultados}, {'Comentario 2', 'Comentario 4', 'Comentario 8'})
+
+        resultados = self.listar('/app/testimonios/?con_media=true')
+        self.assertEqual({r['comentario'] for r in resultados}, {'Comentario 0', 'Comentario 4', 'Comentario 8'})
+
+        hoy = timezone.localdate().isoformat()
+        self.assertEqual(len(self.listar(f'/app/testimonios/?desde={hoy}&hasta={hoy}')), 10)
+        self.assertEqual(len(self.listar('/app/testimonios/?desde=0001-01-01&hasta=9999-12-31')), 10)
+
+    def test_cursor_en_orden_mejor(self):
+        esperado = list(
+            Testimonios.objects.filter(estado='A')
+            .order_by('-ranking', '-tiene_media', '-fecha_comentario', '-id').values_list('id', flat=True)
+        )
+        resultados = self.listar('/app/testimonios/?orden=mejor&page_size=3')
+        self.assertEqual([r['id'] for r in resultados], esperado)
+
+    def test_parametros_invalidos(self):
+        for parametros in ('orden=otro', 'ranking_min=diez', 'desde=ayer', 'con_media=tal vez', 'categoria=a',
+                           'ranking_min=NaN', 'ranking_max=sNaN', 'ranking_min=Infinity',
+                           'categoria=²', 'categoria=99999999999999999999999'):
+            with self.subTest(parametros=parametros):
+                response = APIClient().get(f'/app/testimonios/?{parametros}')
+                self.assertEqual(response.status_code, 400)
+
+
+class CamposDinamicosTests(TestCase):
+    """?fields= / ?omit= recortan la respuesta y también las columnas y relaciones consultadas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        grupo_editor, _ = Group.objects.get_or_create(name='editor')
+        cls.editor = User.objects.create_user(username='editor', email='editor@test.com', password='clave-segura')
+        cls.editor.groups.add(grupo_editor)
+        categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        cls.organizacion = Organizacion.objects.create(organizacion_nombre='Campos', dominio='campos.test')
+        cls.organizacion.editores.add(cls.editor)
+        for i in range(3):
+            Testimonios.objects.create(
+                organizacion=cls.organizacion, usuario_anonimo_username=f'anonimo{i}',
+                usuario_anonimo_email=f'anonimo{i}@test.com', api_key=cls.organizacion.api_key,
+                categoria=categoria, comentario=f'Comentario {i}', ranking=5, estado='A',
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_fields_recorta_respuesta_y_columnas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = APIClient().get('/app/testimonios/?fields=id,comentario,ranking')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'comentario', 'ranking'})
+
+        sql = consultas.captured_queries[-1]['sql']
+        self.assertNotIn('"archivos"', sql)
+        self.assertNotIn('app_organizacion', sql)
+
+    def test_omit(self):
+        response = APIClient().get('/app/testimonios/?omit=archivos_urls,organizacion_nombre')
+        self.assertEqual(response.status_code, 200)
+        campos = set(response.data['results'][0])
+        self.assertNotIn('archivos_urls', campos)
+        self.assertNotIn('organizacion_nombre', campos)
+        self.assertIn('usuario_anonimo_username', campos)
+
+    def test_campo_inexistente(self):
+        response = APIClient().get('/app/testimonios/?fields=id,comentaro')
+        self.assertEqual(response.status_code, 400)
+
+    def test_sin_editores_ni_visitantes_no_hay_prefetch(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(self.editor).access_token}')
+
+        with CaptureQueriesContext(connection) as completas:
+            client.get('/app/organizacion/')
+        with CaptureQueriesContext(connection) as recortadas:
+            response = client.get('/app/organizacion/?fields=id,organizacion_nombre')
+
+        self.assertEqual(response.data[0], {'id': self.organizacion.id, 'organizacion_nombre': 'Campos'})
+        # Las dos consultas de prefetch (editores y visitantes) ya no se hacen
+        self.assertEqual(len(recortadas), len(completas) - 2)
+
+
+class SerializacionRapidaTests(TestCase):
+    """El camino rápido (serializacion.py) produce exactamente el mismo JSON que los serializers de DRF"""
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre_categoria='Atención', icono='star', color='#fff')
+        organizacion = Organizacion.objects.create(organizacion_nombre='Rápida ñandú', dominio='rapida.test')
+        con_foto = User.objects.create_user(username='con_foto', email='foto@test.com', password='clave-segura')
+        User.objects.filter(id=con_foto.id).update(profile_picture='image/upload/v1/foto.jpg')
+        sin_foto = User.objects.create_user(username='sin_foto', email='sinfoto@test.com', password='clave-segura')
+
+        comunes = {'organizacion': organizacion, 'api_key': organizacion.api_key, 'categoria': categoria}
+        Testimonios.objects.bulk_create([
+            Testimonios(usuario_registrado=con_foto, comentario='Excelente «servicio»', ranking='4.5',
+                        archivos=['https://example.com/a.jpg', 'https://example.com/b.mp4'], estado='A', **comunes),
+            Testimonios(usuario_registrado=sin_foto, comentario=None, ranking=1, archivos=None,
+                        estado='R', feedback='Lenguaje inapropiado', **comunes),
+            Testimonios(usuario_anonimo_username='anónimo', usuario_anonimo_email='anonimo@test.com',
+                        comentario='Bien', enlace='https://example.com', ranking=3, archivos=[], estado='E',
+                        **comunes),
+        ])
+
+    def comparar(self, serializer_class, context=None):
+        queryset = Testimonios.objects.order_by('-fecha_comentario', '-id')
+        drf = serializer_class(queryset, many=True, context=context or {}).data
+        rapido = SerializadorRapido(serializer_class, context)
+        json_rapido = JSONRenderer().render(rapido.serializar(rapido.filas(queryset)))
+        self.assertEqual(json_rapido, JSONRenderer().render(drf))
+        return json_rapido
+
+    def test_testimonio_serializer(self):
+        json_rapido = self.comparar(TestimonioSerializer)
+        self.assertIn('con_foto (con foto)'.encode(), json_rapido)
+
+    def test_testimonio_aprobado_serializer(self):
+        self.comparar(TestimonioAprobadoSerializer)
+
+    def test_con_campos_recortados(self):
+
+        request = Request(APIRequestFactory().get('/', {'fields': 'usuario_registrado,feedback,ranking'}))
+        self.comparar(TestimonioSerializer, {'request': request})
+
+    def test_endpoint_igual_con_y_sin_camino_rapido(self):
+        Testimonios.objects.update(estado='A', feedback=None)
+        respuestas = []
+        for rapida in (True, False):
+            with override_settings(TESTIMONIOS_SERIALIZACION_RAPIDA=rapida):
+                cache.clear()
+                respuestas.append(APIClient().get('/app/testimonios/?orden=ranking&page_size=2').content)
+        self.assertEqual(respuestas[0], respuestas[1])
+
+
+class JSONRapidoTests(TestCase):
+    """El renderer y el parser con orjson dan exactamente lo mismo que los de DRF"""
+
+    def test_mismos_bytes_que_drf(self):
+        data = {
+            'ranking': Decimal('4.5'),
+            'utc': datetime.datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc),
+            'local': timezone.localtime(datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)),
+            'fecha': datetime.date(2026, 1, 2),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'texto': 'Ñandú «bien»\u2028fin',
+            'traducible': gettext_lazy('Cursor inválido.'),
+            'histograma': {5: 10, 4: 2},
+            'lista': (1, 2.5, None, True),
+        }
+        self.assertEqual(JSONRapidoRenderer().render(data), JSONRenderer().render(data))
+
+    def test_vuelve_a_drf_si_orjson_no_puede(self):
+        data = {'grande': 2 ** 70}
+        self.assertEqual(JSONRapidoRenderer().render(data), JSONRenderer().render(data))
+
+    def test_parser(self):
+        parser = JSONRapidoParser()
+        self.assertEqual(
+            parser.parse(io.BytesIO('{"comentario": "Excelente ñ", "ranking": 4.5}'.encode())),
+            {'comentario': 'Excelente ñ', 'ranking': 4.5}
+        )
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"comentario": '))
+
+
+class CompresionTests(TestCase):
+    """Las respuestas grandes de la API salen comprimidas según Accept-Encoding"""
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        organizacion = Organizacion.objects.create(organizacion_nombre='Compresion', dominio='compresion.test')
+        Testimonios.objects.bulk_create([
+            Testimonios(
+                organizacion=organizacion, usuario_anonimo_username=f'anonimo{i}',
+                usuario_anonimo_email=f'anonimo{i}@test.com', api_key=organizacion.api_key,
+                categoria=categoria, comentario=f'Comentario {i}', ranking=5, estado='A',
+            )
+            for i in range(40)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_gzip(self):
+        sin_comprimir = APIClient().get('/app/testimonios/?page_size=40')
+        cache.clear()
+        response = APIClient().get('/app/testimonios/?page_size=40', HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(gzip.decompress(response.content), sin_comprimir.content)
+        self.assertLess(len(response.content), len(sin_comprimir.content))
+
+    @override_settings(TESTIMONIOS_COMPRESION_MINIMO=10 ** 6)
+    def test_respuestas_chicas_no_se_comprimen(self):
+        response = APIClient().get('/app/testimonios/?page_size=40', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming(self):
+        partes = [b'[', *(b'{"comentario":"Comentario %d"},' % i for i in range(100)), b'{}]']
+        compresion = middleware.CompresionMiddleware(
+            lambda request: StreamingHttpResponse(iter(partes), content_type='application/json')
+        )
+        response = compresion(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(partes))
+
+    @skipUnless(middleware.brotli is not None, 'Brotli no está instalado')
+    def test_brotli_con_relleno_aleatorio(self):
+        cuerpo = b'{"comentario":"Comentario"}' * 100
+        compresion = middleware.CompresionMiddleware(lambda request: HttpResponse(cuerpo, content_type='application/json'))
+        largos = set()
+        for _ in range(20):
+            response = compresion(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='br'))
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(middleware.brotli.decompress(response.content), cuerpo)
+            largos.add(len(response.content))
+        # 👇 El largo no depende solo del contenido (BREACH)
+        self.assertGreater(len(largos), 1)
+
+    def test_elegir_codificacion(self):
+        hay_brotli = middleware.brotli is not None
+        self.assertEqual(elegir_codificacion('gzip, br'), 'br' if hay_brotli else 'gzip')
+        self.assertEqual(elegir_codificacion('br;q=0.5, gzip;q=0.8'), 'gzip')
+        self.assertEqual(elegir_codificacion('gzip;q=0, br;q=0'), None)
+        self.assertEqual(elegir_codificacion('identity'), None)
+        self.assertEqual(elegir_codificacion('*'), 'br' if hay_brotli else 'gzip')
+
+
+# Purgas que recibe la "CDN" en los tests (TESTIMONIOS_CDN_PURGA apunta a registrar_purga)
+PURGAS = []
+
+
+def registrar_purga(etiquetas):
+    PURGAS.append(etiquetas)
+
+
+@override_settings(TESTIMONIOS_CDN_PURGA='app.tests.registrar_purga')
+class PoliticaCacheCDNTests(TestCase):
+    """Los GET anónimos públicos se pueden cachear en la CDN; los autenticados y las escrituras no"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        cls.organizacion = Organizacion.objects.create(organizacion_nombre='CDN', dominio='cdn.test')
+        cls.testimonio = Testimonios.objects.create(
+            organizacion=cls.organizacion, usuario_anonimo_username='anonimo', usuario_anonimo_email='anonimo@test.com',
+            api_key=cls.organizacion.api_key, categoria=cls.categoria, comentario='Comentario', ranking=5, estado='A',
+        )
+        cls.staff = User.objects.create_user(username='staff', email='staff@test.com', password='clave-segura', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        PURGAS.clear()
+
+    def test_get_anonimo_es_publico(self):
+        response = APIClient().get(f'/app/organizacion/{self.organizacion.id}/testimonios-aprobados/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=5', response['Cache-Control'])
+        self.assertIn('stale-while-revalidate=30', response['Cache-Control'])
+        self.assertIn('Authorization', response['Vary'])
+        self.assertEqual(response['Cache-Tag'], f'organizacion-{self.organizacion.id}')
+
+    def test_catalogo_de_categorias(self):
+        response = APIClient().get('/app/categorias/')
+        self.assertIn('s-maxage=600', response['Cache-Control'])
+        self.assertEqual(response['Cache-Tag'], 'categorias')
+
+    def test_get_autenticado_es_privado(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.staff)
+        response = cliente.get('/app/testimonios/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+        self.assertFalse(response.has_header('Cache-Tag'))
+
+    def test_errores_no_se_cachean(self):
+        response = APIClient().get('/app/testimonios/?orden=inexistente')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_purga_al_cambiar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.testimonio.comentario = 'Editado'
+            self.testimonio.save()
+        self.assertIn(['testimonios', f'organizacion-{self.organizacion.id}'], PURGAS)
+
+        PURGAS.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria.nombre_categoria = 'Otra'
+            self.categoria.save()
+        self.assertEqual(PURGAS, [['categorias', 'testimonios']])
+
+
+class CatalogoCategoriasTests(TestCase):
+    """Las categorías se leen de la memoria del proceso y se recargan al cambiar la versión"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        cls.organizacion = Organizacion.objects.create(organizacion_nombre='Catalogo', dominio='catalogo.test')
+        Testimonios.objects.create(
+            organizacion=cls.organizacion, usuario_anonimo_username='anonimo', usuario_anonimo_email='anonimo@test.com',
+            api_key=cls.organizacion.api_key, categoria=cls.categoria, comentario='Comentario', ranking=5, estado='A',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_se_carga_una_sola_vez(self):
+        categorias()
+        with self.assertNumQueries(0):
+            self.assertEqual(categorias()[self.categoria.id].nombre_categoria, 'General')
+            response = APIClient().get(f'/app/categorias/{self.categoria.id}/')
+        self.assertEqual(response.data['nombre_categoria'], 'General')
+        self.assertEqual(APIClient().get('/app/categorias/0/').status_code, 404)
+
+    def test_cambio_invalida_el_catalogo(self):
+        categorias()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria.nombre_categoria = 'Renombrada'
+            self.categoria.save()
+        self.assertEqual(categorias()[self.categoria.id].nombre_categoria, 'Renombrada')
+
+        invalidar_categorias()
+        with self.assertNumQueries(1):
+            categorias()
+
+    @override_settings(TESTIMONIOS_CACHE_TIMEOUT=0)
+    def test_sin_cache_compartido_recarga_por_tiempo(self):
+        categorias()
+        # Renombrada "desde otro worker": la versión del LocMem de este proceso no cambia
+        Categoria.objects.filter(id=self.categoria.id).update(nombre_categoria='Renombrada')
+
+        with mock.patch('app.catalogo.cache_compartido', return_value=True):
+            self.assertEqual(categorias()[self.categoria.id].nombre_categoria, 'General')
+        with mock.patch('app.catalogo.cache_compartido', return_value=False):
+            self.assertEqual(categorias()[self.categoria.id].nombre_categoria, 'Renombrada')
+
+    def test_testimonios_sin_join_de_categorias(self):
+        categorias()
+        nueva = Categoria.objects.create(nombre_categoria='Nueva', icono='star', color='#fff')
+        Testimonios.objects.filter(organizacion=self.organizacion).update(categoria=nueva)
+        with CaptureQueriesContext(connection) as consultas:
+            response = APIClient().get('/app/testimonios/')
+
+        # La categoría creada después de cargar el catálogo igual se resuelve (recarga puntual)
+        self.assertEqual(response.data['results'][0]['categoria_nombre'], 'Nueva')
+        self.assertFalse(any('JOIN "app_categoria"' in q['sql'] for q in consultas.captured_queries))
+
+
+class RolesTests(TestCase):
+    """El rol y las membresías del usuario se cargan con una sola consulta por petición"""
+
+    @classmethod
+    def setUpTestData(cls):
+        grupo_editor, _ = Group.objects.get_or_create(name='editor')
+        cls.editor = User.objects.create_user(username='editor', email='editor@test.com', password='clave-segura')
+        cls.editor.groups.add(grupo_editor)
+        cls.propia = Organizacion.objects.create(organizacion_nombre='Propia', dominio='propia.test')
+        cls.ajena = Organizacion.objects.create(organizacion_nombre='Ajena', dominio='ajena.test')
+        cls.propia.editores.add(cls.editor)
+        cls.ajena.visitantes.add(cls.editor)
+
+    def test_una_consulta_por_peticion(self):
+        request = Request(APIRequestFactory().get('/'))
+        request.user = self.editor
+
+        with self.assertNumQueries(1):
+            r = roles(request)
+            self.assertTrue(r.es_editor)
+            self.assertFalse(r.es_visitante)
+            self.assertTrue(r.edita(self.propia))
+            self.assertFalse(r.edita(self.ajena.id))
+            self.assertTrue(r.visita(self.ajena))
+        # El Request de DRF y el HttpRequest de Django comparten el resultado
+        self.assertIs(roles(request._request), r)
+
+    def test_anonimo_sin_consultas(self):
+        request = Request(APIRequestFactory().get('/'))
+        with self.assertNumQueries(0):
+            r = roles(request)
+            self.assertFalse(r.es_staff or r.es_editor or r.es_visitante)
+            self.assertFalse(r.edita(self.propia))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TokenRolesTests(TestCase):
+    """El access token lleva rol y membresías: la petición no va a la base a buscarlos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        grupo_editor, _ = Group.objects.get_or_create(name='editor')
+        cls.editor = User.objects.create_user(username='editor', email='editor@test.com', password='clave-segura')
+        cls.editor.groups.add(grupo_editor)
+        cls.organizacion = Organizacion.objects.create(organizacion_nombre='Tokens', dominio='tokens.test')
+        cls.organizacion.editores.add(cls.editor)
+
+    def setUp(self):
+        cache.clear()
+        # 👇 Los claims solo se usan con un cache compartido (Redis en producción); los tests usan LocMem
+        compartido = mock.patch('app.tokens.cache_compartido', return_value=True)
+        self.cache_compartido = compartido.start()
+        self.addCleanup(compartido.stop)
+
+    def login(self):
+        response = APIClient().post('/app/login/', {'email': 'editor@test.com', 'password': 'clave-segura'}, format='json')
+        self.assertEqual(response.data['rol'], 'editor')
+        return response.data['access']
+
+    def cliente(self, access):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'JWT {access}')
+        return client
+
+    def test_claims_sin_consultas_de_usuario(self):
+        access = self.login()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.cliente(access).get('/app/organizacion/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o['id'] for o in response.data], [self.organizacion.id])
+        sql = '\n'.join(q['sql'] for q in consultas.captured_queries)
+        self.assertNotIn('FROM "app_user" WHERE', sql)
+        self.assertNotIn('UNION ALL', sql)
+
+    def test_cambio_de_membresias_obliga_a_renovar(self):
+        access = self.login()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.organizacion.editores.remove(self.editor)
+
+        self.assertEqual(self.cliente(access).get('/app/organizacion/').status_code, 401)
+
+        response = APIClient().post(
+            '/app/token/refresh/', {'refresh': str(RefreshToken.for_user(self.editor))}, format='json'
+        )
+        renovado = self.cliente(response.data['access']).get('/app/organizacion/')
+        self.assertEqual(renovado.status_code, 200)
+        self.assertEqual(renovado.data, [])
+
+    def test_cache_vacio_lee_de_la_base(self):
+        access = self.login()
+        cache.clear()
+        response = self.cliente(access).get('/app/organizacion/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o['id'] for o in response.data], [self.organizacion.id])
+
+    def test_sin_cache_compartido_lee_de_la_base(self):
+        access = self.login()
+        self.cache_compartido.return_value = False
+        # Cambio que otro worker no vería en su propio LocMem: sin versión nueva, igual se respeta
+        User.objects.filter(pk=self.editor.pk).update(is_active=False)
+        self.assertEqual(self.cliente(access).get('/app/organizacion/').status_code, 401)
+
+    def test_usuario_inactivo_en_los_claims(self):
+        refresh = RefreshToken.for_user(self.editor)
+        self.editor.is_active = False
+        access = access_token_con_roles(refresh, self.editor)
+        self.assertEqual(self.cliente(str(access)).get('/app/organizacion/').status_code, 401)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ResolucionOrganizacionTests(TestCase):
+    """api_key y dominio -> organización salen del cache; se olvidan al cambiar la organización"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.get_or_create(name='visitante')
+        cls.categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        cls.organizacion = Organizacion.objects.create(organizacion_nombre='Tenant', dominio='https://tenant.test')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_crear_testimonio_sin_buscar_la_organizacion(self):
+        organizacion_por_api_key(self.organizacion.api_key)
+        with CaptureQueriesContext(connection) as consultas:
+            response = APIClient().post('/app/testimonios/', {
+                'organizacion': self.organizacion.id, 'api_key': self.organizacion.api_key,
+                'categoria': self.categoria.id, 'comentario': 'Nuevo', 'ranking': '4.0',
+                'usuario_anonimo_username': 'nuevo', 'usuario_anonimo_email': 'nuevo@test.com',
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['organizacion_nombre'], 'Tenant')
+        self.assertFalse(any('FROM "app_organizacion"' in q['sql'] for q in consultas.captured_queries))
+
+    def test_api_key_de_otra_organizacion(self):
+        otra = Organizacion.objects.create(organizacion_nombre='Otra', dominio='https://otra.test')
+        response = APIClient().post('/app/testimonios/', {
+            'organizacion': otra.id, 'api_key': self.organizacion.api_key,
+            'categoria': self.categoria.id, 'comentario': 'Nuevo', 'ranking': '4.0',
+            'usuario_anonimo_username': 'nuevo', 'usuario_anonimo_email': 'nuevo@test.com',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('api_key', response.data)
+
+    def test_alta_de_visitante_por_dominio(self):
+        self.assertEqual(organizacion_por_dominio('HTTPS://Tenant.TEST').id, self.organizacion.id)
+        response = APIClient().post('/app/visitantes/', {
+            'username': 'visitante', 'email': 'visitante@test.com', 'password': 'clave-segura',
+        }, format='json', HTTP_ORIGIN='https://TENANT.test')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['asociado_a_organizacion']['id'], self.organizacion.id)
+
+    def test_cambio_de_dominio_olvida_el_cache(self):
+        self.assertIsNotNone(organizacion_por_dominio('https://tenant.test'))
+        organizacion = Organizacion.objects.get(pk=self.organizacion.pk)
+        organizacion.dominio = 'https://nuevo.test'
+        organizacion.save()
+
+        self.assertIsNone(organizacion_por_dominio('https://tenant.test'))
+        self.assertEqual(organizacion_por_dominio('https://nuevo.test').id, self.organizacion.id)
+
+
+class VerificacionOTPTests(TestCase):
+    """El estado OTP queda en la sesión: el admin no consulta dispositivos en cada página"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='x', is_staff=True, is_superuser=True)
+        TOTPDevice.objects.create(user=cls.staff, name='default')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def verificar(self):
+        sesion = self.client.session
+        sesion['otp_verified'] = True
+        sesion.save()
+
+    def test_sin_verificar_redirige(self):
+        response = self.client.get('/admin/')
+        self.assertRedirects(response, '/admin/otp-verification/', fetch_redirect_response=False)
+
+    def test_verificado_no_consulta_dispositivos(self):
+        self.verificar()
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/admin/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('otp_totp' in q['sql'] for q in consultas.captured_queries))
+
+    def test_dispositivo_consultado_una_vez(self):
+        request = RequestFactory().get('/admin/')
+        request.user, request.session = self.staff, {}
+        with self.assertNumQueries(1):
+            self.assertTrue(tiene_dispositivo(request))
+        with self.assertNumQueries(0):
+            self.assertTrue(tiene_dispositivo(request))
+
+    def test_cambio_de_dispositivo_en_el_admin_pide_verificar_de_nuevo(self):
+        self.verificar()
+        self.assertEqual(self.client.get('/admin/').status_code, 200)
+
+        dispositivo = TOTPDevice.objects.get(user=self.staff)
+        CustomTOTPDeviceAdmin(TOTPDevice, admin.site).delete_model(None, dispositivo)
+
+        response = self.client.get('/admin/')
+        self.assertRedirects(response, '/admin/otp-verification/', fetch_redirect_response=False)
+
+
+class HistorialAdminTests(TestCase):
+    """El admin no guarda LogEntry (sin tocar LogEntry.save, que es compartido entre hilos)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='admin', password='x', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+        sesion = self.client.session
+        sesion['otp_verified'] = True
+        sesion.save()
+
+    def test_alta_cambio_y_borrado_sin_historial(self):
+        datos = {'nombre_categoria': 'General', 'icono': 'star', 'color': '#fff'}
+        response = self.client.post('/admin/app/categoria/add/', datos)
+        self.assertEqual(response.status_code, 302)
+        categoria = Categoria.objects.get(nombre_categoria='General')
+
+        datos['nombre_categoria'] = 'Otra'
+        self.client.post(f'/admin/app/categoria/{categoria.id}/change/', datos)
+        self.client.post('/admin/app/categoria/', {
+            'action': 'delete_selected', '_selected_action': [categoria.id], 'post': 'yes',
+        })
+
+        self.assertFalse(Categoria.objects.exists())
+        self.assertFalse(LogEntry.objects.exists())
+        self.assertIs(LogEntry.save, Model.save)
+
+
+class SubidasParalelasTests(TestCase):
+    """Los archivos de un testimonio se suben a Cloudinary a la vez; si uno falla no queda ninguno"""
+
+    def subida_falsa(self, demora, fallan=()):
+        def upload(archivo, **kwargs):
+            time.sleep(demora)
+            if archivo in fallan:
+                raise RuntimeError(f"falló {archivo}")
+            return {'secure_url': f'https://cdn.test/{archivo}', 'public_id': archivo, 'resource_type': 'image'}
+        return upload
+
+    def test_en_paralelo_y_en_orden(self):
+        with mock.patch('cloudinary.uploader.upload', side_effect=self.subida_falsa(0.2)):
+            inicio = time.perf_counter()
+            urls = subir_archivos(['a', 'b', 'c', 'd'])
+            duracion = time.perf_counter() - inicio
+
+        self.assertEqual(urls, [f'https://cdn.test/{nombre}' for nombre in 'abcd'])
+        self.assertLess(duracion, 0.6)
+
+    def test_si_una_falla_se_borran_las_demas(self):
+        with mock.patch('cloudinary.uploader.upload', side_effect=self.subida_falsa(0.05, fallan=('b',))), \
+                mock.patch('cloudinary.uploader.destroy') as destroy:
+            with self.assertRaisesMessage(RuntimeError, 'falló b'):
+                subir_archivos(['a', 'b', 'c'])
+            time.sleep(0.2)
+
+        self.assertEqual(sorted(llamada.args[0] for llamada in destroy.call_args_list), ['a', 'c'])
+
+    @override_settings(TESTIMONIOS_SUBIDAS_PLAZO=0.1)
+    def test_plazo_vencido(self):
+        with mock.patch('cloudinary.uploader.upload', side_effect=self.subida_falsa(0.3)), \
+                mock.patch('cloudinary.uploader.destroy') as destroy:
+            with self.assertRaises(TimeoutError):
+                subir_archivos(['a', 'b'])
+            # Las subidas que seguían corriendo se borran al terminar
+            time.sleep(0.5)
+
+        self.assertEqual(sorted(llamada.args[0] for llamada in destroy.call_args_list), ['a', 'b'])
+
+
+@override_settings(TESTIMONIOS_SUBIDAS_ALMACEN='app.subidas.SubidasLocales')
+class SubidasDirectasTests(TestCase):
+    """El cliente sube los archivos al almacén con una firma y el testimonio solo lleva las referencias"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        cls.organizacion = Organizacion.objects.create(organizacion_nombre='Tenant', dominio='https://tenant.test')
+        cls.otra = Organizacion.objects.create(organizacion_nombre='Otra', dominio='https://otra.test')
+
+    def setUp(self):
+        cache.clear()
+        almacen_subidas.cache_clear()
+        self.addCleanup(almacen_subidas.cache_clear)
+
+    def firmar(self, organizacion):
+        response = APIClient().post('/app/testimonios/firma-subida/', {'api_key': organizacion.api_key}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['campos']
+
+    def crear(self, referencias):
+        return APIClient().post('/app/testimonios/', {
+            'organizacion': self.organizacion.id, 'api_key': self.organizacion.api_key,
+            'categoria': self.categoria.id, 'comentario': 'Con foto', 'ranking': '5.0',
+            'usuario_anonimo_username': 'nuevo', 'usuario_anonimo_email': 'nuevo@test.com',
+            'archivos_subidos': referencias,
+        }, format='json')
+
+    def test_testimonio_con_archivos_subidos(self):
+        referencia = almacen_subidas().subir(self.firmar(self.organizacion), 'foto')
+
+        with mock.patch('cloudinary.uploader.upload') as upload:
+            response = self.crear([referencia])
+
+        self.assertEqual(response.status_code, 201)
+        upload.assert_not_called()
+        self.assertEqual(len(response.data['archivos_urls']), 1)
+        self.assertIn(referencia['public_id'], response.data['archivos_urls'][0])
+
+    def test_api_key_invalida(self):
+        response = APIClient().post('/app/testimonios/firma-subida/', {'api_key': 'no-existe'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_referencia_de_otra_organizacion(self):
+        referencia = almacen_subidas().subir(self.firmar(self.otra), 'foto')
+        response = self.crear([referencia])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('archivos_subidos', response.data)
+
+    def test_referencia_alterada(self):
+        referencia = almacen_subidas().subir(self.firmar(self.organizacion), 'foto')
+        referencia['public_id'] = referencia['public_id'].replace('foto', 'otra')
+        response = self.crear([referencia])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('archivos_subidos', response.data)
+        self.assertFalse(Testimonios.objects.exists())
+
+    def test_archivo_demasiado_grande(self):
+        campos = self.firmar(self.organizacion)
+        justo = almacen_subidas().subir(campos, 'justo', tamano=MAX_TAMANO)
+        grande = almacen_subidas().subir(campos, 'grande', tamano=MAX_TAMANO + 1)
+
+        response = self.crear([justo, grande])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tamaño máximo', str(response.data['archivos_subidos']))
+        self.assertFalse(Testimonios.objects.exists())
+        self.assertEqual(self.crear([justo]).status_code, 201)
+
+    def test_tamano_desde_los_metadatos_de_cloudinary(self):
+        with mock.patch('cloudinary.api.resource', return_value={'bytes': 1234}) as resource:
+            self.assertEqual(SubidasCloudinary().tamano('testimonios/archivos/1/foto', 'image'), 1234)
+        resource.assert_called_once_with('testimonios/archivos/1/foto', resource_type='image')
+        with mock.patch('cloudinary.api.resource', side_effect=cloudinary.exceptions.NotFound('no existe')):
+            self.assertIsNone(SubidasCloudinary().tamano('testimonios/archivos/1/otra', 'image'))
+
+    def test_subida_despues_de_vencida_la_firma(self):
+        campos = self.firmar(self.organizacion)
+        # El almacén (como Cloudinary) acepta la firma por más tiempo: el servidor rechaza la referencia
+        with override_settings(TESTIMONIOS_SUBIDAS_FIRMA_VIGENCIA=3600), \
+                mock.patch('app.subidas.time.time', return_value=time.time() + 700):
+            referencia = almacen_subidas().subir(campos, 'foto')
+
+        response = self.crear([referencia])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('vencida', str(response.data['archivos_subidos']))
+
+
+class FeedAprobadosCacheTests(TestCase):
+    """El feed de aprobados se cachea por el id de la organización y se invalida al renombrarla"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        cls.organizacion = Organizacion.objects.create(organizacion_nombre='Feed', dominio='feed.test')
+        Testimonios.objects.create(
+            organizacion=cls.organizacion, usuario_anonimo_username='anonimo',
+            usuario_anonimo_email='anonimo@test.com', api_key=cls.organizacion.api_key,
+            categoria=cls.categoria, comentario='Muy bueno', ranking=5, estado='A',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self, pk):
+        return APIClient().get(f'/app/organizacion/{pk}/testimonios-aprobados/')
+
+    def test_pk_inexistente_no_crea_claves(self):
+        self.assertEqual(self.feed(999999).status_code, 404)
+        self.assertIsNone(cache.get('testimonios:version:999999'))
+
+    def test_pk_no_canonico_usa_la_clave_del_id(self):
+        self.assertEqual(self.feed(f'0{self.organizacion.id}').status_code, 200)
+        self.assertIsNone(cache.get(f'testimonios:version:0{self.organizacion.id}'))
+        self.assertIsNotNone(cache.get(f'testimonios:version:{self.organizacion.id}'))
+
+    def test_campos_dinamicos_de_los_testimonios(self):
+        response = APIClient().get(f'/app/organizacion/{self.organizacion.id}/testimonios-aprobados/?fields=id,comentario')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['testimonios_aprobados'][0]), {'id', 'comentario'})
+
+        response = APIClient().get(f'/app/organizacion/{self.organizacion.id}/testimonios-aprobados/?omit=archivos')
+        self.assertNotIn('archivos', response.data['testimonios_aprobados'][0])
+
+        # Se validan contra los campos del testimonio, no contra los de la organización
+        response = APIClient().get(f'/app/organizacion/{self.organizacion.id}/testimonios-aprobados/?fields=dominio')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('comentario', str(response.data))
+
+    def test_renombrar_organizacion_y_categoria(self):
+        self.assertEqual(self.feed(self.organizacion.id).data['organizacion']['nombre'], 'Feed')
+
+        organizacion = Organizacion.objects.get(pk=self.organizacion.pk)
+        organizacion.organizacion_nombre = 'Feed nuevo'
+        with self.captureOnCommitCallbacks(execute=True):
+            organizacion.save()
+        self.assertEqual(self.feed(self.organizacion.id).data['organizacion']['nombre'], 'Feed nuevo')
+
+        self.assertEqual(self.categoria_nombre(), 'General')
+        categoria = Categoria.objects.get(pk=self.categoria.pk)
+        categoria.nombre_categoria = 'Renombrada'
+        with self.captureOnCommitCallbacks(execute=True):
+            categoria.save()
+        self.assertEqual(self.categoria_nombre(), 'Renombrada')
+
+    def categoria_nombre(self):
+        return self.feed(self.organizacion.id).data['testimonios_aprobados'][0]['categoria_nombre']
+
+
+class BusquedaTestimoniosTests(TestCase):
+    """Búsqueda de texto: cada rol encuentra solo lo que puede ver, ordenado por relevancia"""
+
+    @classmethod
+    def setUpTestData(cls):
+        grupo_visitante, _ = Group.objects.get_or_create(name='visitante')
+        grupo_editor, _ = Group.objects.get_or_create(name='editor')
+        cls.staff = User.objects.create_user(username='staff', email='staff@test.com', password='x', is_staff=True)
+        cls.editor = User.objects.create_user(username='editor', email='editor@test.com', password='x')
+        cls.editor.groups.add(grupo_editor)
+        cls.visitante = User.objects.create_user(username='visitante', email='visitante@test.com', password='x')
+        cls.visitante.groups.add(grupo_visitante)
+
+        categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        cls.propia = Organizacion.objects.create(organizacion_nombre='Propia', dominio='propia.test')
+        cls.propia.editores.add(cls.editor)
+        cls.propia.visitantes.add(cls.visitante)
+        otra = Organizacion.objects.create(organizacion_nombre='Otra', dominio='otra.test')
+
+        def crear(organizacion, comentario, estado='A', usuario=None):
+            return Testimonios.objects.create(
+                organizacion=organizacion, categoria=categoria, comentario=comentario, ranking=4, estado=estado,
+                usuario_registrado=usuario, api_key=organizacion.api_key,
+                usuario_anonimo_username=None if usuario else f'anonimo{estado}',
+                usuario_anonimo_email=None if usuario else f'anonimo{estado}@test.com',
+            )
+
+        cls.del_visitante = crear(cls.propia, 'Excelente servicio, excelente atención, excelente todo', usuario=cls.visitante)
+        cls.en_espera = crear(cls.propia, 'Servicio excelente pero lento', estado='E')
+        cls.borrador = crear(cls.propia, 'Borrador sobre el servicio', estado='B')
+        cls.de_otra = crear(otra, 'Muy buen servicio')
+
+    def setUp(self):
+        cache.clear()
+
+    def buscar(self, usuario, q=None):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'JWT {RefreshToken.for_user(usuario).access_token}')
+        return client.get('/app/testimonios-totales/buscar/', {} if q is None else {'q': q})
+
+    def ids(self, usuario, q):
+        response = self.buscar(usuario, q)
+        self.assertEqual(response.status_code, 200)
+        return [r['id'] for r in response.data['results']]
+
+    def test_sin_texto(self):
+        for q in (None, '', '   '):
+            with self.subTest(q=q):
+                self.assertEqual(self.buscar(self.editor, q).status_code, 400)
+
+    def test_cada_rol_ve_lo_suyo(self):
+        self.assertEqual(set(self.ids(self.visitante, 'servicio')), {self.del_visitante.id})
+        self.assertEqual(set(self.ids(self.editor, 'servicio')), {self.del_visitante.id, self.en_espera.id})
+        self.assertEqual(
+            set(self.ids(self.staff, 'servicio')), {self.del_visitante.id, self.en_espera.id, self.de_otra.id}
+        )
+
+    def test_coincide_con_el_texto_y_el_autor(self):
+        self.assertEqual(self.ids(self.staff, 'lento'), [self.en_espera.id])
+        self.assertEqual(self.ids(self.staff, 'visitante'), [self.del_visitante.id])
+        self.assertEqual(self.ids(self.staff, 'inexistente'), [])
+
+    def test_admin_busca_por_organizacion_y_texto(self):
+        modelo_admin = admin.site._registry[Testimonios]
+        request = RequestFactory().get('/admin/app/testimonios/')
+        request.user = self.staff
+        queryset = Testimonios.objects.all()
+        for termino, esperados in (('Otra', {self.de_otra.id}), ('lento', {self.en_espera.id})):
+            with self.subTest(termino=termino):
+                resultado, _ = modelo_admin.get_search_results(request, queryset, termino)
+                self.assertEqual(set(resultado.values_list('id', flat=True)), esperados)
+
+    @skipUnless(connection.vendor == 'postgresql', 'La relevancia sale del tsvector de PostgreSQL')
+    def test_ordenado_por_relevancia(self):
+        # El que repite 'excelente' tres veces va primero aunque sea más viejo
+        self.assertEqual(self.ids(self.staff, 'excelente'), [self.del_visitante.id, self.en_espera.id])
+
+
+class IndicesConcurrentesTests(TestCase):
+    """Los índices de las migraciones se crean CONCURRENTLY solo en PostgreSQL"""
+
+    def aplicar(self, vendor):
+        from django.db.migrations.state import ProjectState
+
+        from app.indices import AgregarIndiceConcurrente
+
+        operacion = AgregarIndiceConcurrente(
+            model_name='testimonios', index=models.Index(fields=['estado'], name='prueba_concurrente_idx')
+        )
+        estado = ProjectState.from_apps(apps)
+        nuevo = estado.clone()
+        operacion.state_forwards('app', nuevo)
+        schema_editor = mock.Mock()
+        schema_editor.connection.vendor = vendor
+        schema_editor.connection.in_atomic_block = False
+        schema_editor.connection.alias = 'default'
+        operacion.database_forwards('app', schema_editor, estado, nuevo)
+        return schema_editor.add_index.call_args
+
+    def test_postgresql(self):
+        self.assertEqual(self.aplicar('postgresql').kwargs, {'concurrently': True})
+
+    def test_otros_motores(self):
+        self.assertEqual(self.aplicar('sqlite').kwargs, {})
+
+
+class ResumenOrganizacionTests(TestCase):
+    """El resumen que se mantiene con F() en cada cambio es siempre igual al reconstruido desde cero"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        cls.organizacion = Organizacion.objects.create(organizacion_nombre='Resumen', dominio='resumen.test')
+        Testimonios.objects.create(
+            organizacion=cls.organizacion, usuario_anonimo_username='base', usuario_anonimo_email='base@test.com',
+            api_key=cls.organizacion.api_key, categoria=cls.categoria, comentario='Base', ranking=3, estado='A',
+        )
+
+    def resumen(self):
+        return ResumenOrganizacion.objects.filter(organizacion=self.organizacion).values().get()
+
+    def assertIgualAlReconstruido(self):
+        incremental = self.resumen()
+        ResumenOrganizacion.reconstruir(self.organizacion.id)
+        self.assertEqual(incremental, self.resumen())
+        return incremental
+
+    def test_cada_cambio_de_un_testimonio(self):
+        testimonio = Testimonios.objects.create(
+            organizacion=self.organizacion, usuario_anonimo_username='nuevo', usuario_anonimo_email='nuevo@test.com',
+            api_key=self.organizacion.api_key, categoria=self.categoria, comentario='Nuevo', ranking=4, estado='E',
+        )
+        self.assertEqual(self.assertIgualAlReconstruido()['cantidad_espera'], 1)
+
+        testimonio = Testimonios.objects.get(pk=testimonio.pk)
+        testimonio.estado = 'A'
+        testimonio.save()
+        resumen = self.assertIgualAlReconstruido()
+        self.assertEqual((resumen['cantidad_espera'], resumen['cantidad_aprobados'], resumen['estrellas_4']), (0, 2, 1))
+
+        testimonio.ranking = Decimal('2.5')
+        testimonio.save()
+        resumen = self.assertIgualAlReconstruido()
+        self.assertEqual((resumen['estrellas_4'], resumen['estrellas_2'], resumen['suma_ranking_aprobados']), (0, 1, Decimal('5.5')))
+
+        testimonio.estado = 'R'
+        testimonio.feedback = 'No cumple las normas'
+        testimonio.save()
+        resumen = self.assertIgualAlReconstruido()
+        self.assertEqual((resumen['cantidad_aprobados'], resumen['cantidad_rechazados']), (1, 1))
+
+        testimonio.delete()
+        self.assertEqual(self.assertIgualAlReconstruido()['cantidad_rechazados'], 0)
+
+    def test_borrar_la_organizacion(self):
+        otra = Organizacion.objects.create(organizacion_nombre='Otra', dominio='otra.test')
+        Testimonios.objects.create(
+            organizacion=otra, usuario_anonimo_username='otra', usuario_anonimo_email='otra@test.com',
+            api_key=otra.api_key, categoria=self.categoria, comentario='Otra', ranking=5, estado='A',
+        )
+        antes = ResumenOrganizacion.objects.filter(organizacion=otra).values().get()
+
+        # Los testimonios se borran en cascada sin tocar el resumen (que también se borra)
+        self.organizacion.delete()
+        self.assertFalse(ResumenOrganizacion.objects.filter(organizacion_id=self.organizacion.id).exists())
+        self.assertEqual(ResumenOrganizacion.objects.filter(organizacion=otra).values().get(), antes)
+
+    def test_comando_reconstruir_resumenes(self):
+        esperado = self.resumen()
+        ResumenOrganizacion.objects.filter(organizacion=self.organizacion).update(cantidad_aprobados=99, estrellas_3=0)
+
+        salida = io.StringIO()
+        call_command('reconstruir_resumenes', str(self.organizacion.id), stdout=salida)
+        self.assertEqual(self.resumen(), esperado)
+        self.assertIn('1 resumen(es) reconstruido(s)', salida.getvalue())
+
+        ResumenOrganizacion.objects.filter(organizacion=self.organizacion).delete()
+        call_command('reconstruir_resumenes', stdout=io.StringIO())
+        self.assertEqual(self.resumen(), esperado)
+
+
+class FeedCondicionalTests(TestCase):
+    """Los feeds responden 304 cuando el cliente ya tiene la versión vigente"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        cls.organizacion = Organizacion.objects.create(organizacion_nombre='Condicional', dominio='condicional.test')
+        cls.en_espera = Testimonios.objects.create(
+            organizacion=cls.organizacion, usuario_anonimo_username='anonimo', usuario_anonimo_email='anonimo@test.com',
+            api_key=cls.organizacion.api_key, categoria=cls.categoria, comentario='Muy bueno', ranking=5, estado='E',
+        )
+        # Un aprobado de otra organización, con texto suficiente para que valga la pena comprimir el listado
+        otra = Organizacion.objects.create(organizacion_nombre='Otra', dominio='otra.test')
+        Testimonios.objects.create(
+            organizacion=otra, usuario_anonimo_username='anonimo', usuario_anonimo_email='anonimo@test.com',
+            api_key=otra.api_key, categoria=cls.categoria, comentario='Muy bueno. ' * 50, ranking=5, estado='A',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.url = f'/app/organizacion/{self.organizacion.id}/testimonios-aprobados/'
+
+    def test_if_none_match(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"otro"').status_code, 200)
+
+    @override_settings(TESTIMONIOS_COMPRESION_MINIMO=1)
+    def test_if_none_match_con_etag_debil_de_la_compresion(self):
+        response = self.client.get('/app/testimonios/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/'))
+
+        # 👇 Sin tocar la base de datos
+        with self.assertNumQueries(0):
+            response = self.client.get('/app/testimonios/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        modificado = self.client.get(self.url)['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=modificado).status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT').status_code, 200
+        )
+
+    def test_aprobar_cambia_el_etag(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(response.data['testimonios_aprobados'], [])
+
+        testimonio = Testimonios.objects.get(pk=self.en_espera.pk)
+        testimonio.estado = 'A'
+        with self.captureOnCommitCallbacks(execute=True):
+            testimonio.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['testimonios_aprobados']), 1)
+
+
+class PaginacionCursorTests(TestCase):
+    """El listado público se recorre por cursor en el orden por defecto (fecha, id), sin saltos ni repetidos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre_categoria='General', icono='star', color='#fff')
+        organizacion = Organizacion.objects.create(organizacion_nombre='Cursor', dominio='cursor.test')
+        Testimonios.objects.bulk_create([
+            Testimonios(
+                organizacion=organizacion, usuario_anonimo_username=f'anonimo{i}',
+                usuario_anonimo_email=f'anonimo{i}@test.com', api_key=organizacion.api_key,
+                categoria=categoria, comentario=f'Comentario {i}', ranking=5, estado='A',
+            )
+            for i in range(7)
+        ])
+        # 👇 Varios con la misma fecha: el id desempata y el cursor no puede saltearlos
+        empate = timezone.now() - datetime.timedelta(days=1)
+        Testimonios.objects.filter(comentario__in=['Comentario 2', 'Comentario 3', 'Comentario 4']).update(
+            fecha_comentario=empate
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_orden_por_defecto_siguiendo_next(self):
+        esperado = list(Testimonios.objects.order_by('-fecha_comentario', '-id').values_list('id', flat=True))
+        ids, url, paginas = [], '/app/testimonios/?page_size=2', 0
+        while url:
+            response = APIClient().get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids.extend(r['id'] for r in response.data['results'])
+            url, paginas = response.data['next'], paginas + 1
+        self.assertEqual(ids, esperado)
+        self.assertEqual(paginas, 4)
+
+    @override_settings(TESTIMONIOS_MAX_PAGE_SIZE=3)
+    def test_page_size_con_maximo(self):
+        for page_size, cantidad in (('100', 3), ('0', 1), ('-5', 1), ('abc', 3)):
+            with self.subTest(page_size=page_size):
+                cache.clear()
+                response = APIClient().get(f'/app/testimonios/?page_size={page_size}')
+                self.assertEqual(len(response.data['results']), cantidad)
+
+    def test_cursor_alterado(self):
+        siguiente = APIClient().get('/app/testimonios/?page_size=2').data['next']
+        valido = base64.urlsafe_b64decode(parse_qs(urlparse(siguiente).query)['cursor'][0])
+        cortado = base64.urlsafe_b64encode(valido[:-2]).decode()
+        alterado = base64.urlsafe_b64encode(b'["no es una fecha",1]').decode()
+        incompleto = base64.urlsafe_b64encode(b'[1]').decode()
+        for cursor in (cortado, 'no-es-base64!', alterado, incompleto):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(APIClient().get(f'/app/testimonios/?cursor={cursor}').status_code, 404)
+
+
+class BenchmarkIndicesTests(TestCase):
+    """El benchmark quita los índices de app_testimonios: en la base default solo corre con --confirmar"""
+
+    def test_sin_confirmar_no_corre(self):
+        with self.assertRaisesMessage(CommandError, '--confirmar'):
+            call_command('benchmark_indices', stdout=io.StringIO())
+        self.assertFalse(Organizacion.objects.exists())
+
+    def test_con_confirmar_deshace_todo(self):
+        salida = io.StringIO()
+        call_command(
+            'benchmark_indices', '--confirmar', '--organizaciones=2', '--testimonios=10', '--repeticiones=1',
+            stdout=salida,
+        )
+        self.assertIn('SIN índices', salida.getvalue())
+        self.assertFalse(Organizacion.objects.exists())
+        self.assertFalse(Testimonios.objects.exists())
@@ -0,0 +1,119 @@
+"""
+Rol y membresías del usuario dentro del access token.
+
+LoginView y TokenRefreshView emiten el access token con:
+  - rol: 'administrador', 'editor', 'visitante' o 'sin_grupo' (lo mismo que responde el login)
+  - is_staff, is_active, username, grupos
+  - organizaciones_editor / organizaciones_visitante: ids de las organizaciones del usuario
+  - version_roles: versión de las membresías del usuario al emitirlo
+
+JWTRolesAuthentication arma el usuario desde esos claims sin ir a la base (un User con el resto de
+los campos diferidos: si una vista lee otro campo se carga solo) y deja los roles ya resueltos para
+roles(request). Cuando cambian los grupos, las organizaciones o el usuario, las señales cambian su
+versión en el cache y el token viejo responde 401: el cliente tiene que renovarlo.
+Si el cache no tiene la versión (se vació) no se puede saber si algo cambió: se lee el usuario de la base.
+Lo mismo sin un cache compartido (REDIS_URL): con LocMem cada worker tiene su propia versión y el
+cambio de versión de un worker no llega a los demás, asi que los claims no se usan para autorizar.
+"""
+import uuid
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import router
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .roles import Roles
+
+CLAIM_VERSION = 'version_roles'
+
+
+def cache_compartido():
+    """¿El cache es el mismo para todos los procesos? (LocMem es de cada proceso)"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def _clave_version(user_id):
+    return f"roles:version:{user_id}"
+
+
+def version_roles(user_id):
+    """Versión vigente de las membresías del usuario (un token al azar)"""
+    clave = _clave_version(user_id)
+    version = cache.get(clave)
+    if version is None:
+        # add() no pisa el valor si otro proceso lo creó entre el get y el add
+        cache.add(clave, uuid.uuid4().hex, timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def invalidar_roles(user_ids):
+    """Cambia la versión de los usuarios: sus access tokens dejan de valer y hay que renovarlos"""
+    if user_ids:
+        cache.set_many({_clave_version(user_id): uuid.uuid4().hex for user_id in user_ids}, timeout=None)
+
+
+def rol_usuario(user, roles_usuario):
+    if user.is_staff:
+        return "administrador"
+    # Un usuario pertenece a un solo grupo (ver User.clean)
+    return min(roles_usuario.grupos) if roles_usuario.grupos else "sin_grupo"
+
+
+def access_token_con_roles(refresh, user):
+    """Access token del refresh con los claims de rol y membresías del usuario, leídos ahora"""
+    # 👇 La versión se lee ANTES que las membresías: si cambian en el medio, el token nace vencido
+    version = version_roles(user.id)
+    roles_usuario = Roles(user)
+
+    access = refresh.access_token
+    access['rol'] = rol_usuario(user, roles_usuario)
+    access['is_staff'] = user.is_staff
+    access['is_active'] = user.is_active
+    access['username'] = user.username
+    access['grupos'] = sorted(roles_usuario.grupos)
+    access['organizaciones_editor'] = sorted(roles_usuario.organizaciones_editor)
+    access['organizaciones_visitante'] = sorted(roles_usuario.organizaciones_visitante)
+    access[CLAIM_VERSION] = version
+    return access
+
+
+def usuario_desde_token(token):
+    """User armado con los claims, sin consultar la base (los demás campos quedan diferidos)"""
+    valores = {
+        'id': token[api_settings.USER_ID_CLAIM],
+        'username': token['username'],
+        'is_staff': token['is_staff'],
+        'is_active': token['is_active'],
+    }
+    campos = [campo.attname for campo in User._meta.concrete_fields if campo.attname in valores]
+    user = User.from_db(router.db_for_read(User), campos, [valores[campo] for campo in campos])
+    user.membresias_token = (
+        set(token['grupos']), set(token['organizaciones_editor']), set(token['organizaciones_visitante'])
+    )
+    return user
+
+
+class JWTRolesAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        version = validated_token.get(CLAIM_VERSION)
+        if version is None or 'is_active' not in validated_token or not cache_compartido():
+            # Token emitido sin claims de roles, o la versión no se comparte entre procesos
+            return super().get_user(validated_token)
+
+        vigente = cache.get(_clave_version(validated_token[api_settings.USER_ID_CLAIM]))
+        if vigente is None:
+            return super().get_user(validated_token)
+        if vigente != version:
+            raise InvalidToken("Los permisos del usuario cambiaron, renueve el token.")
+
+        user = usuario_desde_token(validated_token)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("El usuario está inactivo.", code="user_inactive")
+        return user
@@ -21,6 +21,8 @@ router.register(r'testimonios-feedback', FeedbackTestimonioViewSet, basename='te
 
 urlpatterns=[
     path('', include(router.urls)),
+    # Widget externo: testimonios aprobados en formato compacto, identificados por la api_key
+    path('embed/<str:api_key>/', EmbedView.as_view(), name='embed'),
     path('auth/reset/password/', UserViewSet.as_view({'post': 'reset_password'}), name='password-reset'),
     path('auth/reset/password/confirm/', UserViewSet.as_view({'post': 'reset_password_confirm'}), name='password-reset-confirm'),
 ]
@@ -1,5 +1,8 @@
+from functools import lru_cache
 from urllib.parse import urlparse
 
+# 👇 Los mismos Referer/Origin llegan una y otra vez: el resultado se recuerda
+@lru_cache(maxsize=1024)
 def get_domain_from_url(url):
     """Extrae el dominio neto de una URL (sin protocolo, puerto ni path)."""
     try:
@@ -1,13 +1,15 @@
 from rest_framework import viewsets, status, generics
+from rest_framework.exceptions import NotFound
 from app.serializers import *
 from django.shortcuts import render, redirect
 from app.models import *
 # JWT
 from rest_framework.permissions import IsAuthenticated, AllowAny
 #DRF SPECTACULAR
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiResponse
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiExample, OpenApiResponse, OpenApiParameter
 from rest_framework.decorators import action
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework.response import Response
 from urllib.parse import urlparse 
 #OTP
@@ -15,13 +17,26 @@ from django.contrib.auth import logout as auth_logout
 from django.views import View
 from django.contrib import messages
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.auth.mixins import LoginRequiredMixin
 
 from djoser.views import UserViewSet
+from app.pagination import TestimonioCursorPagination, BusquedaPagination
+from app.busqueda import buscar_testimonios
+from app.filtros import TestimonioFilterBackend, ORDENAMIENTOS
+from app.cache import respuesta_feed, organizacion_por_api_key, organizacion_por_dominio
+from app.mixins import RelacionesSerializerMixin, PoliticaCacheMixin
+from app.cdn import PoliticaCache, etiqueta_organizacion
+from app.catalogo import categorias, categoria_por_id
+from app.roles import roles
+from app.subidas import parametros_subida
+from app.otp import esta_verificado, marcar_verificado, tiene_dispositivo, marcar_dispositivo, olvidar_estado
+from app.tokens import access_token_con_roles
+from app.snapshots import snapshots_publicos, url_snapshot
+from app.serializacion import ListadoRapidoMixin, SerializadorRapido
 def custom_logout(request):
     """Logout personalizado que limpia la sesión OTP"""
-    if request.session.get('otp_verified'):
-        del request.session['otp_verified']
+    olvidar_estado(request)
     auth_logout(request)
     return redirect('/admin/login/?next=/admin/')
 
@@ -30,12 +45,13 @@ class OTPVerificationView(LoginRequiredMixin, View):
     
     def get(self, request):
         # Si ya está verificado, redirigir al admin
-        if request.session.get('otp_verified'):
+        if esta_verificado(request):
             return redirect('admin:index')
         
-        # Verificar si el usuario tiene dispositivo OTP
-        if not user_has_device(request.user):
+        # Verificar si el usuario tiene dispositivo OTP (queda guardado en la sesión)
+        if not tiene_dispositivo(request):
             device = TOTPDevice.objects.create(user=request.user, name='default')
+            marcar_dispositivo(request)
             messages.info(request, 'Se ha creado un dispositivo de autenticación. Usa tu app de autenticación para generar el código.')
         
         return render(request, 'otp_verification.html')
@@ -43,7 +59,7 @@ class OTPVerificationView(LoginRequiredMixin, View):
     def post(self, request):
         # Verificar si es el botón "Saltar verificación" (solo para desarrollo)
         if 'skip_verification' in request.POST and settings.DEBUG:
-            request.session['otp_verified'] = True
+            marcar_verificado(request)
             messages.warning(request, 'Verificación OTP saltada (solo en modo desarrollo).')
             return redirect('admin:index')
         
@@ -58,7 +74,7 @@ class OTPVerificationView(LoginRequiredMixin, View):
         verified = any(device.verify_token(token) for device in devices)
         
         if verified:
-            request.session['otp_verified'] = True
+            marcar_verificado(request)
             messages.success(request, 'Verificación exitosa. Bienvenido al panel de administración.')
             return redirect('admin:index')
         else:
@@ -78,7 +94,9 @@ class TokenRefreshView(generics.GenericAPIView):
         if refresh:
             try:
                 token = RefreshToken(refresh)
-                access_token = token.access_token
+                # 👇 Roles y membresías se leen de nuevo: el token renovado trae los actuales
+                user = User.objects.get(**{api_settings.USER_ID_FIELD: token[api_settings.USER_ID_CLAIM]})
+                access_token = access_token_con_roles(token, user)
                 return Response({'access': str(access_token)}, status=status.HTTP_200_OK)
             except Exception as e:
                 return Response({'error': 'Token inválido'}, status=status.HTTP_400_BAD_REQUEST)
@@ -98,25 +116,14 @@ class LoginView(generics.GenericAPIView):
         # Generar tokens
         refresh = RefreshToken.for_user(user)
         
-        # Determinar el rol/grupo del usuario
-        user_role = None
-        
-        # Verificar si es administrador (is_staff=True)
-        if user.is_staff:
-            user_role = "administrador"
-        else:
-            # Verificar grupos del usuario
-            groups = user.groups.all()
-            if groups.exists():
-                # Tomar el primer grupo (asumiendo que un usuario solo pertenece a un grupo)
-                user_role = groups.first().name
-            else:
-                user_role = "sin_grupo"
+        # 👇 El access token lleva el rol y las organizaciones del usuario (ver tokens.py):
+        # las peticiones autenticadas no vuelven a leerlos de la base
+        access = access_token_con_roles(refresh, user)
         
         return Response({
             'user_id': user.id,  # 👈 Agregar el ID del usuario
-            'rol': user_role, 
-            'access': str(refresh.access_token),
+            'rol': access['rol'], 
+            'access': str(access),
         }, status=status.HTTP_200_OK)
     
 @extend_schema_view(
@@ -132,7 +139,7 @@ class LoginView(generics.GenericAPIView):
     partial_update=extend_schema(tags=['Visitantes']),
     destroy=extend_schema(tags=['Visitantes']),
 )
-class UsuarioVisitanteViewSet(viewsets.ModelViewSet):
+class UsuarioVisitanteViewSet(RelacionesSerializerMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UsuarioVisitanteSerializer
 
@@ -146,16 +153,16 @@ class UsuarioVisitanteViewSet(viewsets.ModelViewSet):
                 return User.objects.filter(groups__name='visitante', is_staff=False)
             
             # 👇 EDITORES pueden ver TODOS los visitantes SOLO si pertenecen a alguna organización
-            elif user.is_authenticated and user.groups.filter(name='editor').exists():
+            elif user.is_authenticated and roles(self.request).es_editor:
                 # Verificar si el editor pertenece a AL MENOS una organización
-                if Organizacion.objects.filter(editores=user).exists():
+                if roles(self.request).organizaciones_editor:
                     return User.objects.filter(groups__name='visitante', is_staff=False)
                 else:
                     # Si el editor no pertenece a ninguna organización, no puede ver la lista
                     return User.objects.none()
             
             # 👇 USUARIOS VISITANTES pueden ver SOLO sus propios datos
-            elif user.is_authenticated and user.groups.filter(name='visitante').exists():
+            elif user.is_authenticated and roles(self.request).es_visitante:
                 return User.objects.filter(id=user.id)
             
             # 👇 USUARIOS NO AUTENTICADOS o sin permisos no pueden ver nada
@@ -183,8 +190,8 @@ class UsuarioVisitanteViewSet(viewsets.ModelViewSet):
         user = request.user
 
         # Verificar específicamente para editores sin organizaciones
-        if (user.is_authenticated and user.groups.filter(name='editor').exists() and 
-            not Organizacion.objects.filter(editores=user).exists()):
+        if (user.is_authenticated and roles(request).es_editor and 
+            not roles(request).organizaciones_editor):
             return Response(
                 {
                     "detail": "No tienes permisos para ver la lista de visitantes. Debes pertenecer al menos a una organización como editor."
@@ -193,8 +200,8 @@ class UsuarioVisitanteViewSet(viewsets.ModelViewSet):
             )
         
         # Verificar permisos específicos para list
-        if not (user.is_staff or user.groups.filter(name='editor').exists() or 
-                (user.is_authenticated and user.groups.filter(name='visitante').exists())):
+        if not (user.is_staff or roles(request).es_editor or 
+                (user.is_authenticated and roles(request).es_visitante)):
             return Response(
                 {"detail": "No tienes permisos para acceder a este apartado"},
                 status=status.HTTP_403_FORBIDDEN
@@ -207,8 +214,8 @@ class UsuarioVisitanteViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         
         # Verificar permisos específicos para retrieve
-        if not (user.is_staff or user.groups.filter(name='editor').exists() or 
-                (user.is_authenticated and user.id == instance.id and user.groups.filter(name='visitante').exists())):
+        if not (user.is_staff or roles(request).es_editor or 
+                (user.is_authenticated and user.id == instance.id and roles(request).es_visitante)):
             return Response(
                 {"detail": "No tienes permisos para acceder a este apartado"},
                 status=status.HTTP_403_FORBIDDEN
@@ -227,8 +234,10 @@ class UsuarioVisitanteViewSet(viewsets.ModelViewSet):
                 parsed_origin = urlparse(origin)
                 origin_domain = f"{parsed_origin.scheme}://{parsed_origin.netloc}".lower()
 
-                # Busca la organización por el dominio exacto
-                organizacion_asociar = Organizacion.objects.get(dominio__iexact=origin_domain)
+                # Busca la organización por el dominio exacto (sin importar mayúsculas, desde el cache)
+                organizacion_asociar = organizacion_por_dominio(origin_domain)
+                if organizacion_asociar is None:
+                    raise Organizacion.DoesNotExist
                 # logger.debug(f"Coincidencia de dominio encontrada: {origin_domain} -> {organizacion_asociar.organizacion_nombre}")
             except Organizacion.DoesNotExist:
                 # 🔴 DOMINIO NO COINCIDE: NO CREAR USUARIO
@@ -323,7 +332,7 @@ class UsuarioVisitanteViewSet(viewsets.ModelViewSet):
                 )
             
             # 👇 USUARIOS NO STAFF deben pertenecer al grupo "visitante"
-            if not request.user.groups.filter(name='visitante').exists():
+            if not roles(request).es_visitante:
                 return Response(
                     {"detail": "Solo los usuarios del grupo 'visitante' pueden modificar su información."},
                     status=status.HTTP_403_FORBIDDEN
@@ -354,7 +363,7 @@ class UsuarioVisitanteViewSet(viewsets.ModelViewSet):
             )
         
         # Verificar que el usuario pertenezca al grupo "visitante"
-        if not request.user.groups.filter(name='visitante').exists():
+        if not roles(request).es_visitante:
             return Response(
                 {"detail": "Solo los usuarios del grupo 'visitante' pueden eliminar su cuenta."},
                 status=status.HTTP_403_FORBIDDEN
@@ -370,7 +379,7 @@ class UsuarioVisitanteViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(tags=['Editores']),
     destroy=extend_schema(tags=['Editores']),
 )
-class EditorViewSet(viewsets.ModelViewSet):
+class EditorViewSet(RelacionesSerializerMixin, viewsets.ModelViewSet):
     serializer_class = EditorSerializer
     http_method_names = ['get', 'head', 'options', 'patch', 'delete']  # 👈 Elimina POST
     
@@ -379,7 +388,7 @@ class EditorViewSet(viewsets.ModelViewSet):
         
         # 1. Verificar si el usuario es STAFF (Admin) O si pertenece al grupo 'editor'.
         # Nota: La verificación is_authenticated ya está implícita si el grupo existe.
-        if user.is_staff or user.groups.filter(name='editor').exists():
+        if user.is_staff or roles(self.request).es_editor:
             
             # 👇 Devolver TODOS los usuarios que pertenecen al grupo 'editor'
             # Excluimos a los que son staff (administradores) si solo quieres los editores puros.
@@ -403,7 +412,7 @@ class EditorViewSet(viewsets.ModelViewSet):
         user = request.user
         
         # Verificar permisos específicos para list
-        if not (user.is_staff or user.groups.filter(name='editor').exists()):
+        if not (user.is_staff or roles(request).es_editor):
             return Response(
                 {"detail": "No tienes permisos para acceder a este apartado"},
                 status=status.HTTP_403_FORBIDDEN
@@ -416,7 +425,7 @@ class EditorViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         
         # Verificar permisos específicos para retrieve
-        if not (user.is_staff or (user.is_authenticated and user.id == instance.id and user.groups.filter(name='editor').exists())):
+        if not (user.is_staff or (user.is_authenticated and user.id == instance.id and roles(request).es_editor)):
             return Response(
                 {"detail": "No tienes permisos para acceder a este apartado"},
                 status=status.HTTP_403_FORBIDDEN
@@ -453,7 +462,7 @@ class EditorViewSet(viewsets.ModelViewSet):
                 )
             
             # 👇 EDITOR debe pertenecer al grupo "editor"
-            if not request.user.groups.filter(name='editor').exists():
+            if not roles(request).es_editor:
                 return Response(
                     {"detail": "Solo las compañías del grupo 'editor' pueden modificar su información."},
                     status=status.HTTP_403_FORBIDDEN
@@ -475,7 +484,7 @@ class EditorViewSet(viewsets.ModelViewSet):
                 )
             
             # 👇 EDITOR debe pertenecer al grupo "editor"
-            if not request.user.groups.filter(name='editor').exists():
+            if not roles(request).es_editor:
                 return Response(
                     {"detail": "Solo las compañías del grupo 'editor' pueden eliminar su cuenta."},
                     status=status.HTTP_403_FORBIDDEN
@@ -497,7 +506,7 @@ class EditorViewSet(viewsets.ModelViewSet):
     destroy=extend_schema(tags=['Administradores'],
         description="Eliminar administrador. SOLO un administrador puede eliminar su propia cuenta."),
 )
-class AdminUserViewSet(viewsets.ModelViewSet):
+class AdminUserViewSet(RelacionesSerializerMixin, viewsets.ModelViewSet):
     """
     ViewSet para crear y gestionar Usuarios Admins.
     - Crear: Solo administradores pueden crear otros administradores
@@ -528,8 +537,10 @@ class AdminUserViewSet(viewsets.ModelViewSet):
                 parsed_origin = urlparse(origin)
                 origin_domain = f"{parsed_origin.scheme}://{parsed_origin.netloc}".lower()
 
-                # Busca la organización por el dominio exacto
-                organizacion_asociar = Organizacion.objects.get(dominio__iexact=origin_domain)
+                # Busca la organización por el dominio exacto (sin importar mayúsculas, desde el cache)
+                organizacion_asociar = organizacion_por_dominio(origin_domain)
+                if organizacion_asociar is None:
+                    raise Organizacion.DoesNotExist
                 # logger.debug(f"Coincidencia de dominio encontrada: {origin_domain} -> {organizacion_asociar.organizacion_nombre}")
             except Organizacion.DoesNotExist:
                 # 🔴 DOMINIO NO COINCIDE: NO CREAR USUARIO
@@ -659,8 +670,16 @@ class AdminUserViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(tags=['Organizaciones']),
     destroy=extend_schema(tags=['Organizaciones']),
 )
-class OrganizacionViewSet(viewsets.ModelViewSet):
+class OrganizacionViewSet(PoliticaCacheMixin, RelacionesSerializerMixin, viewsets.ModelViewSet):
     serializer_class = OrganizacionSerializer
+    # 👇 Los aprobados se cachean en la CDN pocos segundos y se revalidan con el ETag (ver cdn.py)
+    politicas_cache = {
+        'testimonios_aprobados': PoliticaCache(
+            s_maxage=settings.TESTIMONIOS_CDN_S_MAXAGE,
+            stale_while_revalidate=settings.TESTIMONIOS_CDN_STALE_WHILE_REVALIDATE,
+            etiquetas=('organizacion-{pk}',),
+        ),
+    }
 
     def get_queryset(self):
         user = self.request.user
@@ -670,11 +689,11 @@ class OrganizacionViewSet(viewsets.ModelViewSet):
             return Organizacion.objects.all()
         
         # Editores ven SOLO las organizaciones donde son editores
-        elif user.groups.filter(name='editor').exists():
+        elif roles(self.request).es_editor:
             return Organizacion.objects.filter(editores=user)
         
         # Visitantes autenticados ven SOLO las organizaciones donde son visitantes
-        elif user.is_authenticated and user.groups.filter(name='visitante').exists():
+        elif user.is_authenticated and roles(self.request).es_visitante:
             return Organizacion.objects.filter(visitantes=user)
         
         # Usuarios no autenticados ven TODAS las organizaciones (solo info pública)
@@ -697,11 +716,11 @@ class OrganizacionViewSet(viewsets.ModelViewSet):
             return OrganizacionSerializerStaff
         
         # 👇 EDITORES ven editores y visitantes de SUS organizaciones
-        elif user.groups.filter(name='editor').exists():
+        elif roles(self.request).es_editor:
             return OrganizacionSerializerEditor
         
         # 👇 VISITANTES ven solo información básica
-        elif user.is_authenticated and user.groups.filter(name='visitante').exists():
+        elif user.is_authenticated and roles(self.request).es_visitante:
             return OrganizacionSerializerPublico
         
         # 👇 USUARIOS NO AUTENTICADOS ven solo información básica
@@ -741,7 +760,7 @@ class OrganizacionViewSet(viewsets.ModelViewSet):
         user = request.user
         
         # Verificar permisos: staff o editor de la organización
-        if not (user.is_staff or organizacion.editores.filter(id=user.id).exists()):
+        if not (user.is_staff or roles(request).edita(organizacion)):
             return Response(
                 {"detail": "No tienes permisos para modificar esta organización."},
                 status=status.HTTP_403_FORBIDDEN
@@ -778,14 +797,14 @@ class OrganizacionViewSet(viewsets.ModelViewSet):
         user = request.user
         
         # Verificar permisos: el usuario debe ser editor de esta organización
-        if not (user.is_staff or organizacion.editores.filter(id=user.id).exists()):
+        if not (user.is_staff or roles(request).edita(organizacion)):
             return Response(
                 {"detail": "No tienes permisos para modificar esta organización. Solo los editores de la organización pueden agregar otros editores."},
                 status=status.HTTP_403_FORBIDDEN
             )
         
         # Validar que el usuario sea editor (no staff intentando usar este endpoint)
-        if not user.groups.filter(name='editor').exists() and not user.is_staff:
+        if not roles(request).es_editor and not user.is_staff:
             return Response(
                 {"detail": "Solo los editores pueden usar este endpoint."},
                 status=status.HTTP_403_FORBIDDEN
@@ -844,14 +863,14 @@ class OrganizacionViewSet(viewsets.ModelViewSet):
         user = request.user
         
         # Verificar permisos: el usuario debe ser editor de esta organización
-        if not (user.is_staff or organizacion.editores.filter(id=user.id).exists()):
+        if not (user.is_staff or roles(request).edita(organizacion)):
             return Response(
                 {"detail": "No tienes permisos para modificar esta organización. Solo los editores de la organización pueden agregar visitantes."},
                 status=status.HTTP_403_FORBIDDEN
             )
         
         # Validar que el usuario sea editor (no staff intentando usar este endpoint)
-        if not user.groups.filter(name='editor').exists() and not user.is_staff:
+        if not roles(request).es_editor and not user.is_staff:
             return Response(
                 {"detail": "Solo los editores pueden usar este endpoint."},
                 status=status.HTTP_403_FORBIDDEN
@@ -895,43 +914,88 @@ class OrganizacionViewSet(viewsets.ModelViewSet):
     # Testimonios aprobados de una organización específica
     @extend_schema(
         tags=['Organizaciones'],
-        description="Obtener todos los testimonios APROBADOS de una organización específica(Obviamente todos los que la organizacion aprobo que son los que quiere mostrar al publico). Este endpoint es público.",
+        description="Obtener los testimonios APROBADOS de una organización específica(Obviamente todos los que la organizacion aprobo que son los que quiere mostrar al publico). Este endpoint es público. La lista esta paginada por cursor: el campo 'next' trae la URL de la siguiente pagina y 'page_size' define el tamaño (con un maximo configurado). 'total_testimonios' y 'promedio_ranking' siempre corresponden a TODOS los aprobados, no solo a la pagina ni a los filtros. 'organizacion.snapshot' es la URL del JSON estatico con los aprobados, que se regenera cada vez que cambian y se puede leer sin pasar por la API (solo aparece si el storage de snapshots se sirve publicamente).",
+        parameters=[
+            OpenApiParameter('cursor', str, description='Cursor opaco devuelto en el campo "next" de la página anterior.'),
+            OpenApiParameter('page_size', int, description='Cantidad de resultados por página (tiene un máximo configurado).'),
+            OpenApiParameter('categoria', str, description='Ids de categoría separados por coma.'),
+            OpenApiParameter('ranking_min', float, description='Ranking mínimo (0 a 5).'),
+            OpenApiParameter('ranking_max', float, description='Ranking máximo (0 a 5).'),
+            OpenApiParameter('desde', str, description='Fecha mínima del comentario (YYYY-MM-DD, inclusive).'),
+            OpenApiParameter('hasta', str, description='Fecha máxima del comentario (YYYY-MM-DD, inclusive).'),
+            OpenApiParameter('con_media', bool, description='true: solo testimonios con archivos; false: solo sin archivos.'),
+            OpenApiParameter('orden', str, enum=list(ORDENAMIENTOS), description='Orden de los resultados (por defecto recientes).'),
+        ],
         responses={200: TestimonioAprobadoSerializer(many=True)}
     )
     @action(detail=True, methods=['get'], url_path='testimonios-aprobados', permission_classes=[AllowAny])
     def testimonios_aprobados(self, request, pk=None):
         """
-        Endpoint público para obtener todos los testimonios APROBADOS de una organización específica
+        Endpoint público para obtener los testimonios APROBADOS de una organización específica
         """
-        organizacion = self.get_object()
+        # 👇 Primero se resuelve la organización: el cache se indexa por su id, no por el pk tal cual vino
+        # en la URL (un pk que no existe o '05' no crean claves propias).
+        # Sin self.get_object(): su filter_queryset arma el OrganizacionSerializer y validaría
+        # ?fields= / ?omit= contra los campos de la organización en lugar de los del testimonio
+        organizacion = generics.get_object_or_404(Organizacion.objects.all(), pk=pk)
+        self.organizacion_id = organizacion.id
+        # 👇 Cacheado por organización + parámetros; se invalida al cambiar cualquier testimonio de la organización.
+        # Responde 304 si el cliente ya tiene la versión actual (ETag / Last-Modified)
+        return respuesta_feed(
+            request, 'aprobados', lambda: self._feed_aprobados(request, organizacion), organizacion_id=organizacion.id
+        )
+
+    def get_etiquetas_cache(self, politica):
+        # Con el id de la organización resuelta, no con el pk de la URL
+        return [etiqueta.format(pk=self.organizacion_id) for etiqueta in politica.etiquetas]
+
+    def _feed_aprobados(self, request, organizacion):
+        """Construye la respuesta de testimonios aprobados (se ejecuta solo cuando no está en cache)"""
         
         # Obtener solo testimonios aprobados de esta organización
         testimonios_aprobados = Testimonios.objects.filter(
             organizacion=organizacion,
             estado='A'  # Solo testimonios aprobados
-        ).order_by('-fecha_comentario')  # Ordenar por fecha descendente
-        
-        # Serializar los testimonios
-        serializer = TestimonioAprobadoSerializer(testimonios_aprobados, many=True, context={'request': request})
+        )
+        # Mismos filtros y orden que el listado público (?categoria, ?orden, ...)
+        testimonios_aprobados = TestimonioFilterBackend().filter_queryset(request, testimonios_aprobados, self)
+
+        # 👇 Total y promedio salen del resumen precalculado de la organización (sin agregar la tabla)
+        total_testimonios, promedio_ranking = self._resumen_aprobados(organizacion)
+
+        # Paginar por cursor en el orden pedido (por defecto fecha_comentario, id descendente)
+        paginator = TestimonioCursorPagination()
+        contexto = {'request': request}
+
+        # Serializar solo los testimonios de la página
+        if settings.TESTIMONIOS_SERIALIZACION_RAPIDA:
+            # 👇 Filas de values() serializadas sin pasar por los campos de DRF (mismo JSON)
+            rapido = SerializadorRapido(TestimonioAprobadoSerializer, contexto)
+            pagina = paginator.paginate_queryset(rapido.filas(testimonios_aprobados), request, view=self)
+            testimonios = rapido.serializar(pagina)
+        else:
+            pagina = paginator.paginate_queryset(testimonios_aprobados, request, view=self)
+            testimonios = TestimonioAprobadoSerializer(pagina, many=True, context=contexto).data
         
         # Retornar respuesta con información adicional de la organización
-        return Response({
-            'organizacion': {
-                'nombre': organizacion.organizacion_nombre,
-            },
-            'testimonios_aprobados': serializer.data,
-            'total_testimonios': testimonios_aprobados.count(),
-            'promedio_ranking': self._calcular_promedio_ranking(testimonios_aprobados)
-        })
+        datos_organizacion = {'nombre': organizacion.organizacion_nombre}
+        # 👇 El widget puede leer directo este JSON estático (storage/CDN) sin pasar por la API,
+        # solo si el storage se sirve públicamente (el disco local sin DEBUG no)
+        if snapshots_publicos():
+            datos_organizacion['snapshot'] = url_snapshot(organizacion.id)
+
+        return {
+            'organizacion': datos_organizacion,
+            'testimonios_aprobados': testimonios,
+            'total_testimonios': total_testimonios,
+            'promedio_ranking': promedio_ranking,
+            'next': paginator.get_next_link(),
+        }
 
-    def _calcular_promedio_ranking(self, testimonios):
-        """Calcular el promedio de ranking de los testimonios"""
-        if not testimonios:
-            return 0.0
-        
-        from django.db.models import Avg
-        promedio = testimonios.aggregate(Avg('ranking'))['ranking__avg']
-        return round(promedio, 1) if promedio else 0.0
+    def _resumen_aprobados(self, organizacion):
+        """Total y promedio de ranking de los aprobados, leídos del resumen de la organización"""
+        resumen, _ = ResumenOrganizacion.objects.get_or_create(organizacion=organizacion)
+        return resumen.cantidad_aprobados, resumen.promedio_ranking
 
 @extend_schema_view(
     list=extend_schema(tags=['Categorias']),
@@ -942,13 +1006,31 @@ class OrganizacionViewSet(viewsets.ModelViewSet):
     partial_update=extend_schema(tags=['Categorias']),
     destroy=extend_schema(tags=['Categorias']),
 )
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(PoliticaCacheMixin, RelacionesSerializerMixin, viewsets.ModelViewSet):
     serializer_class = CategoriaSerializer
+    # 👇 El catálogo de categorías casi no cambia: puede quedar más tiempo en la CDN y en el navegador
+    politicas_cache = dict.fromkeys(['list', 'retrieve'], PoliticaCache(
+        max_age=60,
+        s_maxage=settings.TESTIMONIOS_CDN_CATALOGO_S_MAXAGE,
+        stale_while_revalidate=settings.TESTIMONIOS_CDN_STALE_WHILE_REVALIDATE,
+        etiquetas=('categorias',),
+    ))
     
     def get_queryset(self):
         # Todos pueden ver las categorías (autenticados y no autenticados)
         return Categoria.objects.all()
 
+    # 👇 Las lecturas salen del catálogo en memoria del proceso (catalogo.py), sin consultar la base
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(list(categorias().values()), many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        categoria = categoria_por_id(kwargs[self.lookup_field])
+        if categoria is None:
+            raise NotFound()
+        return Response(self.get_serializer(categoria).data)
+
     def get_permissions(self):
         # Permitir list y retrieve sin autenticación (público)
         if self.action in ['list', 'retrieve']:
@@ -996,7 +1078,7 @@ class CategoriaViewSet(viewsets.ModelViewSet):
 
 @extend_schema_view(
     list=extend_schema(tags=['Testimonios'],
-        description="Este metodo GET permite listar todas los Testimonios APROBADOS de TODAS las EMPRESAS y es LIBRE, todos los usuarios logeados y no logeados pueden visualizarlo"),
+        description="Este metodo GET permite listar todas los Testimonios APROBADOS de TODAS las EMPRESAS y es LIBRE, todos los usuarios logeados y no logeados pueden visualizarlo. La respuesta esta paginada por cursor: usar el campo 'next' para pedir la siguiente pagina y 'page_size' para el tamaño (con un maximo configurado)"),
     retrieve=extend_schema(tags=['Testimonios'],
         description="Este metodo GET permite listar Testimonios especificos que han sido APROBADOS de CUALQUIER EMPRESA y es LIBRE, todos los usuarios logeados y no logeados pueden visualizarlo"),
     create=extend_schema(tags=['Testimonios'],
@@ -1007,12 +1089,22 @@ class CategoriaViewSet(viewsets.ModelViewSet):
     destroy=extend_schema(tags=['Testimonios'],
         description="Este metodo DELETE permite eliminar Testimonios, sin importar el estado que tenga, solamente lo puede borrar El usuario es el dueño del testimonio (usuario_registrado) O El usuario que esta asociado a la organización"))
 
-class TestimonioViewSet(viewsets.ModelViewSet):
+class TestimonioViewSet(PoliticaCacheMixin, RelacionesSerializerMixin, ListadoRapidoMixin, viewsets.ModelViewSet):
     serializer_class = TestimonioSerializer
+    # 👇 GET anónimos cacheables en la CDN (ver cdn.py); los autenticados y las escrituras nunca
+    politicas_cache = dict.fromkeys(['list', 'retrieve'], PoliticaCache(
+        s_maxage=settings.TESTIMONIOS_CDN_S_MAXAGE,
+        stale_while_revalidate=settings.TESTIMONIOS_CDN_STALE_WHILE_REVALIDATE,
+        etiquetas=('testimonios',),
+    ))
+    # 👇 El listado público se pagina por cursor (fecha_comentario, id) para no escanear toda la tabla
+    pagination_class = TestimonioCursorPagination
+    # 👇 ?categoria, ?ranking_min, ?orden, ... (ver filtros.py); el cursor respeta el orden pedido
+    filter_backends = [TestimonioFilterBackend]
 
     def get_permissions(self):
-        # Permitir crear testimonios sin autenticación
-        if self.action in ['create', 'list', 'retrieve']:
+        # Permitir crear testimonios (y pedir la firma para subir sus archivos) sin autenticación
+        if self.action in ['create', 'list', 'retrieve', 'firma_subida']:
             return [AllowAny()]
         
         # Para update y delete requiere autenticación
@@ -1027,10 +1119,14 @@ class TestimonioViewSet(viewsets.ModelViewSet):
         # pero con las verificaciones de permisos en los métodos correspondientes
         return Testimonios.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        # 👇 El listado público se sirve desde cache (o 304); la versión global cambia con cualquier testimonio
+        return respuesta_feed(request, 'publico', lambda: super(TestimonioViewSet, self).list(request, *args, **kwargs).data)
+
     def create(self, request, *args, **kwargs):
         # Verificar que si el usuario está autenticado, NO sea editor
         if request.user.is_authenticated:
-            if request.user.groups.filter(name='editor').exists():
+            if roles(request).es_editor:
                 return Response(
                     {
                         "detail": "Los usuarios del grupo 'editor' no pueden crear testimonios."
@@ -1040,6 +1136,20 @@ class TestimonioViewSet(viewsets.ModelViewSet):
         
         return super().create(request, *args, **kwargs)
 
+    @extend_schema(tags=['Testimonios'],
+        description="Este metodo POST devuelve los parametros firmados para que el cliente suba los archivos del testimonio directo al almacen (Cloudinary), sin pasarlos por el servidor. Requiere la api_key de la organizacion. Las referencias que devuelve el almacen se envian luego en 'archivos_subidos' al crear el testimonio; la firma vence a los pocos minutos")
+    @action(detail=False, methods=['post'], url_path='firma-subida')
+    def firma_subida(self, request):
+        api_key = request.data.get('api_key')
+        if not api_key or not isinstance(api_key, str):
+            return Response({"api_key": "La API key es requerida."}, status=status.HTTP_400_BAD_REQUEST)
+
+        organizacion = organizacion_por_api_key(api_key)
+        if organizacion is None:
+            return Response({"api_key": "La API key no es válida."}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response(parametros_subida(organizacion.pk))
+
     def update(self, request, *args, **kwargs):
         if not kwargs.get('partial', False):
             return Response(
@@ -1087,7 +1197,7 @@ class TestimonioViewSet(viewsets.ModelViewSet):
         puede_eliminar = (
             request.user.is_staff or 
             (testimonio.usuario_registrado and testimonio.usuario_registrado == request.user) or
-            (request.user.groups.filter(name='editor').exists())
+            (roles(request).es_editor)
         )
         
         if not puede_eliminar:
@@ -1108,7 +1218,7 @@ class TestimonioViewSet(viewsets.ModelViewSet):
         - Para EDITORES: Muestra testimonios específicos de SUS organizaciones(menos los que tienen el estado en borrador)
         - Para VISITANTES: Muestra testimonios específicos que HAN CREADO"""),
 )
-class TestimonioOrganizacionViewSet(viewsets.ReadOnlyModelViewSet):
+class TestimonioOrganizacionViewSet(RelacionesSerializerMixin, ListadoRapidoMixin, viewsets.ReadOnlyModelViewSet):
     """
     Endpoint con doble funcionalidad:
     - Editores: ven testimonios de sus organizaciones
@@ -1116,6 +1226,8 @@ class TestimonioOrganizacionViewSet(viewsets.ReadOnlyModelViewSet):
     """
     serializer_class = TestimonioSerializer
     permission_classes = [IsAuthenticated]  # 👈 Solo usuarios autenticados
+    filter_backends = [TestimonioFilterBackend]
+    filtro_estado = True  # 👈 Editores y visitantes pueden filtrar por estado (?estado=E,R)
 
     def get_queryset(self):
         user = self.request.user
@@ -1126,13 +1238,13 @@ class TestimonioOrganizacionViewSet(viewsets.ReadOnlyModelViewSet):
         
         # Editor ve SOLO los testimonios de SUS organizaciones, 
         # PERO EXCLUYENDO el estado 'B' (Borrador).
-        if user.groups.filter(name='editor').exists():
+        if roles(self.request).es_editor:
             return Testimonios.objects.filter(
                 organizacion__editores=user
             ).exclude(estado='B')
         
         # Visitante ve SOLO SUS testimonios (en cualquier estado)
-        if user.groups.filter(name='visitante').exists():
+        if roles(self.request).es_visitante:
             return Testimonios.objects.filter(
                 usuario_registrado=user
             )
@@ -1144,8 +1256,8 @@ class TestimonioOrganizacionViewSet(viewsets.ReadOnlyModelViewSet):
         # Verificar permisos antes de listar
         user = request.user
         if not (user.is_staff or 
-                user.groups.filter(name='editor').exists() or 
-                user.groups.filter(name='visitante').exists()):
+                roles(request).es_editor or 
+                roles(request).es_visitante):
             return Response(
                 {"detail": "Los usuarios anonimos no tienen permisos para usar este endpoint. Por favor creese una cuenta e inicie sesion para usar este endpoint"},
                 status=status.HTTP_403_FORBIDDEN
@@ -1156,8 +1268,8 @@ class TestimonioOrganizacionViewSet(viewsets.ReadOnlyModelViewSet):
         # Verificar permisos antes de recuperar un testimonio específico
         user = request.user
         if not (user.is_staff or 
-                user.groups.filter(name='editor').exists() or 
-                user.groups.filter(name='visitante').exists()):
+                roles(request).es_editor or 
+                roles(request).es_visitante):
             return Response(
                 {"detail": "Usted no tiene permisos para usar este endpoint. Debe ser editor o visitante."},
                 status=status.HTTP_403_FORBIDDEN
@@ -1165,7 +1277,7 @@ class TestimonioOrganizacionViewSet(viewsets.ReadOnlyModelViewSet):
         
         # Verificar que el usuario tenga acceso al testimonio específico
         testimonio = self.get_object()
-        if user.groups.filter(name='visitante').exists() and testimonio.usuario_registrado != user:
+        if roles(request).es_visitante and testimonio.usuario_registrado != user:
             return Response(
                 {"detail": "No tienes permisos para ver este testimonio. Solo puedes ver tus propios testimonios."},
                 status=status.HTTP_403_FORBIDDEN
@@ -1174,6 +1286,42 @@ class TestimonioOrganizacionViewSet(viewsets.ReadOnlyModelViewSet):
         
         return super().retrieve(request, *args, **kwargs)
 
+    @extend_schema(
+        tags=['Testimonios'],
+        description="Busqueda de texto completo sobre el comentario y el nombre del autor, dentro de los mismos testimonios que puede ver el usuario (editores: los de sus organizaciones, visitantes: los propios). Los resultados vienen ordenados por relevancia y paginados por numero de pagina ('page' y 'page_size'). Acepta la sintaxis de un buscador: \"frase exacta\", -excluir, or.",
+        parameters=[
+            OpenApiParameter('q', str, required=True, description='Texto a buscar'),
+            OpenApiParameter('page', int, description='Número de página.'),
+            OpenApiParameter('page_size', int, description='Cantidad de resultados por página (tiene un máximo configurado).'),
+        ],
+        responses={200: TestimonioSerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'], url_path='buscar')
+    def buscar(self, request):
+        user = request.user
+        if not (user.is_staff or 
+                roles(request).es_editor or 
+                roles(request).es_visitante):
+            return Response(
+                {"detail": "Usted no tiene permisos para usar este endpoint. Debe ser editor o visitante."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        texto = request.query_params.get('q', '').strip()
+        if not texto:
+            return Response(
+                {"detail": "Debe indicar el texto a buscar en el parámetro 'q'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # 👇 Se busca dentro del queryset del rol, asi nadie encuentra testimonios que no puede ver
+        testimonios = buscar_testimonios(self.filter_queryset(self.get_queryset()), texto)
+
+        paginator = BusquedaPagination()
+        pagina = paginator.paginate_queryset(testimonios, request, view=self)
+        serializer = self.get_serializer(pagina, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @extend_schema(
         tags=['Testimonios'],
         description="Estadisticas de testimonios. Solamente puede ser usado por las mismas organizaciones."
@@ -1182,32 +1330,37 @@ class TestimonioOrganizacionViewSet(viewsets.ReadOnlyModelViewSet):
     def estadisticas(self, request):
         user = request.user
         
-        if not user.groups.filter(name='editor').exists() and not user.is_staff:
+        if not roles(request).es_editor and not user.is_staff:
             return Response(
                 {"detail": "Usted no es un editor, no puede visualizar las estadísticas."},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Estadísticas por organización
+        # Estadísticas por organización, leídas del resumen precalculado (sin COUNT sobre testimonios)
         if user.is_staff:
             # Admin ve estadísticas de todas las organizaciones
-            organizaciones_stats = Organizacion.objects.annotate(
-                total_testimonios=models.Count('organizacion'),
-                aprobados=models.Count('organizacion', filter=models.Q(organizacion__estado='A')),
-                en_espera=models.Count('organizacion', filter=models.Q(organizacion__estado='E')),
-                rechazados=models.Count('organizacion', filter=models.Q(organizacion__estado='R'))
-            )
+            organizaciones_stats = Organizacion.objects.all()
+        else:
+            # Editor ve las estadísticas de SUS organizaciones
+            organizaciones_stats = Organizacion.objects.filter(editores=user)
+        organizaciones_stats = organizaciones_stats.select_related('resumen')
         
         data = []
         for org in organizaciones_stats:
+            try:
+                resumen = org.resumen
+            except ResumenOrganizacion.DoesNotExist:
+                resumen = ResumenOrganizacion.reconstruir(org.id)
             data.append({
                 'organizacion_id': org.id,
                 'organizacion_nombre': org.organizacion_nombre,
                 'estadisticas': {
-                    'total_testimonios': org.total_testimonios,
-                    'aprobados': org.aprobados,
-                    'en_espera': org.en_espera,
-                    'rechazados': org.rechazados
+                    'total_testimonios': resumen.total_testimonios,
+                    'aprobados': resumen.cantidad_aprobados,
+                    'en_espera': resumen.cantidad_espera,
+                    'rechazados': resumen.cantidad_rechazados,
+                    'promedio_ranking': resumen.promedio_ranking,
+                    'estrellas': resumen.estrellas,
                 }
             })
         
@@ -1219,7 +1372,7 @@ class TestimonioOrganizacionViewSet(viewsets.ReadOnlyModelViewSet):
         description="Este endpoint permite que el dueño de la organización cambie el estado de los testimonios de SU organización (A: Aprobado, E: Espera, R: Rechazado). Los editores o administradores no pueden cambiar estados de testimonios a borrador, solamente el usuario visitante que creo el testimonio puede cambiar testimonios a Borrador. El autor del testimonio no puede cambiar un estado Aprobado a otro estado... Solamente se puede agregar feedback a los estados rechazados, si cambio a cualquier otro estado no puedo agregar el feedback... y ningun estado rechazado puede cambiar su feedback, si tengo un estado rechazado y le cambio el estado automaticamente se borra el campo feedback y queda null"
     )
 )
-class CambiarEstadoTestimonioViewSet(viewsets.ModelViewSet):
+class CambiarEstadoTestimonioViewSet(RelacionesSerializerMixin, viewsets.ModelViewSet):
     """
     Endpoint para que los dueños de organizaciones cambien el estado de los testimonios de SUS organizaciones
     """
@@ -1232,7 +1385,7 @@ class CambiarEstadoTestimonioViewSet(viewsets.ModelViewSet):
         
         # 👇 CAMBIO IMPORTANTE: Admin y Editores pueden VER todos los testimonios
         # La verificación real de permisos se hace en partial_update
-        if user.is_staff or user.groups.filter(name='editor').exists():
+        if user.is_staff or roles(self.request).es_editor:
             return Testimonios.objects.all()
         
         # 👇 Para usuarios visitantes, también devolver todos los testimonios
@@ -1249,7 +1402,7 @@ class CambiarEstadoTestimonioViewSet(viewsets.ModelViewSet):
         
         # 1. Verificar permisos (Se mantiene tu lógica de permisos)
         es_admin = user.is_staff
-        es_editor = user.groups.filter(name='editor').exists()
+        es_editor = roles(request).es_editor
         es_autor = (testimonio.usuario_registrado and testimonio.usuario_registrado == user)
         es_editor_con_permisos = False
         
@@ -1268,8 +1421,7 @@ class CambiarEstadoTestimonioViewSet(viewsets.ModelViewSet):
             
         # Lógica de permisos de Editor/Admin
         elif es_editor:
-            organizacion_del_testimonio = testimonio.organizacion
-            if organizacion_del_testimonio.editores.filter(id=user.id).exists():
+            if roles(request).edita(testimonio.organizacion_id):
                 es_editor_con_permisos = True
         
         if not (es_autor or es_admin or es_editor_con_permisos):
@@ -1345,8 +1497,8 @@ class FeedbackTestimonioViewSet(viewsets.GenericViewSet):
         # 2. Es editor de la organización del testimonio
         puede_modificar = (
             user.is_staff or 
-            (user.groups.filter(name='editor').exists() and 
-             testimonio.organizacion.editores.filter(id=user.id).exists())
+            (roles(request).es_editor and 
+             roles(request).edita(testimonio.organizacion_id))
         )
         
         if not puede_modificar:
@@ -1416,4 +1568,87 @@ class FeedbackTestimonioViewSet(viewsets.GenericViewSet):
         }, status=status.HTTP_200_OK)
     
     def perform_update(self, serializer):
-        serializer.save()
\ No newline at end of file
+        serializer.save()
+
+
+@extend_schema(
+    tags=['Testimonios'],
+    description="Endpoint público y compacto para el widget externo. Se identifica la organización con su api_key (no hace falta conocer su id) y devuelve los últimos testimonios APROBADOS solo con lo necesario para mostrarlos: autor, comentario, ranking, primer archivo y fecha. '?cantidad' define cuántos (con un maximo configurado). La respuesta se cachea y se puede cachear en el navegador/CDN.",
+    responses={200: OpenApiResponse(description="Testimonios aprobados en formato compacto"), 404: OpenApiResponse(description="API key inválida")},
+    examples=[
+        OpenApiExample(
+            'Respuesta',
+            value={
+                'organizacion': 'Mi Empresa',
+                'testimonios': [
+                    {'autor': 'juan', 'comentario': 'Excelente servicio', 'ranking': 5.0,
+                     'media': 'https://res.cloudinary.com/demo/image/upload/foto.jpg', 'fecha': '2025-01-31'}
+                ]
+            },
+            response_only=True
+        )
+    ]
+)
+class EmbedView(PoliticaCacheMixin, generics.GenericAPIView):
+    """
+    Testimonios aprobados de una organización en formato mínimo, resueltos por api_key.
+    No usa autenticación (el widget corre en sitios externos) ni instancia modelos.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    cantidad_query_param = 'cantidad'
+    # 👇 Cacheable también en el navegador y en la CDN (el ETag permite revalidar barato)
+    politicas_cache = {
+        'get': PoliticaCache(max_age=settings.TESTIMONIOS_EMBED_MAX_AGE, s_maxage=settings.TESTIMONIOS_EMBED_MAX_AGE, vary=()),
+    }
+    organizacion_id = None
+
+    def get_etiquetas_cache(self, politica):
+        # La URL trae la api_key, la etiqueta es la de la organización que resolvió
+        return [etiqueta_organizacion(self.organizacion_id)] if self.organizacion_id else []
+
+    def get(self, request, api_key):
+        # 👇 api_key -> organización sale del cache: la base solo se toca la primera vez
+        organizacion = organizacion_por_api_key(api_key)
+        if organizacion is None:
+            return Response({"detail": "API key inválida."}, status=status.HTTP_404_NOT_FOUND)
+        organizacion_id = self.organizacion_id = organizacion.id
+
+        return respuesta_feed(
+            request, 'embed', lambda: self._feed_embed(request, organizacion), organizacion_id=organizacion_id
+        )
+
+    def get_cantidad(self, request):
+        cantidad = settings.TESTIMONIOS_EMBED_CANTIDAD
+        try:
+            cantidad = int(request.query_params.get(self.cantidad_query_param, cantidad))
+        except (TypeError, ValueError):
+            pass
+        return max(1, min(cantidad, settings.TESTIMONIOS_MAX_PAGE_SIZE))
+
+    def _feed_embed(self, request, organizacion):
+        """Construye la respuesta compacta (se ejecuta solo cuando no está en cache)"""
+        filas = (
+            Testimonios.objects.filter(organizacion_id=organizacion.id, estado='A')
+            .order_by('-fecha_comentario', '-id')
+            .values(
+                'usuario_registrado__username', 'usuario_anonimo_username',
+                'comentario', 'ranking', 'archivos', 'fecha_comentario'
+            )[:self.get_cantidad(request)]
+        )
+
+        testimonios = []
+        for fila in filas:
+            testimonios.append({
+                'autor': fila['usuario_registrado__username'] or fila['usuario_anonimo_username'],
+                'comentario': fila['comentario'],
+                'ranking': float(fila['ranking']),
+                'media': fila['archivos'][0] if fila['archivos'] else None,
+                'fecha': timezone.localtime(fila['fecha_comentario']).date().isoformat(),
+            })
+
+        # 👇 El nombre viene de la organización cacheada (se olvida del cache al renombrarla)
+        return {
+            'organizacion': organizacion.organizacion_nombre,
+            'testimonios': testimonios,
+        }
@@ -1,71 +1,203 @@
+import secrets
+from gzip import GzipFile
+
+from django.conf import settings
 from django.shortcuts import redirect
+from django.utils.cache import patch_vary_headers
+from django.utils.text import StreamingBuffer
+
+from app.otp import esta_verificado, sincronizar_sesion
+
+try:
+    import brotli
+except ImportError:  # Brotli es opcional: sin la librería solo se usa gzip
+    brotli = None
 
-class DisableAdminLogMiddleware:
+# URLs que deben excluirse de la verificación OTP (una tupla: startswith las compara todas de una vez)
+RUTAS_SIN_OTP = (
+    '/admin/login/',
+    '/admin/logout/',
+    '/admin/otp-verification/',
+    '/app/',
+    '/favicon.ico',
+    '/static/',
+    '/media/',
+)
+
+
+class OTPVerificationMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # Verificar si es una solicitud al admin
-        if request.path.startswith('/admin/'):
-            # Deshabilitar el logging del admin
-            from django.contrib.admin.models import LogEntry
-            self.original_save = LogEntry.save
-            
-            # Reemplazar el método save para que no haga nada
-            def disabled_save(self, *args, **kwargs):
-                return None
-                
-            LogEntry.save = disabled_save
-        
+        current_path = request.path
+
+        # Solo el admin pide OTP, y nunca en las URLs excluidas
+        if not current_path.startswith('/admin/') or current_path.startswith(RUTAS_SIN_OTP):
+            return self.get_response(request)
+
+        # DEBUG: Mostrar información útil
+        # print(f"Path: {current_path}, Authenticated: {request.user.is_authenticated}, OTP Verified: {esta_verificado(request)}")
+
+        if request.user.is_authenticated:
+            sincronizar_sesion(request)
+            # 👇 Primero la sesión: si ya verificó no hace falta preguntarle nada a django-otp
+            if not esta_verificado(request) and not request.user.is_verified():
+                return redirect('otp_verification')
+
         response = self.get_response(request)
-        
-        # Restaurar el método original después de procesar la respuesta
-        if request.path.startswith('/admin/'):
-            LogEntry.save = self.original_save
-            
         return response
-    
-class OTPVerificationMiddleware:
+
+
+# Tipos de contenido que vale la pena comprimir (las imágenes y videos ya vienen comprimidos)
+TIPOS_COMPRIMIBLES = (
+    'application/json', 'application/javascript', 'application/xml',
+    'application/vnd.oai.openapi', 'text/',
+)
+
+
+def elegir_codificacion(accept_encoding):
+    """
+    Codificación a usar según Accept-Encoding ('br', 'gzip' o None), respetando los q-values.
+    A igual preferencia se elige Brotli, que comprime más el JSON.
+    """
+    preferencias = {}
+    for parte in accept_encoding.lower().split(','):
+        nombre, _, parametros = parte.partition(';')
+        calidad = 1.0
+        parametros = parametros.replace(' ', '')
+        if parametros.startswith('q='):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        if nombre.strip():
+            preferencias[nombre.strip()] = calidad
+
+    disponibles = ['br', 'gzip'] if brotli is not None else ['gzip']
+    candidatas = [
+        (preferencias.get(codificacion, preferencias.get('*', 0.0)), -orden, codificacion)
+        for orden, codificacion in enumerate(disponibles)
+    ]
+    calidad, _, codificacion = max(candidatas)
+    return codificacion if calidad > 0 else None
+
+
+class _CompresorGzip:
+    """Misma interfaz que brotli.Compressor (process/finish) sobre GzipFile"""
+
+    def __init__(self, nivel):
+        self.buffer = StreamingBuffer()
+        # 👇 Nombre de archivo de largo aleatorio en el encabezado, igual que el GZipMiddleware de Django (BREACH)
+        self.archivo = GzipFile(
+            filename=b'a' * secrets.randbelow(100), mode='wb', compresslevel=nivel, fileobj=self.buffer, mtime=0
+        )
+
+    def process(self, datos):
+        self.archivo.write(datos)
+        return self.buffer.read()
+
+    def finish(self):
+        self.archivo.close()
+        return self.buffer.read()
+
+
+class _CompresorBrotli:
+    """brotli.Compressor con relleno de largo aleatorio al final, como el nombre de archivo del gzip (BREACH)"""
+
+    def __init__(self, nivel):
+        self.compresor = brotli.Compressor(quality=nivel)
+
+    def process(self, datos):
+        return self.compresor.process(datos)
+
+    def finish(self):
+        # 👇 flush() deja el stream alineado a byte; ahí va un meta-bloque de metadatos (RFC 7932, 9.2)
+        # de 1 a 100 bytes que el decodificador descarta
+        largo = 1 + secrets.randbelow(100)
+        # ISLAST=0, MNIBBLES=0 (metadatos), reservado=0, MSKIPBYTES=1, MSKIPLEN-1 y bits de relleno en cero
+        encabezado = (0b010110 | (largo - 1) << 6).to_bytes(2, 'little')
+        return self.compresor.flush() + encabezado + bytes(largo) + self.compresor.finish()
+
+
+class CompresionMiddleware:
+    """
+    Comprime las respuestas (JSON de la API, documentación, HTML) con Brotli o gzip según
+    el Accept-Encoding del cliente. Reemplaza al GZipMiddleware de Django para poder
+    configurar el tamaño mínimo y el nivel de compresión:
+
+      TESTIMONIOS_COMPRESION_MINIMO        -> bytes; las respuestas más chicas se mandan tal cual
+      TESTIMONIOS_COMPRESION_NIVEL_GZIP    -> 1 a 9
+      TESTIMONIOS_COMPRESION_NIVEL_BROTLI  -> 0 a 11
+
+    Las respuestas streaming se comprimen a medida que se generan. Lo que ya viene comprimido
+    (Content-Encoding, por ejemplo los estáticos de WhiteNoise) no se toca.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # URLs que deben excluirse de la verificación OTP
-        excluded_paths = [
-            '/admin/login/',
-            '/admin/logout/',
-            '/admin/otp-verification/',
-            '/app/',
-            '/app/docs/',
-            '/app/schema/',
-            '/app/login/',
-            '/app/token/refresh/',
-            '/favicon.ico',
-            '/static/',
-            '/media/',
-        ]
-        
-        current_path = request.path
-        
-        # Si es una URL excluida, no aplicar la verificación OTP
-        if any(current_path.startswith(path) for path in excluded_paths):
-            return self.get_response(request)
-        
-        # DEBUG: Mostrar información útil
-        # print(f"Path: {current_path}, Authenticated: {request.user.is_authenticated}, OTP Verified: {request.session.get('otp_verified')}")
-        
-        # Verificar si el usuario está autenticado y accediendo al admin
-        if (request.user.is_authenticated and 
-            request.path.startswith('/admin/') and 
-            not request.user.is_anonymous):
-            
-            # Verificar si el usuario necesita verificación OTP
-            if hasattr(request.user, 'is_verified'):
-                # Si no está verificado y no está ya en la página OTP, redirigir
-                if not request.user.is_verified() and not request.session.get('otp_verified'):
-                    # Solo redirigir si no estamos ya en la página OTP
-                    if not request.path.startswith('/admin/otp-verification/'):
-                        return redirect('otp_verification')
-        
         response = self.get_response(request)
-        return response
\ No newline at end of file
+
+        if response.has_header('Content-Encoding'):
+            return response
+
+        tipo = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not (tipo.startswith(TIPOS_COMPRIMIBLES) or tipo.endswith('+json')):
+            return response
+
+        # No vale la pena comprimir respuestas chicas
+        if not response.streaming and len(response.content) < settings.TESTIMONIOS_COMPRESION_MINIMO:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        codificacion = elegir_codificacion(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if codificacion is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self._comprimir_streaming(response, codificacion)
+            # El tamaño final no se conoce hasta terminar de mandar la respuesta
+            del response.headers['Content-Length']
+        else:
+            compresor = self._compresor(codificacion)
+            comprimido = compresor.process(response.content) + compresor.finish()
+            # 👇 Solo si realmente es más chico
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response.headers['Content-Length'] = str(len(comprimido))
+
+        # El ETag fuerte pasa a débil (el cuerpo cambió), igual que con el GZipMiddleware de Django
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codificacion
+        return response
+
+    def _compresor(self, codificacion):
+        if codificacion == 'br':
+            return _CompresorBrotli(settings.TESTIMONIOS_COMPRESION_NIVEL_BROTLI)
+        return _CompresorGzip(settings.TESTIMONIOS_COMPRESION_NIVEL_GZIP)
+
+    def _comprimir_streaming(self, response, codificacion):
+        compresor = self._compresor(codificacion)
+        original = response.streaming_content
+
+        if response.is_async:
+            async def comprimir():
+                async for parte in original:
+                    datos = compresor.process(parte)
+                    if datos:
+                        yield datos
+                yield compresor.finish()
+        else:
+            def comprimir():
+                for parte in original:
+                    datos = compresor.process(parte)
+                    if datos:
+                        yield datos
+                yield compresor.finish()
+        return comprimir()
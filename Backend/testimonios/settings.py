@@ -65,8 +65,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Debe ir antes de cualquier middleware que maneje solicitudes
     'django.middleware.security.SecurityMiddleware',
+    'testimonios.middleware.CompresionMiddleware',  # Brotli/gzip de la API (los estáticos ya vienen comprimidos de WhiteNoise)
     'whitenoise.middleware.WhiteNoiseMiddleware', 
-    'testimonios.middleware.DisableAdminLogMiddleware', 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -245,7 +245,8 @@ REST_FRAMEWORK = {
 
     #DRF JWT
         'DEFAULT_AUTHENTICATION_CLASSES': (
-            'rest_framework_simplejwt.authentication.JWTAuthentication',
+            #JWT con el rol y las organizaciones en los claims (ver app/tokens.py)
+            'app.tokens.JWTRolesAuthentication',
         ),
     #Funcionalidad de limites de peticiones por la misma IP
         'DEFAULT_THROTTLE_CLASSES': [
@@ -257,6 +258,17 @@ REST_FRAMEWORK = {
             'user': '600/hour',  # Limit authenticated users to 600 requests per hour
         },
 
+    #JSON con orjson (mismo formato que el de DRF, ver app/renderers.py y app/parsers.py)
+        'DEFAULT_RENDERER_CLASSES': [
+            'app.renderers.JSONRapidoRenderer',
+            'rest_framework.renderers.BrowsableAPIRenderer',
+        ],
+        'DEFAULT_PARSER_CLASSES': [
+            'app.parsers.JSONRapidoParser',
+            'rest_framework.parsers.FormParser',
+            'rest_framework.parsers.MultiPartParser',
+        ],
+
     #PERMISOS
        'DEFAULT_PERMISSION_CLASS': ('rest_framework.permissions.IsAuthenticated',),
     #DRF SPECTACULAR
@@ -265,6 +277,76 @@ REST_FRAMEWORK = {
    }
 
 
+#Cache: si hay REDIS_URL se comparte entre instancias (necesario en Vercel para que la invalidacion llegue a todas),
+#si no se usa la memoria local del proceso
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+#Tiempo maximo (segundos) que un feed de testimonios puede quedar en cache
+TESTIMONIOS_CACHE_TIMEOUT = config('TESTIMONIOS_CACHE_TIMEOUT', default=300, cast=int)
+#Segundos que duran las versiones de los feeds en el cache (se recrean solas; siempre mas que TESTIMONIOS_CACHE_TIMEOUT)
+TESTIMONIOS_VERSION_TIMEOUT = config('TESTIMONIOS_VERSION_TIMEOUT', default=86400, cast=int)
+
+#Paginacion por cursor de los listados publicos de testimonios
+TESTIMONIOS_PAGE_SIZE = config('TESTIMONIOS_PAGE_SIZE', default=20, cast=int)
+TESTIMONIOS_MAX_PAGE_SIZE = config('TESTIMONIOS_MAX_PAGE_SIZE', default=100, cast=int)
+
+#Endpoint embed del widget externo: cantidad de testimonios por defecto y segundos de cache en navegador/CDN
+TESTIMONIOS_EMBED_CANTIDAD = config('TESTIMONIOS_EMBED_CANTIDAD', default=10, cast=int)
+TESTIMONIOS_EMBED_MAX_AGE = config('TESTIMONIOS_EMBED_MAX_AGE', default=60, cast=int)
+
+#Snapshots JSON publicos de los testimonios aprobados de cada organizacion (se regeneran al cambiar los aprobados).
+#En Vercel el disco es de solo lectura: usar un storage remoto con URL de CDN, por ejemplo
+#TESTIMONIOS_SNAPSHOT_STORAGE=cloudinary_storage.storage.RawMediaCloudinaryStorage
+TESTIMONIOS_SNAPSHOT_STORAGE = config('TESTIMONIOS_SNAPSHOT_STORAGE', default='django.core.files.storage.FileSystemStorage')
+TESTIMONIOS_SNAPSHOT_ROOT = config('TESTIMONIOS_SNAPSHOT_ROOT', default=os.path.join(BASE_DIR, 'snapshots'))
+TESTIMONIOS_SNAPSHOT_URL = config('TESTIMONIOS_SNAPSHOT_URL', default='/snapshots/')
+TESTIMONIOS_SNAPSHOT_MAX = config('TESTIMONIOS_SNAPSHOT_MAX', default=100, cast=int)
+#Cuantas versiones inmutables (testimonios.<version>.json) se guardan por organizacion; las mas viejas se borran
+TESTIMONIOS_SNAPSHOT_VERSIONES = config('TESTIMONIOS_SNAPSHOT_VERSIONES', default=5, cast=int)
+
+#Compresion de las respuestas (Brotli si esta instalado, si no gzip) segun el Accept-Encoding del cliente.
+#Las respuestas de menos de TESTIMONIOS_COMPRESION_MINIMO bytes se mandan sin comprimir
+TESTIMONIOS_COMPRESION_MINIMO = config('TESTIMONIOS_COMPRESION_MINIMO', default=1024, cast=int)
+TESTIMONIOS_COMPRESION_NIVEL_GZIP = config('TESTIMONIOS_COMPRESION_NIVEL_GZIP', default=6, cast=int)
+TESTIMONIOS_COMPRESION_NIVEL_BROTLI = config('TESTIMONIOS_COMPRESION_NIVEL_BROTLI', default=5, cast=int)
+
+#Listados de solo lectura serializados desde values() sin pasar por los campos de DRF (mismo JSON).
+#Se puede apagar para volver a los serializers de DRF
+TESTIMONIOS_SERIALIZACION_RAPIDA = config('TESTIMONIOS_SERIALIZACION_RAPIDA', default=True, cast=bool)
+
+#Cache en la CDN de los endpoints publicos (solo GET anonimos). Los feeds de testimonios usan un s-maxage corto
+#y la CDN revalida con el ETag; el catalogo de categorias cambia poco y puede quedar mas tiempo
+TESTIMONIOS_CDN_S_MAXAGE = config('TESTIMONIOS_CDN_S_MAXAGE', default=5, cast=int)
+TESTIMONIOS_CDN_STALE_WHILE_REVALIDATE = config('TESTIMONIOS_CDN_STALE_WHILE_REVALIDATE', default=30, cast=int)
+TESTIMONIOS_CDN_CATALOGO_S_MAXAGE = config('TESTIMONIOS_CDN_CATALOGO_S_MAXAGE', default=600, cast=int)
+#Funcion que purga la CDN por etiquetas (ej. 'miapp.cdn.purgar_vercel'), recibe la lista de etiquetas.
+#Vacio = sin purga, la CDN revalida al vencer el s-maxage
+TESTIMONIOS_CDN_PURGA = config('TESTIMONIOS_CDN_PURGA', default='')
+TESTIMONIOS_CDN_HEADER_ETIQUETAS = config('TESTIMONIOS_CDN_HEADER_ETIQUETAS', default='Cache-Tag')
+
+#Subida de los archivos de un testimonio a Cloudinary: cuantos se suben a la vez y plazo total (segundos).
+#Si una subida falla o se vence el plazo se borran las demas y el testimonio no se guarda
+TESTIMONIOS_SUBIDAS_HILOS = config('TESTIMONIOS_SUBIDAS_HILOS', default=4, cast=int)
+TESTIMONIOS_SUBIDAS_PLAZO = config('TESTIMONIOS_SUBIDAS_PLAZO', default=30, cast=float)
+#Subidas directas del navegador al almacen (sin pasar los archivos por Django): clase que firma y verifica
+#las subidas ('app.subidas.SubidasLocales' para pruebas) y segundos que vale la firma
+TESTIMONIOS_SUBIDAS_ALMACEN = config('TESTIMONIOS_SUBIDAS_ALMACEN', default='app.subidas.SubidasCloudinary')
+TESTIMONIOS_SUBIDAS_FIRMA_VIGENCIA = config('TESTIMONIOS_SUBIDAS_FIRMA_VIGENCIA', default=600, cast=int)
+
+
 SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'AUTH_HEADER_TYPES': ('JWT',),
@@ -27,6 +27,8 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from drf_spectacular.utils import extend_schema_view, extend_schema
 
 from django.views.generic.base import RedirectView
+from django.conf import settings
+from django.conf.urls.static import static
 
 @extend_schema_view(
     get=extend_schema(exclude=True)  # <- esto la excluye de Swagger
@@ -49,6 +51,10 @@ urlpatterns = [
     path('app/login/', LoginView.as_view(), name='token_obtain_pair'),
     path('app/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
+    #SNAPSHOTS JSON DE TESTIMONIOS: en desarrollo los sirve Django desde el disco (static() no hace nada sin DEBUG),
+    #en produccion se leen directo del storage/CDN configurado
+    *static(settings.TESTIMONIOS_SNAPSHOT_URL, document_root=settings.TESTIMONIOS_SNAPSHOT_ROOT),
+
     #REDIRECCIONAMIENTO, ES DECIR QUE TODAS LAS URLS REDIRECCIONEN AL APP/DOCS MENOS ADMIN
     re_path(r'^(?!admin/).*$', RedirectView.as_view(url='/app/docs/', permanent=False)),
 